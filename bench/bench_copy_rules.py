@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# bench_copy_rules: Benchmark of the copy include/exclude rules
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Matches a synthetic tree of 100k relative paths against the exclude rules of a
+large build-cfg.json, with the old per-rule re.match loop and with CopyRules.
+
+Usage: python bench/bench_copy_rules.py [number of paths]
+'''
+
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'bin'))
+import copy_rules
+
+DIRS = [ 'res', 'src', 'res/fonts', 'res/ui', 'res/ui/common', 'src/app', 'src/cocos', 'res/sound',
+         'frameworks', 'tools/x' ]
+EXTS = [ 'png', 'lua', 'plist', 'mp3', 'ttf', 'json', 'luac', 'DS_Store' ]
+GLOBS = [ '*.DS_Store', 'res/sound/*', 'src/cocos/*', '*.luac', 'tools/*', 'res/ui/*.plist', 'frameworks' ] + \
+        [ 'res/extra%d/*' % i for i in range(30) ]
+
+
+def gen_paths(count):
+    random.seed(1)
+    paths = []
+    for i in range(count):
+        sub = '/'.join([ 'd%d' % random.randint(0, 20) for _ in range(random.randint(0, 3)) ])
+        paths.append('%s/%s%sf%d.%s' % (random.choice(DIRS), sub, '/' if sub else '', i, random.choice(EXTS)))
+
+    return paths
+
+
+def old_in_rules(rel_path, rules):
+    # the loop of cocos._in_rules before CopyRules
+    ret = False
+    for rule in rules:
+        if re.match(rule, rel_path):
+            ret = True
+
+    return ret
+
+
+def matched_after_pruning(paths, rules):
+    # the files left to match once the folders fully covered by an exclude rule are skipped
+    count = 0
+    for path in paths:
+        rel_dir = ''
+        for part in path.split('/')[:-1]:
+            rel_dir += part + '/'
+            if rules.match_all_in(rel_dir):
+                break
+        else:
+            rules.match(path)
+            count += 1
+
+    return count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    paths = gen_paths(count)
+    rules = copy_rules.convert_rules(GLOBS)
+
+    start = time.time()
+    old_results = [ old_in_rules(p, rules) for p in paths ]
+    old_time = time.time() - start
+
+    start = time.time()
+    compiled = copy_rules.CopyRules(rules)
+    new_results = [ compiled.match(p) for p in paths ]
+    new_time = time.time() - start
+
+    if old_results != new_results:
+        sys.exit('CopyRules and the per-rule loop disagree')
+
+    start = time.time()
+    left = matched_after_pruning(paths, compiled)
+    prune_time = time.time() - start
+
+    print('%d paths, %d rules' % (len(paths), len(rules)))
+    print('  per-rule re.match  %.3fs' % old_time)
+    print('  CopyRules.match    %.3fs' % new_time)
+    print('  with dir pruning   %.3fs, %d of %d files matched' % (prune_time, left, len(paths)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# bench_jscompile_order: Benchmark of the js file ordering of jscompile
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Orders 10k shuffled js paths by a compiler config with pre_order, post_order &
+skip entries (some of them folder fragments), with the cmp= sorts jscompile used
+before and with reorder_js_files(), and checks that the orders are the same.
+
+Usage: python bench/bench_jscompile_order.py [number of files]
+'''
+
+import os
+import sys
+import time
+import random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'bin'))
+sys.path.insert(0, os.path.join(ROOT, 'plugins'))
+from plugin_jscompile import CCPluginJSCompile
+
+
+class OldOrder(object):
+    '''
+    reorder_js_files() before the ordering keys, with cmp= comparators.
+    '''
+
+    def __init__(self, js_files, pre_order, post_order, skip):
+        self._js_files = js_files
+        self._pre_order = pre_order
+        self._post_order = post_order
+        self._skip = skip
+
+    def index_in_list(self, jsfile, l):
+        index = -1
+        for el in l:
+            if jsfile.rfind(el) != -1:
+                return index + 1
+            index = index + 1
+        return -1
+
+    def js_filename_pre_order_compare(self, a, b):
+        return self._compare(a, b, self._pre_order, 1)
+
+    def js_filename_post_order_compare(self, a, b):
+        return self._compare(a, b, self._post_order, -1)
+
+    def _compare(self, a, b, files, delta):
+        index_a = self.index_in_list(a, files)
+        index_b = self.index_in_list(b, files)
+        is_a_in_list = index_a != -1
+        is_b_in_list = index_b != -1
+
+        if is_a_in_list and not is_b_in_list:
+            return -1 * delta
+        elif not is_a_in_list and is_b_in_list:
+            return 1 * delta
+        elif is_a_in_list and is_b_in_list:
+            return cmp(index_a, index_b)
+        return 0
+
+    def reorder_js_files(self):
+        for src_dir in self._js_files:
+            skipped = []
+            for f in self._js_files[src_dir]:
+                for e in self._skip:
+                    if f.rfind(e) != -1:
+                        skipped.append(f)
+            for f in skipped:
+                self._js_files[src_dir].remove(f)
+
+            self._js_files[src_dir].sort(cmp=self.js_filename_pre_order_compare)
+            self._js_files[src_dir].sort(cmp=self.js_filename_post_order_compare)
+
+
+def gen_config(count):
+    random.seed(7)
+
+    def path(i):
+        return 'src/m%d/sub%d/file%d.js' % (i % 50, i % 7, i)
+
+    files = [ '/proj/' + path(i) for i in range(count) ]
+    random.shuffle(files)
+    pre_order = [ path(i) for i in random.sample(range(count), 150) ] + [ 'src/m3/' ]
+    post_order = [ path(i) for i in random.sample(range(count), 50) ] + [ 'sub6/file1' ]
+    skip = [ path(i) for i in random.sample(range(count), 30) ] + [ 'm49/' ]
+    return files, pre_order, post_order, skip
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    files, pre_order, post_order, skip = gen_config(count)
+
+    old = OldOrder({ '/proj/src' : list(files) }, pre_order, post_order, skip)
+    start = time.time()
+    old.reorder_js_files()
+    old_time = time.time() - start
+
+    new = CCPluginJSCompile()
+    new._config = {}
+    new._pre_order = pre_order
+    new._post_order = post_order
+    new._skip = skip
+    new._js_files = { '/proj/src' : list(files) }
+    start = time.time()
+    new.reorder_js_files()
+    new_time = time.time() - start
+
+    if old._js_files != new._js_files:
+        sys.exit('reorder_js_files() gives another order than the cmp= sorts')
+
+    print('%d files (%d after skipping), %d pre_order, %d post_order, %d skip entries' %
+          (len(files), len(new._js_files['/proj/src']), len(pre_order), len(post_order), len(skip)))
+    print('  cmp= sorts         %.2fs' % old_time)
+    print('  reorder_js_files   %.2fs' % new_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# bench_pbxproj: Benchmark of loading & saving pbxproj files
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Generates a large project from the project template of `cocos package`, then
+times loading it by PBXParser, by plistlib from the XML format (the old way,
+after `plutil -convert xml1`, plutil is timed too if it's found), saving it,
+and saving it unmodified with skip_unmodified.
+
+With --baseline, the loading from XML & the saving of another modify_pbxproj.py
+are timed too, e.g. the one before the parser & the writer:
+  git show daf7796:plugins/plugin_generate/proj_modifier/modify_pbxproj.py > /tmp/old_modify_pbxproj.py
+
+Usage: python bench/bench_pbxproj.py [number of files] [--baseline old_modify_pbxproj.py]
+'''
+
+import os
+import sys
+import imp
+import time
+import shutil
+import tempfile
+import plistlib
+import subprocess
+from distutils.spawn import find_executable
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'plugins', 'plugin_generate', 'proj_modifier'))
+import modify_pbxproj
+
+TEMPLATE_PATH = os.path.join(ROOT, 'plugins', 'plugin_package', 'helper', 'template', 'proj.ios_mac',
+                             '__PACKAGE_NAME__.xcodeproj', 'project.pbxproj')
+EXTS = [ '.cpp', '.h', '.png', '.m', '.a' ]
+REPEAT = 3
+
+
+def gen_project(count, dst_dir):
+    f = open(TEMPLATE_PATH, 'rb')
+    content = f.read()
+    f.close()
+    content = content.replace('__MAC_LIB_ORI_ID__', 'DABC966C1A81DF7F00BF5CC4')
+    content = content.replace('__IOS_LIB_ORI_ID__', 'DABC98A71A81E08700BF5CC4')
+    content = content.replace('__PACKAGE_NAME__', 'Bench')
+
+    path = os.path.join(dst_dir, 'Bench.xcodeproj', 'project.pbxproj')
+    os.makedirs(os.path.dirname(path))
+    f = open(path, 'wb')
+    f.write(content)
+    f.close()
+
+    # the files are added to a group, the sources to the build phases of both targets
+    project = modify_pbxproj.XcodeProject.Load(path)
+    phases = project.get_build_phases('PBXSourcesBuildPhase')
+    group = project.get_or_create_group('Generated')
+    for i in range(count):
+        file_ref = modify_pbxproj.PBXFileReference.Create('src/dir%d/file_%d%s' % (i % 300, i, EXTS[i % len(EXTS)]),
+                                                          '<group>')
+        project.objects[file_ref.id] = file_ref
+        group['children'].data.append(file_ref.id)
+        if file_ref.build_phase == 'PBXSourcesBuildPhase':
+            for phase in phases:
+                build_file = modify_pbxproj.PBXBuildFile.Create(file_ref)
+                phase['files'].data.append(build_file.id)
+                project.objects[build_file.id] = build_file
+
+    project.save_new_format(path)
+    project.save_format_xml(path + '.xml')
+    return path
+
+
+def best_time(func):
+    best = None
+    for i in range(REPEAT):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def load_by_plutil(module, path):
+    p = subprocess.Popen([ 'plutil', '-convert', 'xml1', '-o', '-', path ], stdout=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    return module.XcodeProject(plistlib.readPlistFromString(stdout), path)
+
+
+def main():
+    args = sys.argv[1:]
+    baseline = None
+    if '--baseline' in args:
+        i = args.index('--baseline')
+        baseline = imp.load_source('old_modify_pbxproj', args[i + 1])
+        del args[i : i + 2]
+    count = int(args[0]) if len(args) > 0 else 20000
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_pbxproj_')
+    try:
+        path = gen_project(count, tmp_dir)
+        xml_path = path + '.xml'
+        out_path = path + '.out'
+        project = modify_pbxproj.XcodeProject.Load(path)
+
+        print('%d objects, %.1f MB' % (len(project.objects), os.path.getsize(path) / 1048576.0))
+        print('  load by PBXParser              %.2fs' %
+              best_time(lambda: modify_pbxproj.XcodeProject.Load(path)))
+        print('  load by plistlib from XML      %.2fs' %
+              best_time(lambda: modify_pbxproj.XcodeProject.LoadFromXML(xml_path)))
+        if find_executable('plutil'):
+            print('  load by plutil & plistlib      %.2fs' %
+                  best_time(lambda: load_by_plutil(modify_pbxproj, path)))
+        print('  save_new_format                %.2fs' %
+              best_time(lambda: project.save_new_format(out_path)))
+        print('  save(skip_unmodified=True)     %.4fs' %
+              best_time(lambda: project.save(out_path, skip_unmodified=True)))
+
+        if baseline is not None:
+            old_project = baseline.XcodeProject.LoadFromXML(xml_path)
+            print('baseline:')
+            print('  load by plistlib from XML      %.2fs' %
+                  best_time(lambda: baseline.XcodeProject.LoadFromXML(xml_path)))
+            if find_executable('plutil'):
+                print('  load by plutil & plistlib      %.2fs' %
+                      best_time(lambda: load_by_plutil(baseline, path)))
+            print('  saveFormat3_2                  %.2fs' %
+                  best_time(lambda: old_project.saveFormat3_2(out_path)))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# bench_web_server: Load benchmark of the web server of `cocos run -p web`
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Generates the assets of a small web game (400 .js, 400 .png, a 5 MB .mp3,
+index.html & project.json, 23 MB), serves them by the old server of
+`cocos run -p web` (BaseHTTPServer & SimpleHTTPRequestHandler over HTTP/1.0)
+and by DevHTTPServer, without & with gzip, then times N concurrent clients
+which GET every file (load), and GET them again with the ETags they got
+(reload, the old server has no ETag).
+
+The servers run in child processes, the clients are threads which keep their
+connections alive when the server does.
+
+Usage: python bench/bench_web_server.py [number of clients ...]
+'''
+
+import os
+import sys
+import time
+import random
+import shutil
+import socket
+import httplib
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'bin'))
+
+SERVERS = [ 'old', 'new', 'gzip' ]
+JS_WORDS = [ 'function', 'var', 'this.x', 'return', 'cc.Node', '{', '}', '();' ]
+
+
+def gen_assets(dst_dir):
+    rand = random.Random(0)
+
+    def write_file(rel_path, data):
+        path = os.path.join(dst_dir, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, 'wb')
+        f.write(data)
+        f.close()
+
+    write_file('index.html', '<html><body><script src="main.js"></script></body></html>')
+    write_file('project.json', '{ "jsList": [ %s ] }' %
+               ', '.join('"src/d%d/f%d.js"' % (i % 10, i) for i in range(400)))
+    for i in range(400):
+        # the scripts are compressible, the images are not
+        words = [ rand.choice(JS_WORDS) for j in range(rand.randint(3500, 4500)) ]
+        write_file(os.path.join('src', 'd%d' % (i % 10), 'f%d.js' % i), ' '.join(words))
+        write_file(os.path.join('res', 'd%d' % (i % 10), 'f%d.png' % i), os.urandom(rand.randint(20000, 30000)))
+    write_file(os.path.join('res', 'music.mp3'), os.urandom(5 * 1024 * 1024))
+
+    paths = []
+    for cur_dir, dirs, files in os.walk(dst_dir):
+        for f in files:
+            paths.append('/' + os.path.relpath(os.path.join(cur_dir, f), dst_dir).replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def serve(kind, port, root):
+    # runs in the child process
+    os.chdir(root)
+    if kind == 'old':
+        import BaseHTTPServer
+        from SimpleHTTPServer import SimpleHTTPRequestHandler
+        SimpleHTTPRequestHandler.protocol_version = 'HTTP/1.0'
+        SimpleHTTPRequestHandler.log_message = lambda *args: None
+        httpd = BaseHTTPServer.HTTPServer(('127.0.0.1', port), SimpleHTTPRequestHandler)
+    else:
+        from web_server import DevHTTPServer, DevRequestHandler
+        DevRequestHandler.log_message = lambda *args: None
+        httpd = DevHTTPServer(('127.0.0.1', port), compress=(kind == 'gzip'))
+    httpd.serve_forever()
+
+
+def get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def start_server(kind, root):
+    port = get_free_port()
+    p = subprocess.Popen([ sys.executable, os.path.abspath(__file__), '--serve', kind, str(port), root ])
+    for i in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return p, port
+        except socket.error:
+            time.sleep(0.1)
+
+    p.kill()
+    raise RuntimeError('the %s server is not started' % kind)
+
+
+def run_client(port, paths, gzip, etags, results):
+    conn = None
+    received = 0
+    for path in paths:
+        headers = {}
+        if gzip:
+            headers['Accept-Encoding'] = 'gzip'
+        if etags.get(path):
+            headers['If-None-Match'] = etags[path]
+
+        if conn is None:
+            conn = httplib.HTTPConnection('127.0.0.1', port)
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        received += len(response.read())
+        if response.status not in (200, 304):
+            raise RuntimeError('%s: %d' % (path, response.status))
+
+        etags[path] = response.getheader('ETag')
+        if response.will_close:
+            conn.close()
+            conn = None
+
+    if conn is not None:
+        conn.close()
+    results.append(received)
+
+
+def run_clients(port, paths, gzip, client_etags):
+    results = []
+    threads = [ threading.Thread(target=run_client, args=(port, paths, gzip, etags, results))
+                for etags in client_etags ]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    if len(results) != len(threads):
+        raise RuntimeError('a client failed')
+    return elapsed, sum(results) / 1048576.0
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) > 0 and args[0] == '--serve':
+        serve(args[1], int(args[2]), args[3])
+        return
+
+    clients_counts = [ int(arg) for arg in args ] or [ 1, 8, 32 ]
+    tmp_dir = tempfile.mkdtemp(prefix='bench_web_server_')
+    try:
+        paths = gen_assets(tmp_dir)
+        print('%d files, %.1f MB' % (len(paths), sum(os.path.getsize(os.path.join(tmp_dir, p[1:])) for p in paths)
+                                     / 1048576.0))
+        print('clients  server  load                 reload')
+        for clients in clients_counts:
+            for kind in SERVERS:
+                p, port = start_server(kind, tmp_dir)
+                try:
+                    client_etags = [ {} for i in range(clients) ]
+                    load = run_clients(port, paths, kind == 'gzip', client_etags)
+                    reload = run_clients(port, paths, kind == 'gzip', client_etags)
+                finally:
+                    p.kill()
+                    p.wait()
+
+                print('%-8d %-7s %6.2fs (%6.1f MB)   %6.2fs (%6.1f MB)' % ((clients, kind) + load + reload))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
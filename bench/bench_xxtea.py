@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# bench_xxtea: Benchmark of the XXTEA backends of luacompile -e
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Encrypts generated bytecode blobs with encrypt() (the reference), _encrypt_py,
+the batched _encrypt_batch_py and the `xxtea` extension if it's installed,
+checks that they generate the same bytes and prints their throughput.
+
+Usage: python bench/bench_xxtea.py [total size in KB]
+'''
+
+import os
+import sys
+import time
+import random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'bin'))
+sys.path.insert(0, os.path.join(ROOT, 'plugins'))
+import plugin_luacompile as luacompile
+
+KEY = '2dxLua'
+# most of the compiled files are small
+SIZES = [ 2 * 1024 ] * 40 + [ 16 * 1024 ] * 20 + [ 64 * 1024 ] * 4 + [ 256 * 1024 ]
+
+
+def gen_blobs(total_size):
+    # luajit bytecode header & random bodies from 1 KB to 256 KB
+    random.seed(5)
+    blobs = []
+    size = 0
+    while size < total_size:
+        max_length = random.choice(SIZES)
+        length = min(random.randint(max_length // 2, max_length), total_size - size)
+        blobs.append('\x1bLJ\x02' + os.urandom(max(length - 4, 0)))
+        size += length
+
+    return blobs
+
+
+def one_by_one(encrypt):
+    return lambda blobs, key: [ encrypt(blob, key) for blob in blobs ]
+
+
+def run(encrypt_blobs, blobs):
+    start = time.time()
+    outputs = encrypt_blobs(blobs, KEY)
+    return time.time() - start, outputs
+
+
+def main():
+    total_size = (int(sys.argv[1]) if len(sys.argv) > 1 else 4000) * 1024
+    blobs = gen_blobs(total_size)
+    mb = sum(len(b) for b in blobs) / (1024.0 * 1024.0)
+
+    backends = [ ('encrypt', one_by_one(luacompile.encrypt)), ('_encrypt_py', one_by_one(luacompile._encrypt_py)),
+                 ('_encrypt_batch_py', luacompile._encrypt_batch_py) ]
+    if luacompile._xxtea is not None:
+        backends.append(('xxtea extension', one_by_one(luacompile._encrypt_ext)))
+
+    print('%d blobs, %.2f MB, fast_encrypt is %s' % (len(blobs), mb, luacompile.fast_encrypt.__name__))
+    reference = None
+    for name, encrypt in backends:
+        elapsed, outputs = run(encrypt, blobs)
+        if reference is None:
+            reference = outputs
+        elif outputs != reference:
+            sys.exit('%s generates other bytes than encrypt()' % name)
+        print('  %-18s %8.2f MB/s' % (name, mb / elapsed))
+
+
+if __name__ == '__main__':
+    main()
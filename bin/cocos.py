@@ -16,6 +16,12 @@ __docformat__ = 'restructuredtext'
 
 # python
 import sys
+
+# the imports are timed from here with --profile-startup
+if '--profile-startup' in sys.argv:
+    import startup_profiler
+    startup_profiler.start()
+
 import os
 import subprocess
 from contextlib import contextmanager
@@ -27,6 +33,21 @@ import gettext
 import json
 import utils
 import re
+import time
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+import copy_rules
+from copy_rules import convert_rules, CopyRules
+
+# os.scandir is available since python 3.5, try the backport for python 2
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
 
 
 # FIXME: MultiLanguage should be deprecated in favor of gettext
@@ -35,7 +56,87 @@ from MultiLanguage import MultiLanguage
 COCOS2D_CONSOLE_VERSION = '2.3'
 
 
+class PluginInfo(object):
+    '''
+    What's needed to find a plugin & run its dependencies without importing it.
+    It's used like the plugin class, the class is imported when it's really needed.
+    '''
+
+    def __init__(self, classname, name, category, dependencies, files):
+        self.classname = classname
+        self.name = name
+        self.category = category
+        self.dependencies = dependencies
+        # the source files of the plugin -> their modification times
+        self.files = files
+        self._class = None
+
+    @staticmethod
+    def get_source_files(modules):
+        files = {}
+        for module in modules:
+            path = getattr(module, '__file__', None)
+            if path is None:
+                continue
+            if path.endswith(('.pyc', '.pyo')) and os.path.isfile(path[:-1]):
+                path = path[:-1]
+            files[os.path.abspath(path)] = os.path.getmtime(path)
+
+        return files
+
+    @classmethod
+    def from_class(cls, classname, plugin_class):
+        modules = [ sys.modules.get(plugin_class.__module__), sys.modules.get(classname.split('.')[0]) ]
+        info = cls(classname, plugin_class.plugin_name(), plugin_class.plugin_category(),
+                   plugin_class.depends_on(), PluginInfo.get_source_files([ m for m in modules if m ]))
+        info._class = plugin_class
+        return info
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['classname'], data['name'], data['category'], data['dependencies'], data['files'])
+
+    def to_json(self):
+        return {
+            'classname': self.classname,
+            'name': self.name,
+            'category': self.category,
+            'dependencies': self.dependencies,
+            'files': self.files
+        }
+
+    def is_changed(self):
+        for path, mtime in self.files.items():
+            if not os.path.isfile(path) or os.path.getmtime(path) != mtime:
+                return True
+
+        return False
+
+    def get_class(self):
+        if self._class is None:
+            self._class = get_class(self.classname)
+        return self._class
+
+    def plugin_name(self):
+        return self.name
+
+    def plugin_category(self):
+        return self.category
+
+    def depends_on(self):
+        return self.dependencies
+
+    def brief_description(self):
+        return self.get_class().brief_description()
+
+    def __call__(self):
+        return self.get_class()()
+
+
 class Cocos2dIniParser:
+    # the registry of the plugins, so they are not imported to find a command
+    PLUGINS_REGISTRY_FILE = 'cocos2d_plugins.json'
+
     def __init__(self):
         import ConfigParser
         self._cp = ConfigParser.ConfigParser(allow_no_value=True)
@@ -43,29 +144,87 @@ class Cocos2dIniParser:
 
         # read global config file
         self.cocos2d_path = os.path.dirname(os.path.abspath(sys.argv[0]))
-        self._cp.read(os.path.join(self.cocos2d_path, "cocos2d.ini"))
+        self._ini_files = self._cp.read(os.path.join(self.cocos2d_path, "cocos2d.ini"))
 
         # XXX: override with local config ??? why ???
-        self._cp.read("~/.cocos2d-js/cocos2d.ini")
+        self._ini_files += self._cp.read("~/.cocos2d-js/cocos2d.ini")
+
+    def _get_plugins_registry_key(self, classnames):
+        # the registry is built again if any of them changes
+        return {
+            'version': COCOS2D_CONSOLE_VERSION,
+            'classnames': classnames,
+            'files': PluginInfo.get_source_files([ sys.modules[__name__] ]),
+            'ini_files': dict([ (os.path.abspath(f), os.path.getmtime(f)) for f in self._ini_files ]),
+            'path': sys.path
+        }
+
+    def _load_plugins_registry(self, key):
+        registry_path = os.path.join(self.cocos2d_path, Cocos2dIniParser.PLUGINS_REGISTRY_FILE)
+        if not os.path.isfile(registry_path):
+            return None
 
-    def parse_plugins(self):
-        classes = {}
+        try:
+            f = open(registry_path, 'rb')
+            data = json.load(f)
+            f.close()
+        except ValueError:
+            return None
+
+        if data.get('key') != key:
+            return None
+
+        plugins = [ PluginInfo.from_json(item) for item in data['plugins'] ]
+        for plugin in plugins:
+            if plugin.is_changed():
+                return None
+
+        return plugins
+
+    def _save_plugins_registry(self, key, plugins):
+        registry_path = os.path.join(self.cocos2d_path, Cocos2dIniParser.PLUGINS_REGISTRY_FILE)
+        tmp_path = '%s.%d' % (registry_path, os.getpid())
+        try:
+            f = open(tmp_path, 'wb')
+            try:
+                json.dump({ 'key': key, 'plugins': [ p.to_json() for p in plugins ] }, f)
+            finally:
+                f.close()
+
+            # rename() can't replace a file on Windows
+            if os_is_win32() and os.path.isfile(registry_path):
+                os.remove(registry_path)
+            os.rename(tmp_path, registry_path)
+        except (IOError, OSError):
+            # the folder may be read only, the plugins are imported every time then
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
 
+    def parse_plugins(self):
+        classnames = []
         for s in self._cp.sections():
             if s == 'plugins':
-                for classname in self._cp.options(s):
-                    plugin_class = get_class(classname)
-                    category = plugin_class.plugin_category()
-                    name = plugin_class.plugin_name()
-                    if name is None:
-                        print(MultiLanguage.get_string('COCOS_PARSE_PLUGIN_WARNING_FMT', classname))
-                    if len(category) == 0:
-                        key = name
-                    else:
-                        # combine category & name as key
-                        # eg. 'project_new'
-                        key = category + '_' + name
-                    classes[key] = plugin_class
+                classnames += self._cp.options(s)
+
+        key = self._get_plugins_registry_key(classnames)
+        plugins = self._load_plugins_registry(key)
+        if plugins is None:
+            plugins = [ PluginInfo.from_class(classname, get_class(classname)) for classname in classnames ]
+            self._save_plugins_registry(key, plugins)
+
+        classes = {}
+        for plugin in plugins:
+            category = plugin.plugin_category()
+            name = plugin.plugin_name()
+            if name is None:
+                print(MultiLanguage.get_string('COCOS_PARSE_PLUGIN_WARNING_FMT', plugin.classname))
+            if len(category) == 0:
+                key = name
+            else:
+                # combine category & name as key
+                # eg. 'project_new'
+                key = category + '_' + name
+            classes[key] = plugin
         _check_dependencies(classes)
         return classes
 
@@ -387,6 +546,7 @@ class DataStatistic(object):
                     # statistics is disabled
                     if last_enabled:
                         cls.stat_obj.send_event('switch', 'off', 'stat_closed')
+                        cls.stat_obj.terminate_stat()
                     cls.stat_obj = None
 
                 # update last time status
@@ -772,111 +932,229 @@ def version_compare(a, op, b):
         return False    # op ">" and all digits were equal
     return True         # op "==" and all digits were equal
 
-def copy_files_in_dir(src, dst):
+def _iter_dir(path):
+    # yields (name, path, is_dir, is_file) for the items in the folder
+    if _scandir is not None:
+        for entry in _scandir(path):
+            yield entry.name, entry.path, entry.is_dir(), entry.is_file()
+    else:
+        for name in os.listdir(path):
+            full_path = os.path.join(path, name)
+            yield name, full_path, os.path.isdir(full_path), os.path.isfile(full_path)
 
-    for item in os.listdir(src):
-        path = os.path.join(src, item)
-        if os.path.isfile(path):
-            path = add_path_prefix(path)
-            copy_dst = add_path_prefix(dst)
-            shutil.copy(path, copy_dst)
-        if os.path.isdir(path):
-            new_dst = os.path.join(dst, item)
-            if not os.path.isdir(new_dst):
-                os.makedirs(add_path_prefix(new_dst))
-            copy_files_in_dir(path, new_dst)
 
+class FileCopier(object):
+    '''
+    Copies the files described by the copy configs ("from", "to", "include" & "exclude").
 
-def copy_files_with_config(config, src_root, dst_root):
-    src_dir = config["from"]
-    dst_dir = config["to"]
+    The source folders are scanned first, then the files are copied by a pool of threads.
+    The files which have the same size & modification time with the destination files are skipped.
+    '''
 
-    src_dir = os.path.join(src_root, src_dir)
-    dst_dir = os.path.join(dst_root, dst_dir)
+    def __init__(self, jobs=None):
+        if jobs is None or jobs < 1:
+            try:
+                jobs = multiprocessing.cpu_count()
+            except NotImplementedError:
+                jobs = 1
+
+        self._jobs = jobs
+        self._files = OrderedDict()
+        self._dirs = set()
+
+        # statistics of the last run
+        self.scanned = 0
+        self.copied = 0
+        self.skipped = 0
+        self.copied_bytes = 0
+        self.elapsed = 0
+
+    def clear(self):
+        self._files.clear()
+        self._dirs.clear()
+
+    def add_config(self, config, src_root, dst_root):
+        src_dir = os.path.join(src_root, config["from"])
+        dst_dir = os.path.join(dst_root, config["to"])
+
+        include_rules = None
+        if "include" in config:
+            include_rules = CopyRules(convert_rules(config["include"]))
+
+        exclude_rules = None
+        if "exclude" in config:
+            exclude_rules = CopyRules(convert_rules(config["exclude"]))
+
+        self.add_rules(src_dir, src_dir, dst_dir, include_rules, exclude_rules)
+
+    def add_rules(self, src_rootDir, src, dst, include=None, exclude=None):
+        if os.path.isfile(src):
+            self._add_file(src, os.path.join(dst, os.path.basename(src)))
+            return
 
-    include_rules = None
-    if "include" in config:
-        include_rules = config["include"]
-        include_rules = convert_rules(include_rules)
+        if (include is None) and (exclude is None):
+            self._add_tree(src, dst)
+        else:
+            rel_dir = os.path.relpath(src, src_rootDir).replace("\\", "/")
+            rel_dir = "" if rel_dir == "." else rel_dir + "/"
+            if include is not None:
+                # the include rules are used if both are specified
+                self._add_tree_with_rules(src, dst, rel_dir, copy_rules.get_rules(include), True)
+            else:
+                self._add_tree_with_rules(src, dst, rel_dir, copy_rules.get_rules(exclude), False)
+
+    def _add_file(self, src, dst_file):
+        self._dirs.add(os.path.dirname(dst_file))
+        # the later one wins if the same destination is used more than once
+        self._files.pop(dst_file, None)
+        self._files[dst_file] = src
+
+    def _add_tree(self, src, dst):
+        self._dirs.add(dst)
+        for name, path, is_dir, is_file in _iter_dir(src):
+            if is_dir:
+                self._add_tree(path, os.path.join(dst, name))
+            elif is_file:
+                self._add_file(path, os.path.join(dst, name))
+
+    def _add_tree_with_rules(self, src, dst, rel_dir, rules, is_include):
+        for name, path, is_dir, is_file in _iter_dir(src):
+            if is_dir:
+                sub_rel_dir = rel_dir + name + "/"
+                # skip the folders which have no file to copy
+                if is_include and not rules.may_match_in(sub_rel_dir):
+                    continue
+                if not is_include and rules.match_all_in(sub_rel_dir):
+                    continue
+
+                self._add_tree_with_rules(path, os.path.join(dst, name), sub_rel_dir, rules, is_include)
+            elif is_file:
+                if rules.match(rel_dir + name) == is_include:
+                    self._add_file(path, os.path.join(dst, name))
+
+    def take_files(self, dst_root, ext, remove=True):
+        '''
+        Returns the added files with the extension in dst_root: [ (source file, path relative to dst_root) ].
+        If `remove` is True, they are not copied, so the caller can generate the destination files from them.
+        '''
+        root = os.path.join(os.path.normpath(dst_root), "")
+        ret = []
+        for dst_file, src in self._files.items():
+            if os.path.splitext(dst_file)[1] == ext and os.path.normpath(dst_file).startswith(root):
+                ret.append((src, os.path.normpath(dst_file)[len(root):]))
+                if remove:
+                    del self._files[dst_file]
 
-    exclude_rules = None
-    if "exclude" in config:
-        exclude_rules = config["exclude"]
-        exclude_rules = convert_rules(exclude_rules)
+        return ret
 
-    copy_files_with_rules(
-        src_dir, src_dir, dst_dir, include_rules, exclude_rules)
+    def prune(self, dst_root, keep_files=None):
+        '''
+        Removes the files & empty folders in dst_root which are not the destination of the added files.
+        The files in `keep_files` are generated by the caller, they are not removed either.
+        '''
+        if not os.path.isdir(dst_root):
+            return
 
+        def _key(path):
+            return os.path.normcase(os.path.normpath(path))
 
-def copy_files_with_rules(src_rootDir, src, dst, include=None, exclude=None):
-    if os.path.isfile(src):
-        if not os.path.exists(dst):
-            os.makedirs(add_path_prefix(dst))
-
-        copy_src = add_path_prefix(src)
-        copy_dst = add_path_prefix(dst)
-        shutil.copy(copy_src, copy_dst)
-        return
-
-    if (include is None) and (exclude is None):
-        if not os.path.exists(dst):
-            os.makedirs(add_path_prefix(dst))
-        copy_files_in_dir(src, dst)
-    elif (include is not None):
-        # have include
-        for name in os.listdir(src):
-            abs_path = os.path.join(src, name)
-            rel_path = os.path.relpath(abs_path, src_rootDir)
-            if os.path.isdir(abs_path):
-                sub_dst = os.path.join(dst, name)
-                copy_files_with_rules(
-                    src_rootDir, abs_path, sub_dst, include=include)
-            elif os.path.isfile(abs_path):
-                if _in_rules(rel_path, include):
-                    if not os.path.exists(dst):
-                        os.makedirs(add_path_prefix(dst))
-
-                    abs_path = add_path_prefix(abs_path)
-                    copy_dst = add_path_prefix(dst)
-                    shutil.copy(abs_path, copy_dst)
-    elif (exclude is not None):
-        # have exclude
-        for name in os.listdir(src):
-            abs_path = os.path.join(src, name)
-            rel_path = os.path.relpath(abs_path, src_rootDir)
-            if os.path.isdir(abs_path):
-                sub_dst = os.path.join(dst, name)
-                copy_files_with_rules(
-                    src_rootDir, abs_path, sub_dst, exclude=exclude)
-            elif os.path.isfile(abs_path):
-                if not _in_rules(rel_path, exclude):
-                    if not os.path.exists(dst):
-                        os.makedirs(add_path_prefix(dst))
-
-                    abs_path = add_path_prefix(abs_path)
-                    copy_dst = add_path_prefix(dst)
-                    shutil.copy(abs_path, copy_dst)
+        keep_files = set(_key(f) for f in list(self._files) + list(keep_files or []))
+        keep_dirs = set(_key(d) for d in self._dirs)
+        root_key = _key(dst_root)
+        for cur_dir, dirs, files in os.walk(dst_root, topdown=False):
+            for f in files:
+                full_path = os.path.join(cur_dir, f)
+                if _key(full_path) not in keep_files:
+                    os.remove(add_path_prefix(full_path))
 
+            cur_key = _key(cur_dir)
+            if cur_key != root_key and cur_key not in keep_dirs and len(os.listdir(cur_dir)) == 0:
+                os.rmdir(add_path_prefix(cur_dir))
 
-def _in_rules(rel_path, rules):
-    ret = False
-    path_str = rel_path.replace("\\", "/")
-    for rule in rules:
-        if re.match(rule, path_str):
-            ret = True
+    @staticmethod
+    def _copy_file(task):
+        dst, src = task
+        src = add_path_prefix(src)
+        dst = add_path_prefix(dst)
+
+        src_stat = os.stat(src)
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            dst_stat = None
+
+        if dst_stat is not None and dst_stat.st_size == src_stat.st_size and \
+                int(dst_stat.st_mtime) == int(src_stat.st_mtime):
+            return -1
+
+        # copy2 keeps the modification time, so the file can be skipped next time
+        shutil.copy2(src, dst)
+        return src_stat.st_size
+
+    def run(self):
+        start_time = time.time()
+        self.scanned = len(self._files)
+        self.copied = 0
+        self.skipped = 0
+        self.copied_bytes = 0
+
+        for d in sorted(self._dirs):
+            if not os.path.isdir(d):
+                os.makedirs(add_path_prefix(d))
+
+        tasks = list(self._files.items())
+        if self._jobs > 1 and len(tasks) > 1:
+            pool = ThreadPool(min(self._jobs, len(tasks)))
+            try:
+                results = pool.imap_unordered(FileCopier._copy_file, tasks, 16)
+                for copied_size in results:
+                    self._count(copied_size)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            for task in tasks:
+                self._count(FileCopier._copy_file(task))
+
+        self.clear()
+        self.elapsed = time.time() - start_time
+
+    def _count(self, copied_size):
+        if copied_size < 0:
+            self.skipped += 1
+        else:
+            self.copied += 1
+            self.copied_bytes += copied_size
+
+    def report(self):
+        Logging.info(MultiLanguage.get_string('COCOS_INFO_COPY_STATS_FMT',
+                                              (self.scanned, self.copied, self.copied_bytes / (1024.0 * 1024.0),
+                                               self.skipped, self.elapsed)))
+
+
+def copy_files_in_dir(src, dst):
+    copier = FileCopier()
+    copier.add_rules(src, src, dst)
+    copier.run()
+
+
+def copy_files_with_config(config, src_root, dst_root):
+    copier = FileCopier()
+    copier.add_config(config, src_root, dst_root)
+    copier.run()
 
-    return ret
 
+def copy_files_with_rules(src_rootDir, src, dst, include=None, exclude=None):
+    copier = FileCopier()
+    copier.add_rules(src_rootDir, src, dst, include, exclude)
+    copier.run()
 
-def convert_rules(rules):
-    ret_rules = []
-    for rule in rules:
-        ret = rule.replace('.', '\\.')
-        ret = ret.replace('*', '.*')
-        ret = "%s" % ret
-        ret_rules.append(ret)
 
-    return ret_rules
+def _in_rules(rel_path, rules):
+    return copy_rules.get_rules(rules).match(rel_path)
 
 
 def os_is_win32():
@@ -947,6 +1225,13 @@ def show_version():
     print(COCOS_ENGINE_VERSION)
     print("Cocos Console %s" % COCOS2D_CONSOLE_VERSION)
 
+def _profile_step(step):
+    # the profiler is only imported with --profile-startup
+    profiler = sys.modules.get('startup_profiler')
+    if profiler is not None:
+        profiler.mark(step)
+
+
 def run_plugin(command, argv, plugins):
     run_directly = False
     if len(argv) > 0:
@@ -954,6 +1239,7 @@ def run_plugin(command, argv, plugins):
             run_directly = True
 
     plugin = plugins[command]()
+    _profile_step('plugin %s created' % command)
 
     if run_directly:
         plugin.run(argv, None)
@@ -968,6 +1254,7 @@ def run_plugin(command, argv, plugins):
         # don't print this info. Not useful to users, and generates noise when parsing output
 #        Logging.info(MultiLanguage.get_string('COCOS_INFO_RUNNING_PLUGIN_FMT', plugin.__class__.plugin_name()))
         plugin.run(argv, dependencies_objects)
+        _profile_step('plugin %s finished' % command)
         return plugin
 
 
@@ -1006,6 +1293,13 @@ else:
     _ = MultiLanguage.get_string
 
 if __name__ == "__main__":
+    profile_arg = '--profile-startup'
+    if profile_arg in sys.argv:
+        sys.argv.remove(profile_arg)
+        import atexit
+        atexit.register(startup_profiler.report)
+        _profile_step('cocos imported')
+
     # Parse the arguments, specify the language
     language_arg = '--ol'
     if language_arg in sys.argv:
@@ -1052,6 +1346,7 @@ if __name__ == "__main__":
 
     DataStatistic.show_stat_agreement(skip_agree_value)
     DataStatistic.stat_event('cocos', 'start', 'invoked')
+    _profile_step('statistics started')
 
     if not _check_python_version():
         DataStatistic.terminate_stat()
@@ -1073,6 +1368,7 @@ if __name__ == "__main__":
 
     try:
         plugins = parser.parse_plugins()
+        _profile_step('plugins parsed')
         command = sys.argv[1]
         argv = sys.argv[2:]
         # try to find plugin by name
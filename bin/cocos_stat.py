@@ -25,17 +25,27 @@ import hashlib
 import datetime
 import zlib
 
-import multiprocessing
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # GA related Constants
 
 GA_HOST        = 'www.google-analytics.com'
 GA_PATH        = '/collect'
+GA_BATCH_PATH  = '/batch'
 GA_APIVERSION  = '1'
 APPNAME     = 'CocosConcole'
 
 TIMEOUT_VALUE = 0.5
 
+# GA accepts at most 20 hits in one batch request
+GA_MAX_BATCH_EVENTS = 20
+
 # formal tracker ID
 GA_TRACKERID = 'UA-60734607-3'
 
@@ -67,19 +77,24 @@ class Fields(object):
     SCREEN_RESOLUTION = "sr"
 
 
-GA_CACHE_EVENTS_FILE = 'cache_events'
+MAX_CACHE_EVENTS = 50
+
+# the events are cached in journals, one event per line
+GA_CACHE_EVENTS_FILE = 'cache_events.journal'
+BI_CACHE_EVENTS_FILE = 'bi_cache_events.journal'
+
+# the cache files of the old versions, the whole file is a list of events
+GA_OLD_CACHE_EVENTS_FILE = 'cache_events'
 GA_CACHE_EVENTS_BAK_FILE = 'cache_event_bak'
+BI_OLD_CACHE_EVENTS_FILE = 'bi_cache_events'
 
 local_cfg_path = os.path.expanduser('~/.cocos')
 local_cfg_file = os.path.join(local_cfg_path, GA_CACHE_EVENTS_FILE)
+local_cfg_old_file = os.path.join(local_cfg_path, GA_OLD_CACHE_EVENTS_FILE)
 local_cfg_bak_file = os.path.join(local_cfg_path, GA_CACHE_EVENTS_BAK_FILE)
-file_in_use_lock = multiprocessing.Lock()
-bak_file_in_use_lock = multiprocessing.Lock()
-
 
-BI_CACHE_EVENTS_FILE = 'bi_cache_events'
 bi_cfg_file = os.path.join(local_cfg_path, BI_CACHE_EVENTS_FILE)
-bi_file_in_use_lock = multiprocessing.Lock()
+bi_cfg_old_file = os.path.join(local_cfg_path, BI_OLD_CACHE_EVENTS_FILE)
 
 def get_user_id():
     node = uuid.getnode()
@@ -216,7 +231,7 @@ def gen_bi_event(event, event_value):
 
     return ret
 
-def get_bi_params(events, event_value, multi_events=False, engine_versio=''):
+def get_bi_params(events, event_value, multi_events=False, engine_version=''):
     if cocos.os_is_win32():
         system_str = 'windows'
         ver_info = sys.getwindowsversion()
@@ -259,162 +274,194 @@ def get_bi_params(events, event_value, multi_events=False, engine_versio=''):
 
     return params
 
-def cache_event(event, is_ga=True, multi_events=False):
-    if is_ga:
-        cache_ga_event(event)
-    else:
-        cache_bi_event(event, multi_events)
-
-# BI cache events related methods
-def cache_bi_event(event, multi_events=False):
-    bi_file_in_use_lock.acquire()
-
-    outFile = None
-    try:
-        # get current cached events
-        cache_events = get_bi_cached_events(need_lock=False)
-
-        if multi_events:
-            need_cache_size = len(event)
-        else:
-            need_cache_size = 1
+class EventJournal(object):
+    """
+    The cached events saved in a file, one event per line in JSON.
+
+    The events are appended to the end of the file, so caching an event doesn't
+    read or rewrite the cached ones. Only the last `max_events` events are kept:
+    they are trimmed when the journal is read, and the file is compacted when
+    it grows bigger than COMPACT_SIZE.
+
+    The file is locked by a lock file beside it, so the journal can be used by
+    several cocos processes at the same time.
+    """
+
+    COMPACT_SIZE = 64 * 1024
+
+    def __init__(self, path, old_path=None, max_events=MAX_CACHE_EVENTS):
+        self.path = path
+        self.old_path = old_path
+        self.lock_path = path + '.lock'
+        self.max_events = max_events
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        # the file lock is owned by the process, so the threads are locked too
+        self._thread_lock.acquire()
+        lock_file = None
+        try:
+            # the lock file is in the folder of the journal, which doesn't exist on a fresh home
+            dir_path = os.path.dirname(self.path)
+            if dir_path and not os.path.isdir(dir_path):
+                try:
+                    os.makedirs(dir_path)
+                except OSError:
+                    # created by another process
+                    if not os.path.isdir(dir_path):
+                        raise
+
+            lock_file = open(self.lock_path, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            yield
+        finally:
+            if lock_file is not None:
+                # the lock is released when the file is closed
+                lock_file.close()
+            self._thread_lock.release()
 
-        # delete the oldest events if there are too many events.
-        events_size = len(cache_events)
-        if events_size >= Statistic.MAX_CACHE_EVENTS:
-            start_idx = events_size - (Statistic.MAX_CACHE_EVENTS - need_cache_size)
-            cache_events = cache_events[start_idx:]
+    @staticmethod
+    def _load_old_file(path):
+        # a cache file of the old versions, the whole file is a list of events
+        if path is None or not os.path.isfile(path):
+            return []
 
-        # cache the new event
-        if multi_events:
-            for e in event:
-                cache_events.append(e)
-        else:
-            cache_events.append(event)
-
-        # write file
-        outFile = open(bi_cfg_file, 'w')
-        json.dump(cache_events, outFile)
-        outFile.close()
-    except:
-        if outFile is not None:
-            outFile.close()
-    finally:
-        bi_file_in_use_lock.release()
-
-def get_bi_cached_events(need_lock=True):
-    if not os.path.isfile(bi_cfg_file):
-        cached_events = []
-    else:
-        f = None
         try:
-            if need_lock:
-                bi_file_in_use_lock.acquire()
-
-            f = open(bi_cfg_file)
-            cached_events = json.load(f)
+            f = open(path)
+            events = json.load(f)
             f.close()
-
-            if not isinstance(cached_events, list):
-                cached_events = []
         except:
-            cached_events = []
-        finally:
-            if f is not None:
+            events = []
+
+        if not isinstance(events, list):
+            events = []
+
+        return events
+
+    def _read_old_events(self):
+        return EventJournal._load_old_file(self.old_path)
+
+    def _remove_old_file(self):
+        if self.old_path is not None and os.path.isfile(self.old_path):
+            os.remove(self.old_path)
+
+    def _read_events(self):
+        events = self._read_old_events()
+        if os.path.isfile(self.path):
+            f = open(self.path, 'rb')
+            try:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        # the line is not written completely
+                        pass
+            finally:
                 f.close()
 
-            if need_lock:
-                bi_file_in_use_lock.release()
+        return events[-self.max_events:]
 
-    return cached_events
+    def _write_events(self, events):
+        tmp_path = self.path + '.tmp'
+        f = open(tmp_path, 'wb')
+        try:
+            for e in events:
+                f.write(json.dumps(e) + '\n')
+        finally:
+            f.close()
 
-# GA cache events related methods
-def get_ga_cached_events(is_bak=False, need_lock=True):
-    if is_bak:
-        cfg_file = local_cfg_bak_file
-        lock = bak_file_in_use_lock
-    else:
-        cfg_file = local_cfg_file
-        lock = file_in_use_lock
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        os.rename(tmp_path, self.path)
 
-    if not os.path.isfile(cfg_file):
-        cached_events = []
-    else:
-        f = None
-        try:
-            if need_lock:
-                lock.acquire()
+    def append(self, events):
+        if len(events) == 0:
+            return
 
-            f = open(cfg_file)
-            cached_events = json.load(f)
-            f.close()
+        with self._locked():
+            self._append_events(events)
 
-            if not isinstance(cached_events, list):
-                cached_events = []
-        except:
-            cached_events = []
+    def _append_events(self, events):
+        f = open(self.path, 'ab')
+        try:
+            f.write(''.join([ json.dumps(e) + '\n' for e in events ]))
+            f.flush()
+            size = os.fstat(f.fileno()).st_size
         finally:
-            if f is not None:
-                f.close()
-            if need_lock:
-                lock.release()
-
-    return cached_events
+            f.close()
 
-def cache_ga_event(event):
-    file_in_use_lock.acquire()
+        if size > EventJournal.COMPACT_SIZE:
+            # the events of the old cache file are moved into the journal
+            self._write_events(self._read_events())
+            self._remove_old_file()
+
+    def merge_old_file(self, path):
+        """
+        Moves the events of another cache file of the old versions into the journal.
+        """
+        with self._locked():
+            events = EventJournal._load_old_file(path)
+            if len(events) > 0:
+                self._append_events(events)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def read(self):
+        with self._locked():
+            return self._read_events()
+
+    def drain(self):
+        """
+        Gets all the cached events & removes them from the journal.
+        """
+        with self._locked():
+            events = self._read_events()
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+            self._remove_old_file()
+
+        return events
+
+ga_journal = EventJournal(local_cfg_file, local_cfg_old_file)
+bi_journal = EventJournal(bi_cfg_file, bi_cfg_old_file)
+
+def get_journal(is_ga=True):
+    return ga_journal if is_ga else bi_journal
 
-    outFile = None
+def cache_event(event, is_ga=True, multi_events=False):
     try:
-        # get current cached events
-        cache_events = get_ga_cached_events(is_bak=False, need_lock=False)
-
-        # delete the oldest events if there are too many events.
-        events_size = len(cache_events)
-        if events_size >= Statistic.MAX_CACHE_EVENTS:
-            start_idx = events_size - (Statistic.MAX_CACHE_EVENTS - 1)
-            cache_events = cache_events[start_idx:]
-
-        # cache the new event
-        cache_events.append(event)
-
-        # write file
-        outFile = open(local_cfg_file, 'w')
-        json.dump(cache_events, outFile)
-        outFile.close()
+        if multi_events:
+            events = list(event)
+        else:
+            events = [ event ]
+        get_journal(is_ga).append(events)
     except:
-        if outFile is not None:
-            outFile.close()
-    finally:
-        file_in_use_lock.release()
-
-def pop_bak_ga_cached_event():
-    bak_file_in_use_lock.acquire()
-    events = get_ga_cached_events(is_bak=True, need_lock=False)
-
-    if len(events) > 0:
-        e = events[0]
-        events = events[1:]
-        outFile = None
-        try:
-            outFile = open(local_cfg_bak_file, 'w')
-            json.dump(events, outFile)
-            outFile.close()
-        except:
-            if outFile:
-                outFile.close()
-    else:
-        e = None
+        pass
 
-    bak_file_in_use_lock.release()
+def get_bi_cached_events():
+    try:
+        return bi_journal.read()
+    except:
+        return []
 
-    return e
+def get_ga_cached_events():
+    try:
+        return ga_journal.read()
+    except:
+        return []
 
-def do_send_ga_cached_event(engine_version):
-    e = pop_bak_ga_cached_event()
-    while(e is not None):
-        do_send(e, 0, is_ga=True, multi_events=False, engine_version=engine_version)
-        e = pop_bak_ga_cached_event()
+def take_cached_events(is_ga=True):
+    # get the cached events & remove them from the journal
+    try:
+        return get_journal(is_ga).drain()
+    except:
+        return []
 
 def get_params_str(event, event_value, is_ga=True, multi_events=False, engine_version=''):
     if is_ga:
@@ -431,93 +478,193 @@ def get_params_str(event, event_value, is_ga=True, multi_events=False, engine_ve
 
     return params_str
 
-def do_http_request(event, event_value, is_ga=True, multi_events=False, engine_version=''):
+def do_http_request(conns, host_url, host_path, body):
+    # the connections are kept in `conns` & reused by the next requests
     ret = False
-    conn = None
+    conn = conns.get(host_url)
     try:
-        params_str = get_params_str(event, event_value, is_ga, multi_events, engine_version)
-        if is_ga:
-            host_url = GA_HOST
-            host_path = GA_PATH
-        else:
-            host_url = BI_HOST
-            host_path = BI_PATH
+        if conn is None:
+            conn = httplib.HTTPConnection(host_url, timeout=TIMEOUT_VALUE)
+            conns[host_url] = conn
 
-        socket.setdefaulttimeout(TIMEOUT_VALUE)
-
-        conn = httplib.HTTPConnection(host_url, timeout=TIMEOUT_VALUE)
-        conn.request(method="POST", url=host_path, body=params_str)
+        conn.request(method="POST", url=host_path, body=body)
 
         response = conn.getresponse()
+        response.read()
         res = response.status
         if res >= 200 and res < 300:
             # status is 2xx mean the request is success.
             ret = True
         else:
             ret = False
+
+        if response.will_close:
+            conn.close()
+            del conns[host_url]
     except:
-        pass
-    finally:
-        if conn:
+        if conn is not None:
             conn.close()
+            del conns[host_url]
 
     return ret
 
-def do_send(event, event_value, is_ga=True, multi_events=False, engine_version=''):
-    try:
-        ret = do_http_request(event, event_value, is_ga, multi_events, engine_version)
+def send_events(conns, items, engine_version=''):
+    """
+    Sends the events in batches.
+    `items` is a list of (is_ga, event, event_value).
+    Returns the items which are failed to be sent.
+    """
+    failed = []
+
+    # GA events are sent by the batch API, one hit per line
+    ga_items = [ item for item in items if item[0] ]
+    for i in range(0, len(ga_items), GA_MAX_BATCH_EVENTS):
+        batch = ga_items[i : i + GA_MAX_BATCH_EVENTS]
+        try:
+            body = '\n'.join([ get_params_str(e, v, True, False, engine_version) for is_ga, e, v in batch ])
+            ret = do_http_request(conns, GA_HOST, GA_BATCH_PATH, body)
+        except:
+            ret = False
+
         if not ret:
-            # request failed, cache the event
-            cache_event(event, is_ga, multi_events)
-    except:
-        pass
+            failed.extend(batch)
+
+    # BI events with the same value are sent in one request
+    for value in (1, 0):
+        batch = [ item for item in items if not item[0] and item[2] == value ]
+        if len(batch) == 0:
+            continue
+
+        try:
+            body = get_params_str([ e for is_ga, e, v in batch ], value, False, True, engine_version)
+            ret = do_http_request(conns, BI_HOST, BI_PATH, body)
+        except:
+            ret = False
+
+        if not ret:
+            failed.extend(batch)
+
+    return failed
+
+def cache_items(items):
+    ga_events = [ e for is_ga, e, v in items if is_ga ]
+    bi_events = [ e for is_ga, e, v in items if not is_ga ]
+    if len(ga_events) > 0:
+        cache_event(ga_events, is_ga=True, multi_events=True)
+
+    if len(bi_events) > 0:
+        cache_event(bi_events, is_ga=False, multi_events=True)
+
+class EventSender(object):
+    """
+    Sends the events in a background thread.
+    The events queued while a request is running are sent together in the next one.
+    The events which are failed or not sent before exiting are cached.
+    """
+
+    def __init__(self, engine_version):
+        self.engine_version = engine_version
+        self._thread = None
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sending = []
+        self._stopping = False
+        self._stopped = False
+
+    def add_events(self, is_ga, events, event_value):
+        with self._cond:
+            items = [ (is_ga, e, event_value) for e in events ]
+            if self._stopped:
+                cache_items(items)
+                return
+
+            self._queue.extend(items)
+            self._cond.notify()
+
+            # a thread can't be started again, a new one is created if the last one has exited
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="cocos_stat")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        conns = {}
+        try:
+            while True:
+                with self._cond:
+                    while len(self._queue) == 0 and not self._stopping:
+                        self._cond.wait()
+
+                    if len(self._queue) == 0:
+                        break
+
+                    self._sending = self._queue
+                    self._queue = []
+                    items = self._sending
+
+                failed = send_events(conns, items, self.engine_version)
+
+                with self._cond:
+                    if self._stopped:
+                        # stop() has cached the events being sent
+                        break
+
+                    self._sending = []
+                    cache_items(failed)
+        except:
+            # the events being sent are cached, the queued ones are sent by the next thread
+            with self._cond:
+                items = self._sending
+                self._sending = []
+                cache_items(items)
+        finally:
+            for conn in conns.values():
+                conn.close()
+
+    def stop(self, timeout):
+        """
+        Waits the queued events to be sent for `timeout` seconds at most,
+        then caches the events left.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+        with self._cond:
+            self._stopped = True
+            items = self._sending + self._queue
+            self._sending = []
+            self._queue = []
+            cache_items(items)
 
 class Statistic(object):
 
-    MAX_CACHE_EVENTS = 50
-    MAX_CACHE_PROC = 5
+    MAX_CACHE_EVENTS = MAX_CACHE_EVENTS
+
+    # the max time to wait for the events to be sent when exiting
+    FLUSH_TIMEOUT = TIMEOUT_VALUE
 
     def __init__(self, engine_version):
-        self.process_pool = []
         self.engine_version = engine_version
-        if cocos.os_is_win32():
-            multiprocessing.freeze_support()
+        self.sender = EventSender(engine_version)
 
     def send_cached_events(self):
         try:
             # send GA cached events
             if GA_ENABLED:
-                events = get_ga_cached_events()
-                event_size = len(events)
-                if event_size == 0:
-                    return
-
-                # rename the file
-                if os.path.isfile(local_cfg_bak_file):
-                    os.remove(local_cfg_bak_file)
-                os.rename(local_cfg_file, local_cfg_bak_file)
-
-                # create processes to handle the events
-                proc_num = min(event_size, Statistic.MAX_CACHE_PROC)
-                for i in range(proc_num):
-                    p = multiprocessing.Process(target=do_send_ga_cached_event, args=(self.engine_version,))
-                    p.start()
-                    self.process_pool.append(p)
+                events = take_cached_events(is_ga=True)
+                if len(events) > 0:
+                    self.sender.add_events(True, events, 0)
 
             # send BI cached events
             if BI_ENABLED:
-                events = get_bi_cached_events()
-                event_size = len(events)
-                if event_size == 0:
-                    return
-
-                # remove the cached events file
-                if os.path.isfile(bi_cfg_file):
-                    os.remove(bi_cfg_file)
-
-                p = multiprocessing.Process(target=do_send, args=(events, 0, False, True, self.engine_version,))
-                p.start()
-                self.process_pool.append(p)
+                events = take_cached_events(is_ga=False)
+                if len(events) > 0:
+                    self.sender.add_events(False, events, 0)
         except:
             pass
 
@@ -527,34 +674,21 @@ class Statistic(object):
 
             # send event to GA
             if GA_ENABLED:
-                p = multiprocessing.Process(target=do_send, args=(event, 1, True, False, self.engine_version,))
-                p.start()
-                self.process_pool.append(p)
+                self.sender.add_events(True, [ event ], 1)
 
             # send event to BI
             if BI_ENABLED:
                 # add timestamp
-                event.append(get_time_stamp())
-                p = multiprocessing.Process(target=do_send, args=(event, 1, False, False, self.engine_version,))
-                p.start()
-                self.process_pool.append(p)
+                bi_event = event + [ get_time_stamp() ]
+                self.sender.add_events(False, [ bi_event ], 1)
         except:
             pass
 
     def terminate_stat(self):
-        # terminate sub-processes
-        if len(self.process_pool) > 0:
-            alive_count = 0
-            for p in self.process_pool:
-                if p.is_alive():
-                    alive_count += 1
-
-            if alive_count > 0:
-                time.sleep(1)
-                for p in self.process_pool:
-                    if p.is_alive():
-                        p.terminate()
-
-        # remove the backup file
-        if os.path.isfile(local_cfg_bak_file):
-            os.remove(local_cfg_bak_file)
+        self.sender.stop(Statistic.FLUSH_TIMEOUT)
+
+        # the events of the backup file used by the old versions are sent next time
+        try:
+            ga_journal.merge_old_file(local_cfg_bak_file)
+        except:
+            pass
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# copy_rules: Include & exclude rules used when copying files
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Include & exclude rules used when copying files.
+
+A rule is a path relative to the source folder which may contain '*'. It is
+matched against the beginning of the relative path of a file, which uses '/'
+as separator.
+'''
+
+import re
+
+# characters which make the converted rule a regular expression we can't analyse
+_REGEX_CHARS = set('?+[](){}|^$\\')
+
+
+def convert_rules(rules):
+    ret_rules = []
+    for rule in rules:
+        ret = rule.replace('.', '\\.')
+        ret = ret.replace('*', '.*')
+        ret = "%s" % ret
+        ret_rules.append(ret)
+
+    return ret_rules
+
+
+def _literal_prefix(pattern):
+    '''
+    Returns (prefix, match_all) for a converted rule.
+    `prefix` is the literal text every matched path starts with, None if unknown.
+    `match_all` is True if the rule matches every path which starts with `prefix`.
+    '''
+    prefix = []
+    i = 0
+    length = len(pattern)
+    while i < length:
+        c = pattern[i]
+        if pattern.startswith('\\.', i):
+            prefix.append('.')
+            i += 2
+        elif pattern.startswith('.*', i):
+            # the rest of the rule can't be used as prefix
+            rest = pattern[i:]
+            match_all = (rest.replace('.*', '') == '')
+            return ''.join(prefix), match_all
+        elif c == '.' or c in _REGEX_CHARS:
+            return None, False
+        else:
+            prefix.append(c)
+            i += 1
+
+    # re.match() doesn't need to match the whole path
+    return ''.join(prefix), True
+
+
+class CopyRules(object):
+    '''
+    A set of converted rules compiled into one regular expression.
+    The literal prefixes of the rules are used to skip the folders
+    which can't contain any matched file.
+    '''
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        if len(self.rules) > 0:
+            self._regex = re.compile('|'.join(['(?:%s)' % r for r in self.rules]))
+        else:
+            self._regex = None
+
+        self._prefixes = []
+        full_prefixes = []
+        for r in self.rules:
+            prefix, match_all = _literal_prefix(r)
+            if prefix is None:
+                # can't know which folders the rule may match
+                self._prefixes = None
+                break
+
+            self._prefixes.append(prefix)
+            if match_all:
+                full_prefixes.append(prefix)
+        self._full_prefixes = tuple(full_prefixes)
+
+    def match(self, rel_path):
+        if self._regex is None:
+            return False
+
+        return self._regex.match(rel_path.replace("\\", "/")) is not None
+
+    def may_match_in(self, rel_dir):
+        '''
+        Returns False if no file in the folder can be matched.
+        `rel_dir` is the relative path of the folder, ends with '/'.
+        '''
+        if self._prefixes is None:
+            return True
+
+        for prefix in self._prefixes:
+            if prefix.startswith(rel_dir) or rel_dir.startswith(prefix):
+                return True
+
+        return False
+
+    def match_all_in(self, rel_dir):
+        '''
+        Returns True if all the files in the folder are matched.
+        `rel_dir` is the relative path of the folder, ends with '/'.
+        '''
+        return len(self._full_prefixes) > 0 and rel_dir.startswith(self._full_prefixes)
+
+
+def get_rules(rules):
+    # accepts both the converted rules list & the CopyRules object
+    if rules is None or isinstance(rules, CopyRules):
+        return rules
+
+    return CopyRules(rules)
@@ -0,0 +1,443 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# downloader: Resumable HTTP downloads
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Resumable HTTP downloads, shared by the package downloads & download-bin.py.
+
+- The file is downloaded into `<path>.part`. The downloaded ranges are saved in
+  `<path>.part.json`, so an interrupted download goes on with Range requests.
+- A large file is downloaded by several connections, each one writes its own
+  chunk of the file.
+- The content is hashed while it's written, the file is not read again.
+- The downloaded files are kept in a cache folder keyed by the url & the checksum,
+  so downloading the same file again is a copy. The url of a file without checksum
+  must change with its content.
+
+This module doesn't depend on cocos, download-bin.py uses it before the console
+is set up.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+import httplib
+import urllib2
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cocos', 'downloads')
+
+
+class DownloadError(Exception):
+    pass
+
+
+class _RestartDownload(Exception):
+    # the server can't resume the download
+    pass
+
+
+class _OrderedHasher(object):
+    '''
+    Hashes the content of the file in order while the chunks are written.
+    The data written at the hashed offset is hashed at once, the data of the
+    later chunks is read back when the hashed offset reaches it.
+    '''
+
+    def __init__(self, path, hash_name):
+        self._path = path
+        self._hash = hashlib.new(hash_name)
+        self._offset = 0
+        # start -> end of the written data which is not hashed yet
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add_written(self, start, end):
+        # data written before the hasher is created
+        if end > start:
+            with self._lock:
+                self._pending[start] = end
+                self._catch_up()
+
+    def update(self, start, data):
+        with self._lock:
+            end = start + len(data)
+            if start == self._offset:
+                self._hash.update(data)
+                self._offset = end
+                self._catch_up()
+            else:
+                for pending_start, pending_end in self._pending.items():
+                    if pending_end == start:
+                        self._pending[pending_start] = end
+                        break
+                else:
+                    self._pending[start] = end
+
+    def _catch_up(self):
+        while self._offset in self._pending:
+            end = self._pending.pop(self._offset)
+            f = open(self._path, 'rb')
+            try:
+                f.seek(self._offset)
+                while self._offset < end:
+                    data = f.read(min(Downloader.BLOCK_SIZE, end - self._offset))
+                    if not data:
+                        raise DownloadError('%s is truncated' % self._path)
+                    self._hash.update(data)
+                    self._offset += len(data)
+            finally:
+                f.close()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class Downloader(object):
+    '''
+    Downloads `url` to `path`.
+
+    `checksum` is the hex digest of the file (`hash_name` is the algorithm).
+    `size` is used to show the progress if the server doesn't tell the size.
+    `progress` is called with (downloaded size, total size) at most once per second.
+    '''
+
+    BLOCK_SIZE = 64 * 1024
+    # the files smaller than it are downloaded by one connection
+    MIN_CHUNK_SIZE = 4 * 1024 * 1024
+    SAVE_STATE_INTERVAL = 1.0
+    RETRY_TIMES = 3
+
+    def __init__(self, url, path, checksum=None, hash_name='md5', size=0, connections=4,
+                 cache_dir=DEFAULT_CACHE_DIR, use_cache=True, timeout=30, progress=None):
+        self.url = url
+        self.path = path
+        self.checksum = checksum.lower() if checksum else None
+        self.hash_name = hash_name
+        self.size = size
+        self.connections = max(1, connections)
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.timeout = timeout
+        self.progress = progress
+
+        self.part_path = path + '.part'
+        self.state_path = path + '.part.json'
+        self.digest = None
+        self.from_cache = False
+        self.resumed_size = 0
+
+        self._lock = threading.Lock()
+        self._total = None
+        self._downloaded = 0
+        self._last_progress_time = 0
+        self._last_save_time = 0
+
+    # ---------- cache ----------
+
+    def get_cache_path(self):
+        if self.cache_dir is None:
+            return None
+
+        key = hashlib.sha1('%s\n%s:%s' % (self.url, self.hash_name, self.checksum or '')).hexdigest()
+        return os.path.join(self.cache_dir, key, os.path.basename(self.path))
+
+    def _copy_file(self, src, dst):
+        # the destination appears complete or not at all
+        tmp_path = '%s.%d.tmp' % (dst, os.getpid())
+        shutil.copyfile(src, tmp_path)
+        self._replace(tmp_path, dst)
+
+    @staticmethod
+    def _replace(src, dst):
+        # rename() can't replace a file on Windows
+        if sys.platform == 'win32' and os.path.isfile(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+    def _restore_from_cache(self):
+        cache_path = self.get_cache_path()
+        if not self.use_cache or cache_path is None or not os.path.isfile(cache_path):
+            return False
+
+        self._copy_file(cache_path, self.path)
+        self.digest = self.checksum
+        self.from_cache = True
+        return True
+
+    def _store_in_cache(self):
+        cache_path = self.get_cache_path()
+        if cache_path is None:
+            return
+
+        try:
+            cache_folder = os.path.dirname(cache_path)
+            if not os.path.isdir(cache_folder):
+                os.makedirs(cache_folder)
+            self._copy_file(self.path, cache_path)
+        except (IOError, OSError):
+            # the download is done, only the cache is not updated
+            pass
+
+    # ---------- state ----------
+
+    def _load_state(self):
+        if not os.path.isfile(self.state_path) or not os.path.isfile(self.part_path):
+            return None
+
+        try:
+            f = open(self.state_path, 'rb')
+            state = json.load(f)
+            f.close()
+        except ValueError:
+            return None
+
+        if state.get('url') != self.url or state.get('checksum') != self.checksum:
+            return None
+
+        return state
+
+    def _save_state(self, state, force=False):
+        now = time.time()
+        if not force and now - self._last_save_time < Downloader.SAVE_STATE_INTERVAL:
+            return
+
+        self._last_save_time = now
+        tmp_path = '%s.%d.tmp' % (self.state_path, os.getpid())
+        f = open(tmp_path, 'wb')
+        try:
+            json.dump(state, f)
+        finally:
+            f.close()
+        self._replace(tmp_path, self.state_path)
+
+    def get_partial_size(self):
+        '''
+        Returns the size downloaded by an interrupted download, which will be resumed.
+        '''
+        state = self._load_state()
+        if state is None:
+            return 0
+
+        return sum([ c[1] - c[0] for c in state['chunks'] ])
+
+    def _remove_partial(self):
+        for path in (self.part_path, self.state_path):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    # ---------- download ----------
+
+    def _open(self, start=None, end=None, validator=None):
+        request = urllib2.Request(self.url)
+        if start is not None:
+            if end is None:
+                request.add_header('Range', 'bytes=%d-' % start)
+            else:
+                request.add_header('Range', 'bytes=%d-%d' % (start, end - 1))
+            if validator:
+                # the whole file is sent if it's changed on the server
+                request.add_header('If-Range', validator)
+
+        try:
+            return urllib2.urlopen(request, timeout=self.timeout)
+        except urllib2.HTTPError as e:
+            if e.code == 416:
+                raise _RestartDownload()
+            raise DownloadError('HTTP %d : %s' % (e.code, self.url))
+
+    @staticmethod
+    def _get_range_start(response):
+        # returns the start of the range in the response, None if it's the whole file
+        if response.getcode() != 206:
+            return None
+
+        content_range = response.info().getheader('Content-Range', '')
+        try:
+            return int(content_range.split()[1].split('-')[0])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def _get_total_size(response):
+        info = response.info()
+        if response.getcode() == 206:
+            try:
+                return int(info.getheader('Content-Range', '').split('/')[1])
+            except (IndexError, ValueError):
+                return None
+
+        length = info.getheader('Content-Length')
+        if length is not None and length.isdigit():
+            return int(length)
+
+        return None
+
+    def _report(self, size):
+        with self._lock:
+            self._downloaded += size
+            now = time.time()
+            if self.progress is not None and now - self._last_progress_time > 1:
+                self._last_progress_time = now
+                self.progress(self._downloaded, self._total or self.size)
+
+    def _download_chunk(self, chunk, state, hasher, response=None):
+        # chunk is [start, position, end], end is None if the size is unknown
+        retry = 0
+        while chunk[2] is None or chunk[1] < chunk[2]:
+            try:
+                if response is None:
+                    response = self._open(chunk[1], chunk[2], state.get('validator'))
+                    if Downloader._get_range_start(response) != chunk[1]:
+                        response.close()
+                        raise _RestartDownload()
+
+                # not buffered, the saved state is never ahead of the file
+                f = open(self.part_path, 'r+b', 0)
+                try:
+                    f.seek(chunk[1])
+                    while chunk[2] is None or chunk[1] < chunk[2]:
+                        read_size = Downloader.BLOCK_SIZE
+                        if chunk[2] is not None:
+                            read_size = min(read_size, chunk[2] - chunk[1])
+                        data = response.read(read_size)
+                        if not data:
+                            break
+                        f.write(data)
+                        hasher.update(chunk[1], data)
+                        with self._lock:
+                            chunk[1] += len(data)
+                            if state['resumable']:
+                                self._save_state(state)
+                        self._report(len(data))
+                finally:
+                    f.close()
+                    response.close()
+                    response = None
+
+                if chunk[2] is None:
+                    chunk[2] = chunk[1]
+                elif chunk[1] < chunk[2]:
+                    raise IOError('connection closed')
+            except _RestartDownload:
+                raise
+            except (IOError, httplib.HTTPException, DownloadError):
+                # go on from the downloaded position
+                retry += 1
+                if retry > Downloader.RETRY_TIMES or not state['resumable']:
+                    raise
+
+    def _start(self):
+        # request the whole file, a range response tells whether the download can be resumed
+        response = self._open(0)
+        total = Downloader._get_total_size(response)
+        resumable = Downloader._get_range_start(response) == 0 and total is not None
+        info = response.info()
+        validator = info.getheader('ETag') or info.getheader('Last-Modified')
+
+        chunks = [ [0, 0, total] ]
+        if resumable and self.connections > 1 and total >= 2 * Downloader.MIN_CHUNK_SIZE:
+            count = min(self.connections, total / Downloader.MIN_CHUNK_SIZE)
+            chunk_size = total / count
+            chunks = [ [i * chunk_size, i * chunk_size, (i + 1) * chunk_size] for i in range(count) ]
+            chunks[-1][2] = total
+
+        state = {
+            'url': self.url,
+            'checksum': self.checksum,
+            'size': total,
+            'validator': validator,
+            'resumable': resumable,
+            'chunks': chunks
+        }
+
+        f = open(self.part_path, 'wb')
+        f.close()
+        if resumable:
+            self._save_state(state, True)
+
+        return state, response
+
+    def _download(self):
+        state = self._load_state()
+        response = None
+        if state is None:
+            state, response = self._start()
+        else:
+            self.resumed_size = self.get_partial_size()
+
+        self._total = state['size']
+        self._downloaded = self.resumed_size
+        hasher = _OrderedHasher(self.part_path, self.hash_name)
+        for chunk in state['chunks']:
+            hasher.add_written(chunk[0], chunk[1])
+
+        # the first chunk uses the response of the first request
+        tasks = [ (chunk, response if i == 0 else None) for i, chunk in enumerate(state['chunks']) ]
+        try:
+            if len(tasks) == 1:
+                self._download_chunk(tasks[0][0], state, hasher, tasks[0][1])
+            else:
+                # the other chunks are finished if one of them fails, only it's downloaded again
+                pool = ThreadPool(len(tasks))
+                try:
+                    pool.map(lambda task: self._download_chunk(task[0], state, hasher, task[1]), tasks)
+                    pool.close()
+                except:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+        finally:
+            if response is not None:
+                response.close()
+            if state['resumable']:
+                with self._lock:
+                    self._save_state(state, True)
+
+        return hasher.hexdigest()
+
+    def run(self):
+        '''
+        Downloads the file, returns the path of the file.
+        Raises DownloadError if it can't be downloaded or the checksum doesn't match.
+        '''
+        if self._restore_from_cache():
+            return self.path
+
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        try:
+            try:
+                digest = self._download()
+            except _RestartDownload:
+                # the file is changed on the server, or it can't be resumed
+                self._remove_partial()
+                self.resumed_size = 0
+                digest = self._download()
+        except _RestartDownload:
+            raise DownloadError('%s : the file is changed while it is downloaded' % self.url)
+        except urllib2.URLError as e:
+            raise DownloadError('%s : %s' % (self.url, e.reason))
+        except (IOError, httplib.HTTPException) as e:
+            raise DownloadError('%s : %s' % (self.url, e))
+
+        if self.checksum is not None and digest != self.checksum:
+            self._remove_partial()
+            raise DownloadError('The %s of %s is %s, %s is expected.' % (self.hash_name, self.url, digest, self.checksum))
+
+        self._replace(self.part_path, self.path)
+        if os.path.isfile(self.state_path):
+            os.remove(self.state_path)
+
+        self.digest = digest
+        self._store_in_cache()
+        return self.path
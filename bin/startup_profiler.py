@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# startup_profiler: Times the startup of cocos
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Times the imports & the startup steps of cocos for `--profile-startup`.
+
+It's imported before the other modules of cocos, so it can't use them.
+'''
+
+import sys
+import time
+import __builtin__
+
+_start_time = None
+_original_import = None
+_depth = 0
+# (module name, import depth, inclusive time, exclusive time)
+_imports = []
+# (step, time since the start)
+_steps = []
+_children_time = [0.0]
+
+
+def _timed_import(name, *args, **kwargs):
+    global _depth
+    if name in sys.modules:
+        return _original_import(name, *args, **kwargs)
+
+    index = len(_imports)
+    _imports.append(None)
+    _children_time.append(0.0)
+    _depth += 1
+    start = time.time()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        elapsed = time.time() - start
+        _depth -= 1
+        children = _children_time.pop()
+        _children_time[-1] += elapsed
+        _imports[index] = (name, _depth, elapsed, elapsed - children)
+
+
+def start():
+    global _start_time, _original_import
+    if _start_time is not None:
+        return
+
+    _start_time = time.time()
+    _original_import = __builtin__.__import__
+    __builtin__.__import__ = _timed_import
+
+
+def is_started():
+    return _start_time is not None
+
+
+def mark(step):
+    if _start_time is not None:
+        _steps.append((step, time.time() - _start_time))
+
+
+def report(top=20):
+    if _start_time is None:
+        return
+
+    __builtin__.__import__ = _original_import
+    lines = [ 'Startup steps (seconds since the start):' ]
+    for step, elapsed in _steps:
+        lines.append('  %8.3f  %s' % (elapsed, step))
+
+    # a name is imported again if it's relative to a package
+    total_time = 0
+    by_name = {}
+    for name, depth, elapsed, self_time in [ i for i in _imports if i is not None ]:
+        if depth == 0:
+            total_time += elapsed
+        item = by_name.setdefault(name, [ 0.0, 0.0 ])
+        item[0] += self_time
+        item[1] += elapsed
+
+    lines.append('Imports: %d modules, %.3fs' % (len(by_name), total_time))
+    lines.append('  %8s  %8s  %s' % ('self', 'total', 'module'))
+    for name, item in sorted(by_name.items(), key=lambda i: -i[1][0])[:top]:
+        lines.append('  %8.3f  %8.3f  %s' % (item[0], item[1], name))
+
+    sys.stderr.write('\n'.join(lines) + '\n')
@@ -0,0 +1,297 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# web_server: The HTTP server of `cocos run -p web`
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Serves the files of the current folder for `cocos run -p web`.
+
+- The requests are handled by threads and the connections are kept alive (HTTP/1.1).
+- The files have an ETag & a Last-Modified date, a file which isn't modified
+  since the browser cached it is answered with 304.
+- A single byte range of a file is answered with 206, the audio & video
+  elements of the browsers request ranges to seek.
+- The .js & .json files can be compressed by gzip, the compressed data is kept
+  in memory until the file is modified.
+
+This module doesn't depend on cocos.
+'''
+
+import os
+import re
+import zlib
+import threading
+import urlparse
+import email.utils
+import SocketServer
+import BaseHTTPServer
+from cStringIO import StringIO
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+
+class CompressedCache(object):
+    '''
+    The gzip data of the files, an item is used while the modification time &
+    the size of the file are the same.
+    '''
+
+    # the items are dropped when they take more memory than it
+    MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or CompressedCache.MAX_SIZE
+        self._items = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        # the browsers request a file by several connections at once, it's compressed once
+        self._compress_lock = threading.Lock()
+
+    def _get_item(self, path, key):
+        with self._lock:
+            item = self._items.get(path)
+        if item is not None and item[0] == key:
+            return item[1]
+
+        return None
+
+    def get(self, path, st):
+        key = (st.st_mtime, st.st_size)
+        data = self._get_item(path, key)
+        if data is not None:
+            return data
+
+        with self._compress_lock:
+            data = self._get_item(path, key)
+            if data is None:
+                data = self._compress(path, key)
+
+        return data
+
+    def _compress(self, path, key):
+        f = open(path, 'rb')
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        # 16 + MAX_WBITS writes the gzip header & trailer instead of the zlib ones
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        data = compressor.compress(data) + compressor.flush()
+
+        with self._lock:
+            old_item = self._items.pop(path, None)
+            if old_item is not None:
+                self._size -= len(old_item[1])
+            if len(data) <= self.max_size:
+                if self._size + len(data) > self.max_size:
+                    self._items.clear()
+                    self._size = 0
+                self._items[path] = (key, data)
+                self._size += len(data)
+
+        return data
+
+
+class _FileRange(object):
+    '''
+    Reads `length` bytes from the current position of a file.
+    '''
+
+    def __init__(self, f, length):
+        self._f = f
+        self._left = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._left:
+            size = self._left
+        data = self._f.read(size)
+        self._left -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # the headers are buffered & written with the body, handle_one_request() flushes them
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    # an idle connection is closed after it
+    timeout = 60
+
+    COMPRESSED_EXTS = ('.js', '.json')
+    RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+    # q=0 means the coding is refused
+    REFUSED_RE = re.compile(r'^\s*q\s*=\s*0(\.0*)?\s*$')
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            parts = urlparse.urlsplit(self.path)
+            if not parts.path.endswith('/'):
+                # redirect browser - doing basically what apache does
+                self.send_response(301)
+                self.send_header('Location', urlparse.urlunsplit((parts[0], parts[1], parts[2] + '/',
+                                                                  parts[3], parts[4])))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            for index in 'index.html', 'index.htm':
+                index = os.path.join(path, index)
+                if os.path.exists(index):
+                    path = index
+                    break
+            else:
+                return self.list_directory(path)
+
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            self.send_error(404, 'File not found')
+            return None
+
+        try:
+            return self._send_file_head(path, f)
+        except:
+            f.close()
+            raise
+
+    def _send_file_head(self, path, f):
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        etag = '"%x-%x"' % (int(st.st_mtime * 1000), size)
+        last_modified = self.date_time_string(st.st_mtime)
+
+        ext = os.path.splitext(path)[1].lower()
+        compressible = self.server.compress and ext in DevRequestHandler.COMPRESSED_EXTS
+        compressed = compressible and self._accepts_gzip() and self.headers.get('Range') is None
+        if compressed:
+            etag = etag[:-1] + '-gzip"'
+
+        if self._is_not_modified(etag, st.st_mtime):
+            f.close()
+            self.send_response(304)
+            self._send_file_headers(etag, last_modified, compressible)
+            self.end_headers()
+            return None
+
+        body_range = None if compressed else self._get_range(size, etag, last_modified)
+        if body_range is not None and body_range[0] >= size:
+            f.close()
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % size)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        if compressed:
+            data = self.server.compressed_cache.get(path, st)
+            f.close()
+            f = StringIO(data)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            length = len(data)
+        elif body_range is not None:
+            start, end = body_range
+            f.seek(start)
+            f = _FileRange(f, end - start + 1)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, size))
+            length = end - start + 1
+        else:
+            self.send_response(200)
+            length = size
+
+        self.send_header('Content-type', self.guess_type(path))
+        self.send_header('Content-Length', str(length))
+        self._send_file_headers(etag, last_modified, compressible)
+        self.end_headers()
+        return f
+
+    def _send_file_headers(self, etag, last_modified, compressible):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Accept-Ranges', 'bytes')
+        # the browser validates the files before using them, so the changes are seen on reload
+        self.send_header('Cache-Control', 'no-cache')
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+
+    def _accepts_gzip(self):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            parts = coding.split(';')
+            if parts[0].strip().lower() == 'gzip':
+                return not DevRequestHandler.REFUSED_RE.match(';'.join(parts[1:]))
+
+        return False
+
+    def _is_not_modified(self, etag, mtime):
+        # If-Modified-Since is ignored when If-None-Match is sent
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [ tag.strip() for tag in if_none_match.split(',') ]
+            return '*' in tags or etag in tags or ('W/' + etag) in tags
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is None:
+            return False
+
+        try:
+            since = email.utils.mktime_tz(email.utils.parsedate_tz(if_modified_since))
+        except (TypeError, ValueError, OverflowError):
+            return False
+
+        return int(mtime) <= since
+
+    def _get_range(self, size, etag, last_modified):
+        '''
+        Returns the (first, last) byte of the requested range, or None to send the whole file.
+        The range isn't satisfiable if first >= size.
+        '''
+        value = self.headers.get('Range')
+        if value is None:
+            return None
+
+        # the file was modified since the browser got the other ranges of it
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range.strip() not in (etag, last_modified):
+            return None
+
+        # several ranges aren't supported, the whole file is sent for them
+        match = DevRequestHandler.RANGE_RE.match(value.strip())
+        if match is None:
+            return None
+
+        first, last = match.groups()
+        if first:
+            first = int(first)
+            if first >= size:
+                return (first, first)
+            last = int(last) if last else size - 1
+            if last < first:
+                return None
+            return (first, min(last, size - 1))
+
+        if not last:
+            return None
+
+        # the last bytes of the file
+        length = int(last)
+        if length == 0:
+            return (size, size)
+        return (max(size - length, 0), size - 1)
+
+
+class DevHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    # a browser opens several connections at once
+    request_queue_size = 64
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class=DevRequestHandler, compress=False):
+        self.compress = compress
+        self.compressed_cache = CompressedCache()
+        BaseHTTPServer.HTTPServer.__init__(self, server_address, handler_class)
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# zip_extractor: Extracts zip files
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Extracts zip files, shared by the package installation & download-bin.py.
+
+- The members are streamed to the disk in blocks, they are never read into memory.
+- The members of a large archive are extracted by a thread pool.
+- A file with the same size & CRC as the member is not written again.
+
+This module doesn't depend on cocos, download-bin.py uses it before the console
+is set up.
+'''
+
+import os
+import zlib
+import zipfile
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+
+class ZipExtractor(object):
+
+    BLOCK_SIZE = 1024 * 1024
+    # the archives smaller than it are extracted by one thread
+    PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, path, jobs=None):
+        self.path = path
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.extracted = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _get_crc(path):
+        crc = 0
+        f = open(path, 'rb')
+        try:
+            while True:
+                data = f.read(ZipExtractor.BLOCK_SIZE)
+                if not data:
+                    break
+                crc = zlib.crc32(data, crc)
+        finally:
+            f.close()
+
+        return crc & 0xffffffff
+
+    @staticmethod
+    def _is_same(info, target):
+        if not os.path.isfile(target) or os.path.getsize(target) != info.file_size:
+            return False
+
+        return ZipExtractor._get_crc(target) == info.CRC
+
+    def _extract_member(self, task):
+        z, info, target = task
+        if ZipExtractor._is_same(info, target):
+            extracted = False
+        else:
+            src = z.open(info)
+            try:
+                f = open(target, 'wb')
+                try:
+                    while True:
+                        data = src.read(ZipExtractor.BLOCK_SIZE)
+                        if not data:
+                            break
+                        f.write(data)
+                finally:
+                    f.close()
+            finally:
+                src.close()
+            extracted = True
+
+        unix_attributes = info.external_attr >> 16
+        if unix_attributes:
+            os.chmod(target, unix_attributes)
+
+        return extracted
+
+    def extract(self, dst_dir, prefix=''):
+        '''
+        Extracts the members in the folder `prefix` of the archive into `dst_dir`,
+        the paths in `dst_dir` don't start with `prefix`.
+        Raises zipfile.BadZipfile if the archive is broken.
+        '''
+        z = zipfile.ZipFile(self.path)
+        try:
+            tasks = []
+            dirs = set()
+            dir_infos = []
+            for info in z.infolist():
+                name = info.filename
+
+                # don't extract absolute paths or ones with .. in them
+                if name.startswith('/') or '..' in name or not name.startswith(prefix):
+                    continue
+
+                name = name[len(prefix):]
+                if not name:
+                    continue
+
+                target = os.path.join(dst_dir, *name.split('/'))
+                if name.endswith('/'):
+                    # directory
+                    dirs.add(target)
+                    dir_infos.append((info, target))
+                else:
+                    # file
+                    dirs.add(os.path.dirname(target))
+                    tasks.append((z, info, target))
+
+            for target in dirs:
+                if not os.path.isdir(target):
+                    os.makedirs(target)
+            for info, target in dir_infos:
+                unix_attributes = info.external_attr >> 16
+                if unix_attributes:
+                    os.chmod(target, unix_attributes)
+
+            # the largest members first, so the threads finish at about the same time
+            tasks.sort(key=lambda task: -task[1].file_size)
+            total_size = sum([ task[1].file_size for task in tasks ])
+            if self.jobs > 1 and len(tasks) > 1 and total_size >= ZipExtractor.PARALLEL_MIN_SIZE:
+                # a ZipFile opened by name opens the archive again for each member
+                pool = ThreadPool(min(self.jobs, len(tasks)))
+                try:
+                    results = pool.map(self._extract_member, tasks)
+                    pool.close()
+                except:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+            else:
+                results = [ self._extract_member(task) for task in tasks ]
+        finally:
+            z.close()
+
+        extracted = len([ r for r in results if r ])
+        self.extracted += extracted
+        self.skipped += len(results) - extracted
+        return extracted, len(results) - extracted
@@ -86,68 +86,57 @@ class CocosZipInstaller(object):
 
     def download_file(self):
         print("==> Ready to download '%s' from '%s'" % (self._filename, self._url))
-        import urllib2
+        sys.path.append(os.path.join(self._workpath, 'bin'))
+        from downloader import Downloader, DownloadError
+
+        # the file is kept in the download cache by its url, which has the version in it.
+        # github server may not reponse a header information which contains `Content-Length`,
+        # therefore, the size needs to be written hardcode here. While server doesn't return
+        # `Content-Length`, use it instead
+        downloader = Downloader(self._url, os.path.abspath(self._filename), size=self._zip_file_size,
+                                progress=self.show_progress)
+        partial_size = downloader.get_partial_size()
+        if partial_size > 0:
+            print("==> Resuming the download, %dK was downloaded." % (partial_size / 1000))
+        else:
+            print("==> Starting to download, please wait ...")
+
+        self._last_size = partial_size
+        self._last_time = time()
         try:
-            u = urllib2.urlopen(self._url)
-        except urllib2.HTTPError as e:
-            if e.code == 404:
-                print("==> Error: Could not find the file from url: '%s'" % (self._url))
-            print("==> Http request failed, error code: " + str(e.code) + ", reason: " + e.read())
+            downloader.run()
+        except DownloadError as e:
+            print("==> Error: Downloading failed: %s" % e)
             sys.exit(1)
 
-        f = open(self._filename, 'wb')
-        meta = u.info()
-        content_len = meta.getheaders("Content-Length")
-        file_size = 0
-        if content_len and len(content_len) > 0:
-            file_size = int(content_len[0])
+        if downloader.from_cache:
+            print("==> '%s' is copied from the download cache." % self._filename)
+        else:
+            print("==> Downloading finished!")
+
+    def show_progress(self, file_size_dl, file_size):
+        new_time = time()
+        # the timer may not tick between the first blocks (e.g. on Windows)
+        speed = (file_size_dl - self._last_size) / max(new_time - self._last_time, 1e-6) / 1000.0
+        if file_size != 0:
+            percent = file_size_dl * 100. / file_size
+            status = r"Downloaded: %6dK / Total: %dK, Percent: %3.2f%%, Speed: %6.2f KB/S " % (file_size_dl / 1000, file_size / 1000, percent, speed)
         else:
-            # github server may not reponse a header information which contains `Content-Length`,
-            # therefore, the size needs to be written hardcode here. While server doesn't return
-            # `Content-Length`, use it instead
-            print("==> WARNING: Couldn't grab the file size from remote, use 'zip_file_size' section in '%s'" % self._config_path)
-            file_size = self._zip_file_size
-
-        print("==> Starting to download, please wait ...")
-
-        file_size_dl = 0
-        block_sz = 8192
-        block_size_per_second = 0
-        old_time=time()
-
-        while True:
-            buffer = u.read(block_sz)
-            if not buffer:
-                break
-
-            file_size_dl += len(buffer)
-            block_size_per_second += len(buffer)
-            f.write(buffer)
-            new_time = time()
-            if (new_time - old_time) > 1:
-                speed = block_size_per_second / (new_time - old_time) / 1000.0
-                status = ""
-                if file_size != 0:
-                    percent = file_size_dl * 100. / file_size
-                    status = r"Downloaded: %6dK / Total: %dK, Percent: %3.2f%%, Speed: %6.2f KB/S " % (file_size_dl / 1000, file_size / 1000, percent, speed)
-                else:
-                    status = r"Downloaded: %6dK, Speed: %6.2f KB/S " % (file_size_dl / 1000, speed)
-
-                status = status + chr(8)*(len(status)+1)
-                print(status),
-                sys.stdout.flush()
-                block_size_per_second = 0
-                old_time = new_time
-
-        print("==> Downloading finished!")
-        f.close()
+            status = r"Downloaded: %6dK, Speed: %6.2f KB/S " % (file_size_dl / 1000, speed)
+
+        status = status + chr(8)*(len(status)+1)
+        print(status),
+        sys.stdout.flush()
+        self._last_size = file_size_dl
+        self._last_time = new_time
 
     def ensure_directory(self, target):
         if not os.path.exists(target):
             os.mkdir(target)
 
     def unpack_zipfile(self, extract_dir):
-        """Unpack zip `filename` to `extract_dir`
+        """Unpack the files in the extracted folder of zip `filename` to `extract_dir`
+        The unchanged files are not written again.
 
         Raises ``UnrecognizedFormat`` if `filename` is not a zipfile (as determined
         by ``zipfile.is_zipfile()``).
@@ -157,36 +146,12 @@ class CocosZipInstaller(object):
             raise UnrecognizedFormat("%s is not a zip file" % (self._filename))
 
         print("==> Extracting files, please wait ...")
-        z = zipfile.ZipFile(self._filename)
-        try:
-            for info in z.infolist():
-                name = info.filename
-
-                # don't extract absolute paths or ones with .. in them
-                if name.startswith('/') or '..' in name:
-                    continue
-
-                target = os.path.join(extract_dir, *name.split('/'))
-                if not target:
-                    continue
-                if name.endswith('/'):
-                    # directory
-                    self.ensure_directory(target)
-                else:
-                    # file
-                    data = z.read(info.filename)
-                    f = open(target,'wb')
-                    try:
-                        f.write(data)
-                    finally:
-                        f.close()
-                        del data
-                unix_attributes = info.external_attr >> 16
-                if unix_attributes:
-                    os.chmod(target, unix_attributes)
-        finally:
-            z.close()
-            print("==> Extraction done!")
+        sys.path.append(os.path.join(self._workpath, 'bin'))
+        from zip_extractor import ZipExtractor
+
+        extracted, skipped = ZipExtractor(self._filename).extract(extract_dir, self._extracted_folder_name + '/')
+        print("==> %d files extracted, %d files unchanged." % (extracted, skipped))
+        print("==> Extraction done!")
 
 
     def ask_to_delete_downloaded_zip_file(self):
@@ -241,15 +206,10 @@ class CocosZipInstaller(object):
         self.download_zip_file()
 
         if not download_only:
-            self.unpack_zipfile(self._workpath)
-            print("==> Copying files...")
+            # extracted into the destination folder directly
             dst_folder_path = os.path.join(self._workpath, folder_for_extracting)
-            if not os.path.exists(dst_folder_path):
-                os.makedirs(dst_folder_path)
-            distutils.dir_util.copy_tree(self._extracted_folder_name, dst_folder_path)
+            self.unpack_zipfile(dst_folder_path)
             print("==> Cleaning...")
-            if os.path.exists(self._extracted_folder_name):
-                shutil.rmtree(self._extracted_folder_name)
             if os.path.isfile(self._filename):
                 if remove_downloaded != None:
                     if remove_downloaded == 'yes':
@@ -512,42 +512,38 @@ class AndroidBuilder(object):
 
         # gradle supports copy assets & compile scripts from engine 3.15
         if not self.gradle_support_ndk:
+            # the scripts are compiled into the assets instead of being copied
+            scripts_dir = assets_dir
+            output_dirs = [ assets_dir ]
+            if self._project._is_lua_project():
+                scripts_dir = os.path.join(assets_dir, 'src')
+                build_arch = self._get_build_arch(compile_obj.app_abi)
+                dir_64bit = os.path.join(scripts_dir, '64bit')
+                if build_arch == self.LuaBuildArch.ONLY_BUILD_64BIT:
+                    output_dirs = [ dir_64bit ]
+                elif build_arch == self.LuaBuildArch.BUILD_32BIT_AND_64BIT:
+                    output_dirs = [ dir_64bit, scripts_dir ]
+                else:
+                    # haven't set APP_ABI in parameter and Application.mk, default build 32bit
+                    output_dirs = [ scripts_dir ]
+
             # copy resources
-            self._copy_resources(custom_step_args, assets_dir)
+            take_scripts = lambda copier: compile_obj.take_scripts(copier, scripts_dir, output_dirs)
+            scripts = self._copy_resources(custom_step_args, assets_dir, compile_obj._jobs, take_scripts)
 
             # check the project config & compile the script files
             if self._project._is_lua_project():
-                src_dir = os.path.join(assets_dir, 'src')
-                build_arch = self._get_build_arch(compile_obj.app_abi)
+                for dst_dir in output_dirs:
+                    is_compiled = compile_obj.compile_lua_scripts(scripts, dst_dir, dst_dir == dir_64bit)
 
                 # only build 64bit
-                if build_arch == self.LuaBuildArch.ONLY_BUILD_64BIT:
-                    dst_dir = os.path.join(assets_dir, 'src/64bit')
-                    is_compiled = compile_obj.compile_lua_scripts(src_dir, dst_dir, True)
-                    if is_compiled:
-                        # remove unneeded lua files
-                        compile_obj._remove_file_with_ext(src_dir, '.lua')
-                        shutil.rmtree(os.path.join(src_dir, 'cocos'))
-
-                # only build 32bit
-                if build_arch == self.LuaBuildArch.ONLY_BUILD_32BIT:
-                    # build 32-bit bytecode
-                    compile_obj.compile_lua_scripts(src_dir, src_dir, False)
-
-                # build 32bit and 64bit
-                if build_arch == self.LuaBuildArch.BUILD_32BIT_AND_64BIT:
-                    # build 64-bit bytecode
-                    dst_dir = os.path.join(assets_dir, 'src/64bit')
-                    compile_obj.compile_lua_scripts(src_dir, dst_dir, True)
-                    # build 32-bit bytecode
-                    compile_obj.compile_lua_scripts(src_dir, src_dir, False)
-
-                if build_arch == self.LuaBuildArch.UNKNOWN:
-                    # haven't set APP_ABI in parameter and Application.mk, default build 32bit
-                    compile_obj.compile_lua_scripts(src_dir, src_dir, False)
+                cocos_dir = os.path.join(scripts_dir, 'cocos')
+                if build_arch == self.LuaBuildArch.ONLY_BUILD_64BIT and is_compiled and os.path.isdir(cocos_dir):
+                    # remove the folders of the lua files
+                    shutil.rmtree(cocos_dir)
 
             if self._project._is_js_project():
-                compile_obj.compile_js_scripts(assets_dir, assets_dir)
+                compile_obj.compile_js_scripts(scripts, assets_dir)
 
         if not no_apk:
             # gather the sign info if necessary
@@ -624,32 +620,48 @@ class AndroidBuilder(object):
 
         return ret
 
-    def _copy_resources(self, custom_step_args, assets_dir):
+    def _copy_resources(self, custom_step_args, assets_dir, jobs=None, take_scripts=None):
+        """
+        Copies the resources into assets_dir.
+        `take_scripts(copier)` takes the scripts which are compiled from the copier, it returns
+        (the scripts, the files generated from them). Returns the scripts.
+        """
         app_android_root = self.app_android_root
         res_files = self.res_files
 
-        # remove app_android_root/assets if it exists
-        if os.path.isdir(assets_dir):
-            shutil.rmtree(assets_dir)
-
         # generate parameters for custom steps
         target_platform = cocos_project.Platforms.ANDROID
         cur_custom_step_args = custom_step_args.copy()
         cur_custom_step_args["assets-dir"] = assets_dir
 
-        # make dir
-        os.mkdir(assets_dir)
- 
+        # the assets folder is not removed, only the files which are not in
+        # the resources any more are removed from it
+        copier = cocos.FileCopier(jobs)
+        if os.path.isdir(assets_dir):
+            for cfg in res_files:
+                copier.add_config(cfg, app_android_root, assets_dir)
+            output_files = take_scripts(copier)[1] if take_scripts is not None else None
+            copier.prune(assets_dir, output_files)
+            copier.clear()
+        else:
+            os.mkdir(assets_dir)
+
         # invoke custom step : pre copy assets
         self._project.invoke_custom_step_script(cocos_project.Project.CUSTOM_STEP_PRE_COPY_ASSETS, target_platform, cur_custom_step_args)
 
         # copy resources
+        # the custom step may generate resources, so the resources are collected after it
         for cfg in res_files:
-            cocos.copy_files_with_config(cfg, app_android_root, assets_dir)
+            copier.add_config(cfg, app_android_root, assets_dir)
+        scripts = take_scripts(copier)[0] if take_scripts is not None else []
+        copier.run()
+        copier.report()
 
         # invoke custom step : post copy assets
         self._project.invoke_custom_step_script(cocos_project.Project.CUSTOM_STEP_POST_COPY_ASSETS, target_platform, cur_custom_step_args)
 
+        return scripts
+
     def get_apk_info(self):
         manifest_path = os.path.join(self.app_android_root, 'app')
         gradle_cfg_path = os.path.join(manifest_path, 'build.gradle')
@@ -21,6 +21,7 @@ import re
 import sys
 import shutil
 import json
+import hashlib
 import build_web
 import utils
 
@@ -44,7 +45,8 @@ class CCPluginCompile(cocos.CCPlugin):
     PROJ_CFG_KEY_IOS_SIGN_ID = "ios_sign_id"
     PROJ_CFG_KEY_ENGINE_DIR = "engine_dir"
 
-    BACKUP_SUFFIX = "-backup"
+    # the intermediate files of the builds are kept in the build folder of the platform project
+    INTERMEDIATE_DIR = os.path.join("build", "cocos-intermediates")
     ENGINE_JS_DIRS = [
         "frameworks/js-bindings/bindings/script",
         "cocos/scripting/js-bindings/script"
@@ -347,67 +349,96 @@ class CCPluginCompile(cocos.CCPlugin):
     def _is_debug_mode(self):
         return self._mode == 'debug'
 
-    def _remove_file_with_ext(self, work_dir, ext):
-        file_list = os.listdir(work_dir)
-        for f in file_list:
-            full_path = os.path.join(work_dir, f)
-            if os.path.isdir(full_path):
-                self._remove_file_with_ext(full_path, ext)
-            elif os.path.isfile(full_path):
-                name, cur_ext = os.path.splitext(f)
-                if cur_ext == ext:
-                    os.remove(full_path)
-
-    def compile_lua_scripts(self, src_dir, dst_dir, build_64):
+    def get_script_ext(self):
+        """
+        Returns the extension of the scripts which are compiled, None if the scripts are not compiled.
+        """
+        if self._project._is_lua_project() and (self._compile_script or self._lua_encrypt):
+            return ".lua"
+
+        if self._project._is_js_project() and self._compile_script:
+            return ".js"
+
+        return None
+
+    def get_intermediate_dir(self):
+        return os.path.join(self._platforms.project_path(), CCPluginCompile.INTERMEDIATE_DIR, self._mode)
+
+    def get_script_manifest_path(self, dst_dir):
+        """
+        Returns the path of the manifest of the scripts compiled into dst_dir. The manifests are not
+        saved in dst_dir, so they are not packaged with the compiled scripts.
+        """
+        dst_key = os.path.normcase(os.path.abspath(dst_dir))
+        if isinstance(dst_key, unicode):
+            dst_key = dst_key.encode("utf-8")
+        name = "%s%s.json" % (hashlib.md5(dst_key).hexdigest(), self.get_script_ext())
+        return os.path.join(self.get_intermediate_dir(), "manifests", name)
+
+    def take_scripts(self, copier, scripts_dir, output_dirs, remove=True):
+        """
+        Takes the scripts in scripts_dir from the files added to the copier, they are compiled
+        into each folder of output_dirs. If `remove` is True, the scripts are not copied.
+        Returns (the scripts: [ (script, path relative to scripts_dir) ], the files generated from them).
+        """
+        ext = self.get_script_ext()
+        if ext is None:
+            return [], []
+
+        scripts = copier.take_files(scripts_dir, ext, remove)
+        output_files = []
+        for output_dir in output_dirs:
+            output_files.extend([ os.path.join(output_dir, path + "c") for script, path in scripts ])
+
+        return scripts, output_files
+
+    def compile_lua_scripts(self, scripts, dst_dir, build_64):
+        """
+        Compiles the scripts returned by take_scripts() into dst_dir, the scripts are not changed.
+        """
         if not self._project._is_lua_project():
             return False
 
         if not self._compile_script and not self._lua_encrypt:
             return False
 
-        cocos_cmd_path = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "cocos")
-        rm_ext = ".lua"
-        compile_cmd = "\"%s\" luacompile -s \"%s\" -d \"%s\"" % (cocos_cmd_path, src_dir, dst_dir)
-
-        if not self._compile_script:
-            compile_cmd = "%s --disable-compile" % compile_cmd
-        elif build_64:
-            compile_cmd = "%s --bytecode-64bit" % compile_cmd
-
-        if self._lua_encrypt:
-            add_para = ""
-            if self._lua_encrypt_key is not None:
-                add_para = "%s -k %s" % (add_para, self._lua_encrypt_key)
-
-            if self._lua_encrypt_sign is not None:
-                add_para = "%s -b %s" % (add_para, self._lua_encrypt_sign)
-
-            compile_cmd = "%s -e %s" % (compile_cmd, add_para)
-
-        # run compile command
-        self._run_cmd(compile_cmd)
-
-        # remove the source scripts
-        self._remove_file_with_ext(dst_dir, rm_ext)
+        # the luacompile plugin runs in this process
+        from plugin_luacompile import CCPluginLuaCompile
+        encrypt_key = self._lua_encrypt_key
+        if encrypt_key is None:
+            encrypt_key = CCPluginLuaCompile.DEFAULT_ENCRYPT_KEY
+        encrypt_sign = self._lua_encrypt_sign
+        if encrypt_sign is None:
+            encrypt_sign = CCPluginLuaCompile.DEFAULT_ENCRYPT_SIGN
+
+        compiler = CCPluginLuaCompile()
+        failed_files = compiler.compile_files([], dst_dir,
+                                              encrypt=bool(self._lua_encrypt),
+                                              encrypt_key=encrypt_key, encrypt_sign=encrypt_sign,
+                                              disable_compile=not self._compile_script,
+                                              bytecode_64bit=self._compile_script and build_64,
+                                              jobs=self._jobs, output_files=scripts,
+                                              manifest_path=self.get_script_manifest_path(dst_dir))
+        compiler.check_failed_files(failed_files)
 
         return True
 
-    def compile_js_scripts(self, src_dir, dst_dir):
+    def compile_js_scripts(self, scripts, dst_dir):
+        """
+        Compiles the scripts returned by take_scripts() into dst_dir, the scripts are not changed.
+        """
         if not self._project._is_js_project():
             return False
 
         if not self._compile_script:
             return False
 
-        cocos_cmd_path = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "cocos")
-        rm_ext = ".js"
-        compile_cmd = "\"%s\" jscompile -s \"%s\" -d \"%s\"" % (cocos_cmd_path, src_dir, dst_dir)
-
-        # run compile command
-        self._run_cmd(compile_cmd)
-
-        # remove the source scripts
-        self._remove_file_with_ext(dst_dir, rm_ext)
+        # the jscompile plugin runs in this process
+        from plugin_jscompile import CCPluginJSCompile
+        compiler = CCPluginJSCompile()
+        failed_files = compiler.compile_files([], dst_dir, jobs=self._jobs, output_files=scripts,
+                                              manifest_path=self.get_script_manifest_path(dst_dir))
+        compiler.check_failed_files(failed_files)
         return True
 
     def add_warning_at_end(self, warning_str):
@@ -628,17 +659,50 @@ class CCPluginCompile(cocos.CCPlugin):
 
         return engine_dir
 
-    def backup_dir(self, dir_path):
-        backup_dir = "%s%s" % (dir_path, CCPluginCompile.BACKUP_SUFFIX)
-        if os.path.exists(backup_dir):
-            shutil.rmtree(backup_dir)
-        shutil.copytree(dir_path, backup_dir)
+    def stage_script_dir(self, dir_path, staging_dir, output_dirs, remove_scripts=True):
+        """
+        Mirrors dir_path into a staged folder in staging_dir, the scripts should be compiled into
+        output_dirs (relative to the staged folder) instead of being copied, dir_path is not changed.
+        The staged folder is kept, so the unchanged files are not copied or compiled again next time.
+        Returns (the staged folder, the scripts).
+        """
+        dir_key = os.path.normcase(os.path.abspath(dir_path))
+        if isinstance(dir_key, unicode):
+            dir_key = dir_key.encode("utf-8")
+        # the staged folder has the name of dir_path, the Xcode projects copy the folders by their names
+        staged_dir = os.path.join(staging_dir, "staged", hashlib.md5(dir_key).hexdigest(),
+                                  os.path.basename(os.path.normpath(dir_path)))
+        output_dirs = [ os.path.join(staged_dir, d) for d in output_dirs ]
+        copier = cocos.FileCopier(self._jobs)
+        copier.add_rules(dir_path, dir_path, staged_dir)
+        scripts, output_files = self.take_scripts(copier, staged_dir, output_dirs, remove_scripts)
+        copier.prune(staged_dir, output_files)
+        copier.run()
+
+        return staged_dir, scripts
+
+    def stage_xcode_project(self, project_path, staging_dir, staged_dirs):
+        """
+        Writes the copies of the Xcode project (& the workspace of CocoaPods) into staging_dir,
+        which copy the staged folders into the app instead of the source folders.
+        staged_dirs is { source folder: staged folder }.
+        Returns (the project, the workspace) to build.
+        """
+        if len(staged_dirs) == 0:
+            return project_path, self.xcworkspace
+
+        import xcode_staging
+        staged_project = os.path.join(staging_dir, os.path.basename(project_path))
+        not_referenced = xcode_staging.stage_project(project_path, staged_project, staged_dirs, self._jobs)
+        for dir_path in not_referenced:
+            cocos.Logging.warning(MultiLanguage.get_string('COMPILE_WARNING_FOLDER_NOT_REFERENCED_FMT', dir_path))
+
+        staged_workspace = self.xcworkspace
+        if self.cocoapods:
+            staged_workspace = xcode_staging.stage_workspace(self.xcworkspace, project_path, staged_project,
+                                                             self._jobs)
 
-    def reset_backup_dir(self, dir_path):
-        backup_dir = "%s%s" % (dir_path, CCPluginCompile.BACKUP_SUFFIX)
-        if os.path.exists(dir_path):
-            shutil.rmtree(dir_path)
-        os.rename(backup_dir, dir_path)
+        return staged_project, staged_workspace
 
     def get_engine_js_dir(self):
         engine_js_dir = None
@@ -729,31 +793,33 @@ class CCPluginCompile(cocos.CCPlugin):
                     os.remove(target_app_dir)
 
         # is script project, check whether compile scripts or not
-        need_reset_dir = False
-        if self._project._is_script_project():
+        # the scripts are compiled into the staged folders in the build folder, the source folders
+        # are not changed, the copy of the Xcode project copies the staged folders into the app
+        staging_dir = os.path.join(self.get_intermediate_dir(), "ios")
+        staged_dirs = {}
+        if self._project._is_script_project() and self.get_script_ext() is not None:
             script_src_dir = os.path.join(self._project.get_project_dir(), "src")
 
-            if self._project._is_js_project() and self._compile_script:
-                # backup the source scripts
-                self.backup_dir(script_src_dir)
-                self.compile_js_scripts(script_src_dir, script_src_dir)
+            if self._project._is_js_project():
+                staged_dir, scripts = self.stage_script_dir(script_src_dir, staging_dir, [ "" ])
+                self.compile_js_scripts(scripts, staged_dir)
+                staged_dirs[script_src_dir] = staged_dir
 
                 # js project need compile the js files in engine
                 engine_js_dir = self.get_engine_js_dir()
                 if engine_js_dir is not None:
-                    self.backup_dir(engine_js_dir)
-                    self.compile_js_scripts(engine_js_dir, engine_js_dir)
-                need_reset_dir = True
+                    staged_dir, scripts = self.stage_script_dir(engine_js_dir, staging_dir, [ "" ])
+                    self.compile_js_scripts(scripts, staged_dir)
+                    staged_dirs[engine_js_dir] = staged_dir
 
             if self._project._is_lua_project():
-                self.backup_dir(script_src_dir)
-                # create 64-bit folder and build 64-bit bytecode
-                # should build 64-bit first because `script_src_dir` will be deleted when building 32-bit bytecode 
-                folder_64bit = os.path.join(script_src_dir, '64bit')
-                self.compile_lua_scripts(script_src_dir, folder_64bit, True)
-                # build 32-bit bytecode
-                self.compile_lua_scripts(script_src_dir, script_src_dir, False)
-                need_reset_dir = True
+                # build 64-bit bytecode into the 64-bit folder & 32-bit bytecode
+                staged_dir, scripts = self.stage_script_dir(script_src_dir, staging_dir, [ "64bit", "" ])
+                self.compile_lua_scripts(scripts, os.path.join(staged_dir, "64bit"), True)
+                self.compile_lua_scripts(scripts, staged_dir, False)
+                staged_dirs[script_src_dir] = staged_dir
+
+        build_project, build_workspace = self.stage_xcode_project(projectPath, staging_dir, staged_dirs)
         try:
             cocos.Logging.info(MultiLanguage.get_string('COMPILE_INFO_BUILDING'))
 
@@ -765,7 +831,7 @@ class CCPluginCompile(cocos.CCPlugin):
             command = ' '.join([
                 "xcodebuild",
                 "-workspace" if self.cocoapods else "-project",
-                "\"%s\"" % self.xcworkspace if self.cocoapods else projectPath,
+                "\"%s\"" % (build_workspace if self.cocoapods else build_project),
                 "-configuration",
                 "%s" % 'Debug' if self._mode == 'debug' else 'Release',
                 "-scheme" if use_scheme else "-target",
@@ -825,16 +891,6 @@ class CCPluginCompile(cocos.CCPlugin):
             print str(e)
             raise cocos.CCPluginError(MultiLanguage.get_string('COMPILE_ERROR_BUILD_FAILED'),
                                       cocos.CCPluginError.ERROR_BUILD_FAILED)
-        finally:
-            # is script project & need reset dirs
-            if need_reset_dir:
-                script_src_dir = os.path.join(self._project.get_project_dir(), "src")
-                self.reset_backup_dir(script_src_dir)
-
-                if self._project._is_js_project():
-                    engine_js_dir = self.get_engine_js_dir()
-                    if engine_js_dir is not None:
-                        self.reset_backup_dir(engine_js_dir)
 
     def _get_export_options_plist_path(self):
         project_dir = self._project.get_project_dir()
@@ -909,36 +965,39 @@ class CCPluginCompile(cocos.CCPlugin):
                 shutil.rmtree(target_app_dir)
 
         # is script project, check whether compile scripts or not
-        need_reset_dir = False
-        if self._project._is_script_project():
+        # the scripts are compiled into the staged folders in the build folder, the source folders
+        # are not changed, the copy of the Xcode project copies the staged folders into the app
+        staging_dir = os.path.join(self.get_intermediate_dir(), "mac")
+        staged_dirs = {}
+        if self._project._is_script_project() and self.get_script_ext() is not None:
             script_src_dir = os.path.join(self._project.get_project_dir(), "src")
 
-            if self._project._is_js_project() and self._compile_script:
-                # backup the source scripts
-                self.backup_dir(script_src_dir)
-                self.compile_js_scripts(script_src_dir, script_src_dir)
+            if self._project._is_js_project():
+                staged_dir, scripts = self.stage_script_dir(script_src_dir, staging_dir, [ "" ])
+                self.compile_js_scripts(scripts, staged_dir)
+                staged_dirs[script_src_dir] = staged_dir
 
                 # js project need compile the js files in engine
                 engine_js_dir = self.get_engine_js_dir()
                 if engine_js_dir is not None:
-                    self.backup_dir(engine_js_dir)
-                    self.compile_js_scripts(engine_js_dir, engine_js_dir)
-                need_reset_dir = True
+                    staged_dir, scripts = self.stage_script_dir(engine_js_dir, staging_dir, [ "" ])
+                    self.compile_js_scripts(scripts, staged_dir)
+                    staged_dirs[engine_js_dir] = staged_dir
 
             if self._project._is_lua_project():
-                self.backup_dir(script_src_dir)
-                # mac only support 64-bit bytecode
-                folder_64bit = os.path.join(script_src_dir, '64bit')
-                self.compile_lua_scripts(script_src_dir, folder_64bit, True)
-                need_reset_dir = True
+                # mac only support 64-bit bytecode, the lua files are kept beside the 64-bit folder
+                staged_dir, scripts = self.stage_script_dir(script_src_dir, staging_dir, [ "64bit" ], False)
+                self.compile_lua_scripts(scripts, os.path.join(staged_dir, "64bit"), True)
+                staged_dirs[script_src_dir] = staged_dir
 
+        build_project, build_workspace = self.stage_xcode_project(projectPath, staging_dir, staged_dirs)
         try:
             cocos.Logging.info(MultiLanguage.get_string('COMPILE_INFO_BUILDING'))
 
             command = ' '.join([
                 "xcodebuild",
                 "-workspace" if self.cocoapods else "-project",
-                "\"%s\"" % self.xcworkspace if self.cocoapods else projectPath,
+                "\"%s\"" % (build_workspace if self.cocoapods else build_project),
                 "-configuration",
                 "%s" % 'Debug' if self._mode == 'debug' else 'Release',
                 "-scheme" if self.cocoapods else "-target",
@@ -966,16 +1025,6 @@ class CCPluginCompile(cocos.CCPlugin):
         except:
             raise cocos.CCPluginError(MultiLanguage.get_string('COMPILE_ERROR_BUILD_FAILED'),
                                       cocos.CCPluginError.ERROR_BUILD_FAILED)
-        finally:
-            # is script project & need reset dirs
-            if need_reset_dir:
-                script_src_dir = os.path.join(self._project.get_project_dir(), "src")
-                self.reset_backup_dir(script_src_dir)
-
-                if self._project._is_js_project():
-                    engine_js_dir = self.get_engine_js_dir()
-                    if engine_js_dir is not None:
-                        self.reset_backup_dir(engine_js_dir)
 
     # Get the required VS versions from the engine version of project
     def get_required_vs_versions(self):
@@ -1198,6 +1247,8 @@ class CCPluginCompile(cocos.CCPlugin):
             raise cocos.CCPluginError(message, cocos.CCPluginError.ERROR_PATH_NOT_FOUND)
 
         # remove the files in output dir (keep the exe files)
+        # the Resources folder is kept, the up-to-date resources will not be copied again
+        res_path = os.path.join(output_dir, "Resources")
         if os.path.exists(output_dir):
             output_files = os.listdir(output_dir)
             for element in output_files:
@@ -1206,7 +1257,7 @@ class CCPluginCompile(cocos.CCPlugin):
                     base_name, file_ext = os.path.splitext(element)
                     if not file_ext == ".exe":
                         os.remove(ele_full_path)
-                elif os.path.isdir(ele_full_path):
+                elif os.path.isdir(ele_full_path) and ele_full_path != res_path:
                     shutil.rmtree(ele_full_path)
 
         # create output dir if it not existed
@@ -1237,17 +1288,16 @@ class CCPluginCompile(cocos.CCPlugin):
                 cocos.Logging.info(MultiLanguage.get_string('COMPILE_INFO_COPYING_FMT', filename))
                 shutil.copy(file_path, output_dir)
 
-        # copy lua files & res
-        res_path = os.path.join(output_dir, "Resources")
-        self._copy_resources(res_path)
+        # copy lua files & res, the scripts are compiled into res_path instead of being copied
+        scripts = self._copy_resources(res_path)
 
         # check the project config & compile the script files
         if self._project._is_js_project():
-            self.compile_js_scripts(res_path, res_path)
+            self.compile_js_scripts(scripts, res_path)
 
         if self._project._is_lua_project():
             # windows only support 32-bit bytecode
-            self.compile_lua_scripts(res_path, res_path, False)
+            self.compile_lua_scripts(scripts, res_path, False)
 
         self.run_root = output_dir
 
@@ -1500,8 +1550,17 @@ class CCPluginCompile(cocos.CCPlugin):
         else:
             fileList = data[CCPluginCompile.CFG_KEY_COPY_RESOURCES]
 
+        copier = cocos.FileCopier(self._jobs)
         for cfg in fileList:
-            cocos.copy_files_with_config(cfg, self._build_cfg_path(), dst_path)
+            copier.add_config(cfg, self._build_cfg_path(), dst_path)
+
+        scripts, output_files = self.take_scripts(copier, dst_path, [ dst_path ])
+
+        # remove the files which are not in the resources or generated from them any more
+        copier.prune(dst_path, output_files)
+        copier.run()
+        copier.report()
+        return scripts
 
     def checkFileByExtention(self, ext, path):
         filelist = os.listdir(path)
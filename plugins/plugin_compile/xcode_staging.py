@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# xcode_staging: Copies of the Xcode projects which use the staged script folders
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+The Xcode projects copy the script folders they reference into the apps. The
+scripts are compiled into staged folders in the build folder, and a copy of the
+project is written beside them, in which the folder references point to the
+staged folders. xcodebuild builds the copy, the source folders & the project
+are not changed.
+'''
+
+import os
+import sys
+import filecmp
+import xml.etree.ElementTree as ET
+
+import cocos
+from MultiLanguage import MultiLanguage
+
+if getattr(sys, 'frozen', None):
+    _cur_dir = os.path.realpath(os.path.dirname(sys.executable))
+else:
+    _cur_dir = os.path.realpath(os.path.dirname(__file__))
+# the pbxproj parser & writer of the generate plugin
+sys.path.append(os.path.join(os.path.dirname(_cur_dir), 'plugin_generate', 'proj_modifier'))
+import modify_pbxproj
+
+PBXPROJ_NAME = 'project.pbxproj'
+WORKSPACE_DATA_NAME = 'contents.xcworkspacedata'
+
+
+def _parse_error(path):
+    return cocos.CCPluginError(MultiLanguage.get_string('COMPILE_ERROR_PARSE_XCODE_FILE_FMT', path),
+                               cocos.CCPluginError.ERROR_PARSE_FILE)
+
+
+def _to_unicode(path):
+    if isinstance(path, unicode):
+        return path
+    return path.decode(sys.getfilesystemencoding() or 'utf-8')
+
+
+def _path_key(path):
+    return os.path.normcase(os.path.realpath(_to_unicode(path)))
+
+
+def _iter_folder_references(project, source_root):
+    '''
+    Yields (folder reference, absolute path) of the folder references in the groups of the
+    project. The references relative to the build settings (e.g. BUILT_PRODUCTS_DIR) are skipped.
+    '''
+    root_group = project.root_group
+    groups = [ (root_group, os.path.join(source_root, root_group.get('path', ''))) ]
+    while groups:
+        group, group_path = groups.pop()
+        for child_id in group.get('children', []):
+            child = project.objects.get(child_id)
+            if child is None:
+                continue
+
+            source_tree = child.get('sourceTree', '<group>')
+            if source_tree == '<group>':
+                base_path = group_path
+            elif source_tree == 'SOURCE_ROOT':
+                base_path = source_root
+            elif source_tree == '<absolute>':
+                base_path = u''
+            else:
+                continue
+
+            child_path = os.path.join(base_path, child.get('path', ''))
+            isa = child.get('isa')
+            if isa in ('PBXGroup', 'PBXVariantGroup'):
+                groups.append((child, child_path))
+            elif isa == 'PBXFileReference' and child.get('lastKnownFileType') == 'folder':
+                yield child, os.path.normpath(child_path)
+
+
+def _sync_dir(src_dir, dst_dir, generated_file, jobs):
+    # the unchanged files are skipped, generated_file is written by the caller
+    copier = cocos.FileCopier(jobs)
+    copier.add_rules(src_dir, src_dir, dst_dir)
+    copier.take_files(dst_dir, os.path.splitext(generated_file)[1])
+    copier.prune(dst_dir, [ os.path.join(dst_dir, generated_file) ])
+    copier.run()
+
+
+def _replace_if_changed(tmp_path, path):
+    # the file isn't touched if it's the same, so Xcode doesn't see a changed project
+    if os.path.isfile(path) and filecmp.cmp(tmp_path, path, False):
+        os.remove(tmp_path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+
+def stage_project(project_path, staged_project, staged_dirs, jobs=None):
+    '''
+    Writes a copy of the Xcode project at staged_project, in which the folder references of the
+    source folders point to the staged folders, staged_dirs is { source folder: staged folder }.
+    The project folder of the copy is the folder of project_path, so the other paths are the same.
+    Returns the source folders which are not referenced by the project.
+    '''
+    pbxproj_path = os.path.join(project_path, PBXPROJ_NAME)
+    project = modify_pbxproj.XcodeProject.Load(pbxproj_path)
+    if project is None or project.root_object is None:
+        raise _parse_error(pbxproj_path)
+
+    # the relative paths in the copy are resolved from the folder of the project
+    root_object = project.root_object
+    project_dir = os.path.dirname(os.path.abspath(_to_unicode(project_path)))
+    source_root = os.path.normpath(os.path.join(project_dir, root_object.get('projectDirPath', '')))
+    root_object['projectDirPath'] = source_root
+
+    staged_keys = dict((_path_key(src_dir), (src_dir, _to_unicode(os.path.abspath(staged_dir))))
+                       for src_dir, staged_dir in staged_dirs.items())
+    referenced = set()
+    for folder_ref, folder_path in _iter_folder_references(project, source_root):
+        key = _path_key(folder_path)
+        if key not in staged_keys:
+            continue
+
+        # the staged folder has the name of the source folder, it's copied into the app by the name
+        if 'name' not in folder_ref:
+            folder_ref['name'] = os.path.basename(folder_path)
+        folder_ref['path'] = staged_keys[key][1]
+        folder_ref['sourceTree'] = '<absolute>'
+        referenced.add(key)
+
+    # the schemes & the other files of the project are copied too
+    _sync_dir(project_path, staged_project, PBXPROJ_NAME, jobs)
+    staged_pbxproj = os.path.join(staged_project, PBXPROJ_NAME)
+    project.save_new_format(staged_pbxproj + '.tmp')
+    _replace_if_changed(staged_pbxproj + '.tmp', staged_pbxproj)
+
+    return [ src_dir for key, (src_dir, staged_dir) in staged_keys.items() if key not in referenced ]
+
+
+def stage_workspace(workspace_path, project_path, staged_project, jobs=None):
+    '''
+    Writes a copy of the workspace beside staged_project, the copy of project_path, which is
+    used by the copy of the workspace instead of project_path. The other references are absolute.
+    Returns the path of the copy.
+    '''
+    staged_workspace = os.path.join(os.path.dirname(staged_project), os.path.basename(workspace_path))
+    data_path = os.path.join(workspace_path, WORKSPACE_DATA_NAME)
+    try:
+        tree = ET.parse(data_path)
+    except (IOError, ET.ParseError):
+        raise _parse_error(data_path)
+
+    workspace_dir = os.path.dirname(os.path.abspath(workspace_path))
+    project_key = _path_key(project_path)
+    for ref in tree.getroot():
+        kind, sep, path = ref.get('location', '').partition(':')
+        if kind not in ('group', 'container'):
+            continue
+
+        ref_path = os.path.join(_to_unicode(workspace_dir), path)
+        if _path_key(ref_path) == project_key:
+            ref.set('location', 'group:%s' % os.path.basename(staged_project))
+        else:
+            ref.set('location', 'absolute:%s' % os.path.normpath(ref_path))
+
+    _sync_dir(workspace_path, staged_workspace, WORKSPACE_DATA_NAME, jobs)
+    staged_data = os.path.join(staged_workspace, WORKSPACE_DATA_NAME)
+    tree.write(staged_data + '.tmp', 'UTF-8')
+    _replace_if_changed(staged_data + '.tmp', staged_data)
+
+    return staged_workspace
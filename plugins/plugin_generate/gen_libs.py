@@ -5,8 +5,12 @@ import os
 import sys
 import shutil
 import json
+import time
+import subprocess
+import multiprocessing
 import utils
 import gen_prebuilt_mk
+import libs_cache
 
 import cocos
 from MultiLanguage import MultiLanguage
@@ -14,6 +18,8 @@ from MultiLanguage import MultiLanguage
 from cocos import CCPluginError
 from cocos import Logging
 from argparse import ArgumentParser
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 class LibsCompiler(cocos.CCPlugin):
     CFG_FILE = 'configs/gen_libs_config.json'
@@ -23,6 +29,8 @@ class LibsCompiler(cocos.CCPlugin):
     KEY_VS_PROJS_INFO = 'vs_projs_info'
     KEY_SUPPORT_VS_VERSIONS = 'support_vs_versions'
     KEY_ANDROID_MKS = "android_mks"
+    KEY_CACHE_SOURCES = "cache_sources"
+    KEY_CACHE_EXCLUDES = "cache_excludes"
     CHECK_KEYS = [
         KEY_LIBS_OUTPUT,
         KEY_XCODE_PROJS_INFO,
@@ -31,9 +39,19 @@ class LibsCompiler(cocos.CCPlugin):
         KEY_ANDROID_MKS
     ]
 
+    DEFAULT_CACHE_DIR = '~/.cocos/gen-libs-cache'
+    DEFAULT_CACHE_SIZE = 4096
+
     KEY_XCODE_TARGETS = 'targets'
     KEY_VS_BUILD_TARGETS = 'build_targets'
 
+    # the strip tools of the android ABIs : (toolchain folder, tools prefix)
+    ANDROID_STRIP_TOOLS = {
+        'armeabi-v7a' : ('arm-linux-androideabi-4.9', 'arm-linux-androideabi'),
+        'arm64-v8a' : ('aarch64-linux-android-4.9', 'aarch64-linux-android'),
+        'x86' : ('x86-4.8', 'i686-linux-android')
+    }
+
     @staticmethod
     def plugin_name():
       return "gen-libs"
@@ -56,12 +74,23 @@ class LibsCompiler(cocos.CCPlugin):
                             help=MultiLanguage.get_string('GEN_LIBS_ARG_MODE'))
         parser.add_argument('--dis-strip', dest='disable_strip', action="store_true",
                             help=MultiLanguage.get_string('GEN_LIBS_ARG_DISABLE_STRIP'))
+        parser.add_argument('-j', '--jobs', dest='jobs', type=int,
+                            help=MultiLanguage.get_string('GEN_LIBS_ARG_JOBS'))
         group = parser.add_argument_group(MultiLanguage.get_string('GEN_LIBS_GROUP_WIN'))
         group.add_argument('--vs', dest='vs_version', type=int, default=None,
                            help=MultiLanguage.get_string('GEN_LIBS_ARG_VS'))
         group = parser.add_argument_group(MultiLanguage.get_string('GEN_LIBS_GROUP_ANDROID'))
         group.add_argument("--app-abi", dest="app_abi",
                             help=MultiLanguage.get_string('GEN_LIBS_ARG_ABI'))
+        group.add_argument("--separate-abi", dest="separate_abi", action="store_true",
+                            help=MultiLanguage.get_string('GEN_LIBS_ARG_SEPARATE_ABI'))
+        group = parser.add_argument_group(MultiLanguage.get_string('GEN_LIBS_GROUP_CACHE'))
+        group.add_argument('--no-cache', dest='no_cache', action="store_true",
+                           help=MultiLanguage.get_string('GEN_LIBS_ARG_NO_CACHE'))
+        group.add_argument('--cache-dir', dest='cache_dir',
+                           help=MultiLanguage.get_string('GEN_LIBS_ARG_CACHE_DIR'))
+        group.add_argument('--cache-size', dest='cache_size', type=int, default=LibsCompiler.DEFAULT_CACHE_SIZE,
+                           help=MultiLanguage.get_string('GEN_LIBS_ARG_CACHE_SIZE'))
         group.add_argument("--ap", dest="android_platform",
                             help=MultiLanguage.get_string('COMPILE_ARG_AP'))
         group.add_argument('-l', dest='language', 
@@ -136,10 +165,25 @@ class LibsCompiler(cocos.CCPlugin):
         else:
             self.app_abi = args.app_abi
         self.app_abi_list = self.app_abi.split(":")
+        self.separate_abi = args.separate_abi
         self.android_platform = args.android_platform
 
+        self.jobs = args.jobs
+        if self.jobs is None or self.jobs < 1:
+            try:
+                self.jobs = multiprocessing.cpu_count()
+            except NotImplementedError:
+                self.jobs = 1
+
         self.lib_dir = os.path.normpath(os.path.join(self.repo_x, self.cfg_info[LibsCompiler.KEY_LIBS_OUTPUT]))
 
+        self.use_cache = not args.no_cache
+        if args.cache_dir is None:
+            self.cache_dir = os.path.expanduser(LibsCompiler.DEFAULT_CACHE_DIR)
+        else:
+            self.cache_dir = os.path.abspath(os.path.expanduser(args.cache_dir))
+        self.cache_size = args.cache_size * 1024 * 1024
+
     def parse_config(self):
         if not os.path.isfile(self.cfg_file_path):
             raise CCPluginError(MultiLanguage.get_string('GEN_LIBS_ERROR_WRONG_FILE_FMT', self.cfg_file_path),
@@ -165,19 +209,105 @@ class LibsCompiler(cocos.CCPlugin):
         if self.clean:
             self.clean_libs()
 
+        self.init_libs_cache()
+
         if cocos.os_is_mac():
             if self.build_mac or self.build_ios:
-                self.compile_mac_ios()
+                # the libs which are restored from the cache are not compiled
+                toolchain = self.get_xcode_version()
+                mac_out_dir = os.path.join(self.lib_dir, "mac")
+                ios_out_dir = os.path.join(self.lib_dir, "ios")
+                build_mac = self.build_mac and not self.restore_libs('mac', toolchain, mac_out_dir)
+                build_ios = self.build_ios and not self.restore_libs('ios', toolchain, ios_out_dir)
+                if build_mac or build_ios:
+                    self.compile_mac_ios(build_mac, build_ios)
+                    if build_mac:
+                        self.store_libs('mac', toolchain, mac_out_dir)
+                    if build_ios:
+                        self.store_libs('ios', toolchain, ios_out_dir)
 
         if cocos.os_is_win32():
             if self.build_win:
-                self.compile_win()
+                toolchain = self.get_vs_toolchain()
+                win32_out_dir = os.path.join(self.lib_dir, "win32")
+                if not self.restore_libs('win32', toolchain, win32_out_dir):
+                    self.compile_win()
+                    self.store_libs('win32', toolchain, win32_out_dir)
 
         if self.build_android:
             self.compile_android()
             # generate prebuilt mk files
             # self.modify_binary_mk()
 
+        if self.libs_cache is not None:
+            self.libs_cache.report()
+
+    def init_libs_cache(self):
+        self.libs_cache = None
+        if not self.use_cache:
+            return
+
+        self.libs_cache = libs_cache.LibsCache(self.cache_dir, self.cache_size)
+
+        # the libs are not used for the fingerprint
+        sources = self.cfg_info.get(LibsCompiler.KEY_CACHE_SOURCES, [])
+        excludes = [ os.path.join(self.repo_x, e) for e in self.cfg_info.get(LibsCompiler.KEY_CACHE_EXCLUDES, []) ]
+        excludes.append(self.lib_dir)
+        self.sources_hash = self.libs_cache.hash_sources(self.repo_x, sources, excludes)
+
+    def get_libs_key(self, platform, toolchain):
+        return self.libs_cache.get_key({
+            'sources' : self.sources_hash,
+            'config' : self.cfg_info,
+            'platform' : platform,
+            'language' : self.language,
+            'mode' : self.mode,
+            'strip' : not self.disable_strip,
+            'toolchain' : toolchain
+        })
+
+    def restore_libs(self, platform, toolchain, out_dir):
+        # returns True if the libs of the platform are restored from the cache
+        if self.libs_cache is None:
+            return False
+
+        return self.libs_cache.restore(self.get_libs_key(platform, toolchain), platform, out_dir)
+
+    def store_libs(self, platform, toolchain, out_dir):
+        if self.libs_cache is None:
+            return
+
+        self.libs_cache.store(self.get_libs_key(platform, toolchain), out_dir)
+
+    def get_xcode_version(self):
+        try:
+            return subprocess.check_output("xcodebuild -version", stderr=subprocess.STDOUT, shell=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def get_vs_toolchain(self):
+        if self.vs_version is None:
+            vs_versions = self.cfg_info[LibsCompiler.KEY_SUPPORT_VS_VERSIONS]
+        else:
+            vs_versions = [ self.vs_version ]
+
+        return [ [ vs_version, utils.get_msbuild_path(vs_version) ] for vs_version in vs_versions ]
+
+    def get_android_toolchain(self):
+        ndk_root = os.environ.get("NDK_ROOT")
+        ndk_version = None
+        if ndk_root is not None:
+            ndk_version = os.path.normpath(ndk_root)
+            for name in [ "source.properties", "RELEASE.TXT" ]:
+                version_file = os.path.join(ndk_root, name)
+                if os.path.isfile(version_file):
+                    f = open(version_file)
+                    ndk_version = f.read().strip()
+                    f.close()
+                    break
+
+        return { 'ndk' : ndk_version, 'platform' : self.android_platform }
+
     def build_win32_proj(self, cmd_path, sln_path, proj_name, mode):
         build_cmd = " ".join([
             "\"%s\"" % cmd_path,
@@ -272,7 +402,7 @@ class LibsCompiler(cocos.CCPlugin):
             except Exception as e:
                 raise e
 
-    def compile_mac_ios(self):
+    def compile_mac_ios(self, build_mac, build_ios):
         xcode_proj_info = self.cfg_info[LibsCompiler.KEY_XCODE_PROJS_INFO]
         if self.mode == 'debug':
             mode_str = 'Debug'
@@ -298,12 +428,12 @@ class LibsCompiler(cocos.CCPlugin):
             proj_path = os.path.join(self.repo_x, proj_info['proj_path'])
             target = proj_info['targets']
 
-            if self.build_mac:
+            if build_mac:
                 # compile mac
                 build_cmd = XCODE_CMD_FMT % (proj_path, mode_str, "%s Mac" % target, "", mac_out_dir)
                 self._run_cmd(build_cmd)
 
-            if self.build_ios:
+            if build_ios:
                 # compile ios simulator
                 build_cmd = XCODE_CMD_FMT % (proj_path, mode_str, "%s iOS" % target, "-sdk iphonesimulator ARCHS=\"i386 x86_64\" VALID_ARCHS=\"i386 x86_64\"", ios_sim_libs_dir)
                 self._run_cmd(build_cmd)
@@ -312,7 +442,7 @@ class LibsCompiler(cocos.CCPlugin):
                 build_cmd = XCODE_CMD_FMT % (proj_path, mode_str, "%s iOS" % target, "-sdk iphoneos", ios_dev_libs_dir)
                 self._run_cmd(build_cmd)
 
-            if self.build_ios:
+            if build_ios:
                 # generate fat libs for iOS
                 for lib in os.listdir(ios_sim_libs_dir):
                     sim_lib = os.path.join(ios_sim_libs_dir, lib)
@@ -328,15 +458,15 @@ class LibsCompiler(cocos.CCPlugin):
 
         if not self.disable_strip:
             # strip the libs
-            if self.build_ios:
+            if build_ios:
                 ios_strip_cmd = "xcrun -sdk iphoneos strip -S %s/*.a" % ios_out_dir
                 self._run_cmd(ios_strip_cmd)
-            if self.build_mac:
+            if build_mac:
                 mac_strip_cmd = "xcrun strip -S %s/*.a" % mac_out_dir
                 self._run_cmd(mac_strip_cmd)
 
     def compile_android(self):
-        # build .so for android
+        # build .a for android
         cmd_path = self._get_cocos_cmd_path()
         engine_dir = self.repo_x
 
@@ -347,71 +477,155 @@ class LibsCompiler(cocos.CCPlugin):
         elif self.language == 'js':
             proj_path = os.path.join(engine_dir, 'tests/js-tests')
 
+        # the ABIs whose libs are restored from the cache are not compiled
+        toolchain = self.get_android_toolchain()
+        app_abi_list = []
         for app_abi_item in self.app_abi_list:
-            build_cmd = "%s compile -s %s -p android --no-sign --mode %s --app-abi %s" % (cmd_path, proj_path, self.mode, app_abi_item)
+            android_out_dir = os.path.join(self.lib_dir, "android", app_abi_item)
+            if not self.restore_libs('android-%s' % app_abi_item, toolchain, android_out_dir):
+                app_abi_list.append(app_abi_item)
+
+        if len(app_abi_list) == 0:
+            return
+
+        if self.separate_abi:
+            build_abis = [ [ app_abi_item ] for app_abi_item in app_abi_list ]
+        else:
+            # ndk-build compiles all the ABIs in one compilation, which shares the jobs & the gradle setup
+            build_abis = [ app_abi_list ]
+
+        for abis in build_abis:
+            start_time = time.time()
+            abi_str = ':'.join(abis)
+            build_cmd = "%s compile -s %s -p android --no-sign --mode %s --app-abi %s -j %d" % (cmd_path, proj_path, self.mode, abi_str, self.jobs)
             if self.android_platform is not None:
                 build_cmd += ' --ap %s' % self.android_platform
             self._run_cmd(build_cmd)
+            Logging.info(MultiLanguage.get_string('GEN_LIBS_INFO_ANDROID_BUILD_TIME_FMT', (abi_str, time.time() - start_time)))
 
-            # copy .a to prebuilt dir
+        # copy .a to prebuilt dir
+        copy_tasks = []
+        for app_abi_item in app_abi_list:
             ANDROID_A_PATH = "proj.android/app/build/intermediates/ndkBuild/%s/obj/local/%s" % (self.mode, app_abi_item)
             if self.language != 'cpp':
                 ANDROID_A_PATH = 'project/' + ANDROID_A_PATH
 
             android_out_dir = os.path.join(self.lib_dir, "android", app_abi_item)
             obj_dir = os.path.join(proj_path, ANDROID_A_PATH)
-            copy_cfg = {
-                "from": obj_dir,
-                "to": android_out_dir,
-                "include": [
-                    "*.a$"
-                ]
-            }
-            cocos.copy_files_with_config(copy_cfg, obj_dir, android_out_dir)
+            copy_tasks.append((app_abi_item, obj_dir, android_out_dir))
+
+        abi_libs = OrderedDict()
+        abi_times = {}
+        for app_abi_item, libs, copy_time in self.run_tasks(self.copy_android_libs, copy_tasks):
+            abi_libs[app_abi_item] = libs
+            abi_times[app_abi_item] = [ copy_time, 0 ]
 
         if not self.disable_strip:
-            # strip the android libs
-            ndk_root = os.environ["NDK_ROOT"]
-            if cocos.os_is_win32():
-                if cocos.os_is_32bit_windows():
-                    check_bits = [ "", "-x86_64" ]
-                else:
-                    check_bits = [ "-x86_64", "" ]
-
-                sys_folder_name = "windows"
-                for bit_str in check_bits:
-                    check_folder_name = "windows%s" % bit_str
-                    check_path = os.path.join(ndk_root, "toolchains/arm-linux-androideabi-4.9/prebuilt/%s" % check_folder_name)
-                    if os.path.isdir(check_path):
-                        sys_folder_name = check_folder_name
-                        break
-            elif cocos.os_is_mac():
-                sys_folder_name = "darwin-x86_64"
-            else:
-                sys_folder_name = "linux-x86_64"
+            # strip the libs of all the ABIs at once
+            strip_tools = self.get_android_strip_tools()
+            strip_tasks = []
+            for app_abi_item, libs in abi_libs.items():
+                if app_abi_item not in strip_tools:
+                    continue
+
+                for lib in libs:
+                    strip_tasks.append((app_abi_item, strip_tools[app_abi_item], lib))
+
+            for app_abi_item, strip_time in self.run_tasks(self.strip_lib, strip_tasks):
+                abi_times[app_abi_item][1] += strip_time
+
+        for app_abi_item, libs in abi_libs.items():
+            copy_time, strip_time = abi_times[app_abi_item]
+            Logging.info(MultiLanguage.get_string('GEN_LIBS_INFO_ANDROID_ABI_TIME_FMT',
+                                                  (app_abi_item, len(libs), copy_time, strip_time)))
+
+        for app_abi_item in app_abi_list:
+            android_out_dir = os.path.join(self.lib_dir, "android", app_abi_item)
+            self.store_libs('android-%s' % app_abi_item, toolchain, android_out_dir)
+
+    def run_tasks(self, func, tasks):
+        # returns the results of the tasks, which are run by self.jobs threads
+        if self.jobs <= 1 or len(tasks) <= 1:
+            return [ func(task) for task in tasks ]
 
-            # set strip execute file name
-            if cocos.os_is_win32():
-                strip_execute_name = "strip.exe"
+        pool = ThreadPool(min(self.jobs, len(tasks)))
+        try:
+            results = pool.map(func, tasks)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        return results
+
+    def copy_android_libs(self, task):
+        app_abi_item, obj_dir, android_out_dir = task
+        start_time = time.time()
+        copy_cfg = {
+            "from": obj_dir,
+            "to": android_out_dir,
+            "include": [
+                "*.a$"
+            ]
+        }
+        cocos.copy_files_with_config(copy_cfg, obj_dir, android_out_dir)
+
+        libs = []
+        if os.path.isdir(android_out_dir):
+            for name in sorted(os.listdir(android_out_dir)):
+                basename, ext = os.path.splitext(name)
+                if ext == ".a":
+                    libs.append(os.path.join(android_out_dir, name))
+
+        return app_abi_item, libs, time.time() - start_time
+
+    def get_android_strip_tools(self):
+        # returns the strip tools of the ABIs which can be found in NDK
+        ndk_root = os.environ["NDK_ROOT"]
+        if cocos.os_is_win32():
+            if cocos.os_is_32bit_windows():
+                check_bits = [ "", "-x86_64" ]
             else:
-                strip_execute_name = "strip"
+                check_bits = [ "-x86_64", "" ]
+
+            sys_folder_name = "windows"
+            for bit_str in check_bits:
+                check_folder_name = "windows%s" % bit_str
+                check_path = os.path.join(ndk_root, "toolchains/arm-linux-androideabi-4.9/prebuilt/%s" % check_folder_name)
+                if os.path.isdir(check_path):
+                    sys_folder_name = check_folder_name
+                    break
+        elif cocos.os_is_mac():
+            sys_folder_name = "darwin-x86_64"
+        else:
+            sys_folder_name = "linux-x86_64"
+
+        # set strip execute file name
+        if cocos.os_is_win32():
+            strip_execute_name = "strip.exe"
+        else:
+            strip_execute_name = "strip"
+
+        strip_tools = {}
+        for app_abi_item in self.app_abi_list:
+            if app_abi_item not in LibsCompiler.ANDROID_STRIP_TOOLS:
+                continue
 
-            # strip arm libs
-            strip_cmd_path = os.path.join(ndk_root, "toolchains/arm-linux-androideabi-4.9/prebuilt/%s/arm-linux-androideabi/bin/%s"
-                % (sys_folder_name, strip_execute_name))
+            toolchain, tools_prefix = LibsCompiler.ANDROID_STRIP_TOOLS[app_abi_item]
+            strip_cmd_path = os.path.join(ndk_root, "toolchains/%s/prebuilt/%s/%s/bin/%s"
+                % (toolchain, sys_folder_name, tools_prefix, strip_execute_name))
             if os.path.exists(strip_cmd_path):
-                self.trip_libs(strip_cmd_path, os.path.join(android_out_dir, "armeabi-v7a"))
-                    
+                strip_tools[app_abi_item] = strip_cmd_path
 
-            # strip arm64-v8a libs
-            strip_cmd_path = os.path.join(ndk_root, "toolchains/aarch64-linux-android-4.9/prebuilt/%s/aarch64-linux-android/bin/%s" % (sys_folder_name, strip_execute_name))
-            if os.path.exists(strip_cmd_path) and os.path.exists(os.path.join(android_out_dir, "arm64-v8a")):
-                self.trip_libs(strip_cmd_path, os.path.join(android_out_dir, 'arm64-v8a'))
+        return strip_tools
 
-            # strip x86 libs
-            strip_cmd_path = os.path.join(ndk_root, "toolchains/x86-4.8/prebuilt/%s/i686-linux-android/bin/%s" % (sys_folder_name, strip_execute_name))
-            if os.path.exists(strip_cmd_path) and os.path.exists(os.path.join(android_out_dir, "x86")):
-                self.trip_libs(strip_cmd_path, os.path.join(android_out_dir, 'x86'))
+    def strip_lib(self, task):
+        app_abi_item, strip_cmd, lib_path = task
+        start_time = time.time()
+        self._run_cmd("\"%s\" -S \"%s\"" % (strip_cmd, lib_path))
+        return app_abi_item, time.time() - start_time
 
     def _get_cocos_cmd_path(self):
         CONSOLE_PATH = "tools/cocos2d-console/bin"
@@ -425,21 +639,6 @@ class LibsCompiler(cocos.CCPlugin):
 
         return cmd_path
 
-    def trip_libs(self, strip_cmd, folder):
-        if not os.path.isdir(folder):
-            return
-
-        if cocos.os_is_win32():
-            for name in os.listdir(folder):
-                basename, ext = os.path.splitext(name)
-                if ext == ".a":
-                    full_name = os.path.join(folder, name)
-                    command = "%s -S %s" % (strip_cmd, full_name)
-                    self._run_cmd(command)
-        else:
-            strip_cmd = "%s -S %s/*.a" % (strip_cmd, folder)
-            self._run_cmd(strip_cmd)
-
     def modify_binary_mk(self):
         android_libs = os.path.join(self.lib_dir, "android")
         android_mks = self.cfg_info[LibsCompiler.KEY_ANDROID_MKS]
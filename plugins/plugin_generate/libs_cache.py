@@ -0,0 +1,207 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# libs_cache: content-addressed cache of the libs generated by gen-libs
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Content-addressed cache of the libs generated by gen-libs.
+
+The libs of a platform are stored in a folder of the cache which is named by
+the fingerprint of everything they are built from: the engine sources, the
+build mode, the platform (or android ABI) & the version of the toolchain.
+The least recently used folders are removed when the cache is too large.
+'''
+
+import os
+import json
+import hashlib
+import shutil
+import uuid
+
+import cocos
+from MultiLanguage import MultiLanguage
+
+
+class LibsCache(object):
+
+    # remembers the hashes of the source files by size & modification time
+    SOURCES_FILE_FMT = 'sources-%s.json'
+    TMP_PREFIX = 'tmp-'
+    HASH_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.removed = 0
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    @staticmethod
+    def get_key(info):
+        # the same info always has the same key
+        return hashlib.sha1(json.dumps(info, sort_keys=True)).hexdigest()
+
+    @staticmethod
+    def _hash_file(path):
+        sha1 = hashlib.sha1()
+        f = open(path, 'rb')
+        try:
+            while True:
+                data = f.read(LibsCache.HASH_BLOCK_SIZE)
+                if not data:
+                    break
+                sha1.update(data)
+        finally:
+            f.close()
+
+        return sha1.hexdigest()
+
+    def _write_json(self, path, data):
+        tmp_path = '%s.%s' % (path, uuid.uuid4().hex)
+        f = open(tmp_path, 'wb')
+        try:
+            json.dump(data, f)
+        finally:
+            f.close()
+
+        # rename() can't replace a file on Windows
+        if cocos.os_is_win32() and os.path.isfile(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+    def hash_sources(self, root, sources, excludes=None):
+        '''
+        Returns the fingerprint of the files in `sources`, which are paths relative to `root`.
+        The files in `excludes` folders & the hidden files are not used.
+        Only the files whose size or modification time changed since last time are read again.
+        '''
+        excludes = [ os.path.normcase(os.path.normpath(e)) for e in (excludes or []) ]
+        memo_path = os.path.join(self.cache_dir, LibsCache.SOURCES_FILE_FMT % hashlib.sha1(os.path.normcase(root)).hexdigest())
+        memo = {}
+        if os.path.isfile(memo_path):
+            try:
+                f = open(memo_path, 'rb')
+                memo = json.load(f)
+                f.close()
+            except ValueError:
+                memo = {}
+
+        new_memo = {}
+        sha1 = hashlib.sha1()
+        for source in sources:
+            source_path = os.path.join(root, source)
+            if os.path.isfile(source_path):
+                files = [ source_path ]
+            elif os.path.isdir(source_path):
+                files = []
+                for dir_path, dir_names, file_names in os.walk(source_path):
+                    dir_names[:] = sorted([ d for d in dir_names if not d.startswith('.') and
+                                            os.path.normcase(os.path.join(dir_path, d)) not in excludes ])
+                    for name in sorted(file_names):
+                        if not name.startswith('.'):
+                            files.append(os.path.join(dir_path, name))
+            else:
+                continue
+
+            for file_path in files:
+                rel_path = os.path.relpath(file_path, root).replace('\\', '/')
+                stat = os.stat(file_path)
+                item = memo.get(rel_path)
+                if item is None or item[0] != stat.st_size or item[1] != stat.st_mtime:
+                    item = [ stat.st_size, stat.st_mtime, LibsCache._hash_file(file_path) ]
+                new_memo[rel_path] = item
+                sha1.update('%s\0%s\n' % (rel_path.encode('utf-8'), item[2]))
+
+        if new_memo != memo:
+            self._write_json(memo_path, new_memo)
+
+        return sha1.hexdigest()
+
+    def restore(self, key, name, dst_dir):
+        '''
+        Copies the libs cached with `key` into `dst_dir`.
+        Returns False if they are not in the cache.
+        '''
+        entry_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry_dir):
+            self.misses += 1
+            cocos.Logging.info(MultiLanguage.get_string('GEN_LIBS_INFO_CACHE_MISS_FMT', name))
+            return False
+
+        for dir_path, dir_names, file_names in os.walk(entry_dir):
+            rel_dir = os.path.relpath(dir_path, entry_dir)
+            out_dir = os.path.normpath(os.path.join(dst_dir, rel_dir))
+            if not os.path.isdir(out_dir):
+                os.makedirs(out_dir)
+            for file_name in file_names:
+                shutil.copy2(os.path.join(dir_path, file_name), os.path.join(out_dir, file_name))
+
+        # the used entries are removed at last
+        os.utime(entry_dir, None)
+        self.hits += 1
+        cocos.Logging.info(MultiLanguage.get_string('GEN_LIBS_INFO_CACHE_HIT_FMT', name))
+        return True
+
+    def store(self, key, src_dir):
+        '''
+        Stores the files in `src_dir` with `key`, then removes the least recently used
+        entries if the cache is larger than the max size.
+        '''
+        entry_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(src_dir) or os.path.isdir(entry_dir):
+            return
+
+        # the entry is complete when it appears in the cache
+        tmp_dir = os.path.join(self.cache_dir, LibsCache.TMP_PREFIX + uuid.uuid4().hex)
+        try:
+            shutil.copytree(src_dir, tmp_dir)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # stored by another gen-libs at the same time
+                if not os.path.isdir(entry_dir):
+                    raise
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+        self.evict()
+
+    @staticmethod
+    def _get_dir_size(dir_path):
+        size = 0
+        for parent, dir_names, file_names in os.walk(dir_path):
+            for name in file_names:
+                size += os.path.getsize(os.path.join(parent, name))
+
+        return size
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if name.startswith(LibsCache.TMP_PREFIX) or not os.path.isdir(entry_dir):
+                continue
+
+            size = LibsCache._get_dir_size(entry_dir)
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            total_size += size
+
+        # the least recently used entries are removed first
+        entries.sort()
+        for mtime, size, entry_dir in entries:
+            if total_size <= self.max_size:
+                break
+
+            shutil.rmtree(entry_dir)
+            total_size -= size
+            self.removed += 1
+
+    def report(self):
+        cocos.Logging.info(MultiLanguage.get_string('GEN_LIBS_INFO_CACHE_STATS_FMT',
+                                                    (self.hits, self.misses, self.removed)))
@@ -28,11 +28,12 @@
 #  to each XCBuildConfiguration object
 
 #  Xcode4 will read either a OpenStep or XML plist.
-#  this script uses `plutil` to validate, read and write
-#  the pbxproj file.  Plutil is available in OS X 10.2 and higher
-#  Plutil can't write OpenStep plists, so I save as XML
+#  this script parses the OpenStep plist by PBXParser, the XML plist
+#  by plistlib, and writes the pbxproj file in the OpenStep format.
 
+import binascii
 import datetime
+import gc
 import json
 import ntpath
 import os
@@ -116,6 +117,12 @@ class PBXList(UserList):
 
 
 class PBXType(PBXDict):
+    # the keys used by the indexes of PBXObjects
+    INDEXED_KEYS = frozenset(['isa', 'name', 'path', 'sourceTree', 'fileRef', 'children'])
+
+    # the PBXObjects which contains the object
+    owner = None
+
     def __init__(self, d=None):
         PBXDict.__init__(self, d)
 
@@ -123,6 +130,24 @@ class PBXType(PBXDict):
             self['isa'] = self.__class__.__name__
         self.id = None
 
+    def __setitem__(self, key, value):
+        owner = self.owner
+        if owner is not None and key in PBXType.INDEXED_KEYS:
+            owner.unindex(self.id)
+            PBXDict.__setitem__(self, key, value)
+            owner.index(self.id)
+        else:
+            PBXDict.__setitem__(self, key, value)
+
+    def remove(self, key):
+        owner = self.owner
+        if owner is not None and key in PBXType.INDEXED_KEYS:
+            owner.unindex(self.id)
+            PBXDict.remove(self, key)
+            owner.index(self.id)
+        else:
+            PBXDict.remove(self, key)
+
     @staticmethod
     def Convert(o):
         if isinstance(o, list):
@@ -346,7 +371,8 @@ class PBXGroup(PBXType):
         if 'children' not in self:
             self['children'] = PBXList()
 
-        self['children'].add(ref.id)
+        if self['children'].add(ref.id) and self.owner is not None:
+            self.owner.child_added(self.id, ref.id)
 
         return ref.id
 
@@ -358,7 +384,8 @@ class PBXGroup(PBXType):
         if not PBXType.IsGuid(id):
             id = id.id
 
-        self['children'].remove(id)
+        if self['children'].remove(id) and self.owner is not None:
+            self.owner.child_removed(self.id, id)
 
     def has_child(self, id):
         if 'children' not in self:
@@ -688,8 +715,202 @@ class XCConfigurationList(PBXType):
     pass
 
 
+def _path_leaf(path):
+    tail = path[max(path.rfind('/'), path.rfind('\\')) + 1:]
+    if tail and ':' not in path:
+        # the same result as ntpath, without the drive handling
+        return tail
+
+    head, tail = ntpath.split(path)
+    return tail or ntpath.basename(head)
+
+
+class PBXObjects(PBXDict):
+    """
+    The objects of a project keyed by their ids.
+
+    Keeps indexes of the objects up to date when they are added, removed or
+    changed, so XcodeProject can find them without scanning all the objects.
+    The indexes are built by the first lookup.
+    The children of the groups should be changed by PBXGroup.add_child() &
+    PBXGroup.remove_child(), the index of the parent groups relies on them.
+    """
+
+    def __init__(self, d=None):
+        if isinstance(d, PBXDict):
+            # already converted
+            IterableUserDict.__init__(self)
+            self.data = d.data
+        else:
+            PBXDict.__init__(self, d)
+
+        # index key -> {id: object}
+        self._index = None
+        # id -> index keys of the object
+        self._keys = None
+        # child id -> ids of the PBXGroups which contain it
+        self._parents = None
+
+        for v in self.data.itervalues():
+            if isinstance(v, PBXType):
+                v.owner = self
+
+    def _build_index(self):
+        self._index = {}
+        self._keys = {}
+        for k in self.data:
+            self.index(k)
+
+    @staticmethod
+    def _get_index_keys(obj):
+        get = obj.data.get
+        isa = get('isa')
+        path = get('path')
+
+        keys = [('isa', isa)]
+        if path is not None:
+            keys.append(('leaf', _path_leaf(path)))
+
+        if isa == 'PBXFileReference':
+            keys.append(('file', path, get('sourceTree')))
+            keys.append(('file_name', get('name')))
+        elif isa == 'PBXGroup':
+            # same as PBXGroup.get_name()
+            keys.append(('group_name', get('name', os.path.split(path or '')[1])))
+        elif isa == 'PBXBuildFile':
+            keys.append(('build_file', get('fileRef')))
+
+        return keys
+
+    def index(self, id):
+        if self._index is None:
+            return
+
+        obj = self.data.get(id)
+        if obj is None:
+            return
+
+        keys = self._get_index_keys(obj)
+        self._keys[id] = keys
+        for key in keys:
+            self._index.setdefault(key, {})[id] = obj
+
+        if self._parents is not None and obj.get('isa') == 'PBXGroup':
+            for child in obj.get('children', ()):
+                self._parents.setdefault(child, set()).add(id)
+
+    def unindex(self, id):
+        if self._index is None:
+            return
+
+        for key in self._keys.pop(id, ()):
+            objs = self._index[key]
+            del objs[id]
+            if not objs:
+                del self._index[key]
+
+        obj = self.data.get(id)
+        if self._parents is not None and obj is not None and obj.get('isa') == 'PBXGroup':
+            for child in obj.get('children', ()):
+                parents = self._parents.get(child)
+                if parents:
+                    parents.discard(id)
+
+    def child_added(self, group_id, child_id):
+        if self._parents is not None and group_id in self.data:
+            self._parents.setdefault(child_id, set()).add(group_id)
+
+    def child_removed(self, group_id, child_id):
+        if self._parents is not None:
+            parents = self._parents.get(child_id)
+            if parents:
+                parents.discard(group_id)
+
+    def __setitem__(self, key, value):
+        key = PBXType.Convert(key)
+        self.remove(key)
+        PBXDict.__setitem__(self, key, value)
+
+        value = self.data[key]
+        if isinstance(value, PBXType):
+            value.owner = self
+        self.index(key)
+
+    def __delitem__(self, key):
+        if key not in self.data:
+            raise KeyError(key)
+
+        self.remove(key)
+
+    def remove(self, key):
+        key = PBXType.Convert(key)
+        if key not in self.data:
+            return
+
+        self.unindex(key)
+        obj = self.data.pop(key)
+        if isinstance(obj, PBXType):
+            obj.owner = None
+
+    def pop(self, key, *args):
+        if key not in self.data:
+            return self.data.pop(key, *args)
+
+        obj = self.data[key]
+        self.remove(key)
+        return obj
+
+    def _find(self, key):
+        if self._index is None:
+            self._build_index()
+
+        objs = self._index.get(key)
+        if not objs:
+            return []
+
+        return objs.values()
+
+    def get_by_isa(self, isa):
+        return self._find(('isa', isa))
+
+    def get_by_path_leaf(self, leaf):
+        # all the objects which have a path ends with leaf
+        return self._find(('leaf', leaf))
+
+    def get_files_by_path(self, path, tree):
+        return self._find(('file', path, tree))
+
+    def get_files_by_name(self, name):
+        return self._find(('file_name', name))
+
+    def get_groups_by_name(self, name):
+        return self._find(('group_name', name))
+
+    def get_build_files(self, file_ref):
+        return self._find(('build_file', file_ref))
+
+    def _get_parent_ids(self, id):
+        if self._index is None:
+            self._build_index()
+
+        if self._parents is None:
+            parents = {}
+            for group_id, group in self._index.get(('isa', 'PBXGroup'), {}).iteritems():
+                for child in group.get('children', ()):
+                    parents.setdefault(child, set()).add(group_id)
+            self._parents = parents
+
+        return self._parents.get(id, ())
+
+    def get_parents(self, id):
+        # the PBXGroups which contain the object
+        return [self.data[group_id] for group_id in self._get_parent_ids(id)]
+
+    def is_child(self, id, group_id):
+        return group_id in self._get_parent_ids(id)
+
+
 class XcodeProject(PBXDict):
-    plutil_path = 'plutil'
     special_folders = ['.bundle', '.framework', '.xcodeproj']
 
     def __init__(self, d=None, path=None):
@@ -702,7 +923,8 @@ class XcodeProject(PBXDict):
         IterableUserDict.__init__(self, d)
 
         self.data = PBXDict(self.data)
-        self.objects = self.get('objects')
+        self.objects = PBXObjects(self.get('objects'))
+        self.data['objects'] = self.objects
         self.modified = False
 
         root_id = self.get('rootObject')
@@ -720,21 +942,21 @@ class XcodeProject(PBXDict):
             v.id = k
 
     def add_other_cflags(self, flags):
-        build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+        build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
         for b in build_configs:
             if b.add_other_cflags(flags):
                 self.modified = True
 
     def add_other_ldflags(self, flags):
-        build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+        build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
         for b in build_configs:
             if b.add_other_ldflags(flags):
                 self.modified = True
 
     def remove_other_ldflags(self, flags):
-        build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+        build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
         for b in build_configs:
             if b.remove_other_ldflags(flags):
@@ -742,7 +964,7 @@ class XcodeProject(PBXDict):
 
     def add_user_header_search_paths(self, paths, target_name=None, recursive=True):
         if target_name is None:
-            build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+            build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
             for b in build_configs:
                 if b.add_user_header_search_paths(paths, recursive):
@@ -767,7 +989,7 @@ class XcodeProject(PBXDict):
 
     def remove_user_header_search_paths(self, paths, target_name=None):
         if target_name is None:
-            build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+            build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
             for b in build_configs:
                 if b.remove_user_header_search_paths(paths):
@@ -787,7 +1009,7 @@ class XcodeProject(PBXDict):
 
     def remove_library_search_paths(self, paths, target_name=None):
         if target_name is None:
-            build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+            build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
             for b in build_configs:
                 if b.remove_library_search_paths(paths):
@@ -807,7 +1029,7 @@ class XcodeProject(PBXDict):
 
     def add_header_search_paths(self, paths, target_name=None, recursive=True):
         if target_name is None:
-            build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+            build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
             for b in build_configs:
                 if b.add_header_search_paths(paths, recursive):
@@ -826,7 +1048,7 @@ class XcodeProject(PBXDict):
                         self.modified = True
 
     def add_framework_search_paths(self, paths, recursive=True):
-        build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+        build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
         for b in build_configs:
             if b.add_framework_search_paths(paths, recursive):
@@ -835,7 +1057,7 @@ class XcodeProject(PBXDict):
     def add_library_search_paths(self, paths, target_name=None, recursive=True):
 
         if target_name is None:
-            build_configs = [b for b in self.objects.values() if b.get('isa') == 'XCBuildConfiguration']
+            build_configs = self.objects.get_by_isa('XCBuildConfiguration')
 
             for b in build_configs:
                 if b.add_library_search_paths(paths, recursive):
@@ -860,47 +1082,36 @@ class XcodeProject(PBXDict):
         return self.objects.keys()
 
     def get_files_by_os_path(self, os_path, tree='SOURCE_ROOT'):
-        files = [f for f in self.objects.values() if f.get('isa') == 'PBXFileReference'
-                                                     and f.get('path') == os_path
-                                                     and f.get('sourceTree') == tree]
+        files = self.objects.get_files_by_path(os_path, tree)
 
         return files
 
     def get_files_by_name(self, name, parent=None):
         if parent:
-            files = [f for f in self.objects.values() if f.get('isa') == 'PBXFileReference'
-                                                         and f.get('name') == name
-                                                         and parent.has_child(f)]
+            files = [f for f in self.objects.get_files_by_name(name) if self.objects.is_child(f.id, parent.id)]
         else:
-            files = [f for f in self.objects.values() if f.get('isa') == 'PBXFileReference'
-                                                         and f.get('name') == name]
+            files = self.objects.get_files_by_name(name)
 
         return files
 
     def get_build_files(self, id):
-        files = [f for f in self.objects.values() if f.get('isa') == 'PBXBuildFile'
-                                                     and f.get('fileRef') == id]
+        files = self.objects.get_build_files(id)
 
         return files
 
     def get_groups_by_name(self, name, parent=None):
         if parent:
-            groups = [g for g in self.objects.values() if g.get('isa') == 'PBXGroup'
-                                                          and g.get_name() == name
-                                                          and parent.has_child(g)]
+            groups = [g for g in self.objects.get_groups_by_name(name) if self.objects.is_child(g.id, parent.id)]
         else:
-            groups = [g for g in self.objects.values() if g.get('isa') == 'PBXGroup'
-                                                          and g.get_name() == name]
+            groups = self.objects.get_groups_by_name(name)
 
         return groups
 
     def get_group_id(self, group_name):
-        objs = self.data.get('objects')
         ret_id = None
-        for key in objs:
-            obj = objs.get(key)
-            if obj.get("isa") == "PBXGroup" and obj.get("name") == group_name:
-                ret_id = key
+        for obj in self.objects.get_groups_by_name(group_name):
+            if obj.get("name") == group_name:
+                ret_id = obj.id
                 break
 
         return ret_id
@@ -915,11 +1126,10 @@ class XcodeProject(PBXDict):
             # assume it's an id
             parent = self.objects.get(parent, self.root_group)
 
-        groups = self.get_groups_by_name(name)
+        groups = self.get_groups_by_name(name, parent)
 
-        for grp in groups:
-            if parent.has_child(grp.id):
-                return grp
+        if groups:
+            return groups[0]
 
         grp = PBXGroup.Create(name, path)
         parent.add_child(grp)
@@ -933,25 +1143,25 @@ class XcodeProject(PBXDict):
     def get_groups_by_os_path(self, path):
         path = os.path.abspath(path)
 
-        groups = [g for g in self.objects.values() if g.get('isa') == 'PBXGroup'
-                                                      and os.path.abspath(g.get('path', '/dev/null')) == path]
+        groups = [g for g in self.objects.get_by_isa('PBXGroup')
+                  if os.path.abspath(g.get('path', '/dev/null')) == path]
 
         return groups
 
     def get_build_phases(self, phase_name):
-        phases = [p for p in self.objects.values() if p.get('isa') == phase_name]
+        phases = self.objects.get_by_isa(phase_name)
 
         return phases
 
     def get_native_target(self, target_name):
         target = None
-        for obj in self.objects.values():
-            if target_name == "PROJECT":
-                if obj.get('isa') == "PBXProject":
-                    target = obj
-                    break
-            else:
-                if obj.get('isa') == "PBXNativeTarget" and obj.get("name") == target_name:
+        if target_name == "PROJECT":
+            projects = self.objects.get_by_isa("PBXProject")
+            if projects:
+                target = projects[0]
+        else:
+            for obj in self.objects.get_by_isa("PBXNativeTarget"):
+                if obj.get("name") == target_name:
                     target = obj
                     break
 
@@ -965,10 +1175,7 @@ class XcodeProject(PBXDict):
         if not file_list:
             return []
 
-        if parent:
-            exists_list = [f.get('name') for f in self.objects.values() if f.get('isa') == 'PBXFileReference' and f.get('name') in file_list and parent.has_child(f)]
-        else:
-            exists_list = [f.get('name') for f in self.objects.values() if f.get('isa') == 'PBXFileReference' and f.get('name') in file_list]
+        exists_list = [name for name in set(file_list) if self.get_files_by_name(name, parent)]
 
         return set(file_list).difference(exists_list)
 
@@ -987,6 +1194,7 @@ class XcodeProject(PBXDict):
                     t['buildPhases'].add(script_phase.id)
                     self.objects[script_phase.id] = script_phase
                     result.append(script_phase)
+                    self.modified = True
             
         return result
     
@@ -1005,6 +1213,7 @@ class XcodeProject(PBXDict):
                     t['buildPhases'].add(script_phase.id)
                     self.objects[script_phase.id] = script_phase
                     result.append(script_phase)
+                    self.modified = True
             
         return result
     
@@ -1085,8 +1294,7 @@ class XcodeProject(PBXDict):
         return results
 
     def path_leaf(self, path):
-        head, tail = ntpath.split(path)
-        return tail or ntpath.basename(head)
+        return _path_leaf(path)
 
     def add_file_if_doesnt_exist(self, f_path, parent=None, tree='SOURCE_ROOT', create_build_files=True, weak=False, ignore_unknown_type=False, target=None):
         # for obj in self.objects.values():
@@ -1117,12 +1325,9 @@ class XcodeProject(PBXDict):
             parent = self.objects.get(parent, self.root_group)
 
         file_ref = None
-        for key in self.objects:
-            obj = self.objects.get(key)
-            if 'path' in obj:
-                if self.path_leaf(f_path) == self.path_leaf(obj.get('path')):
-                    file_ref = obj
-                    break
+        same_leaf = self.objects.get_by_path_leaf(self.path_leaf(f_path))
+        if same_leaf:
+            file_ref = same_leaf[0]
 
         if file_ref is None:
             file_ref = PBXFileReference.Create(f_path, tree, ignore_unknown_type=ignore_unknown_type)
@@ -1196,24 +1401,16 @@ class XcodeProject(PBXDict):
                 os.symlink(srcLib, finalLib)
 
     def remove_group_by_name(self, grp_name):
-        objs = self.data.get('objects')
-        find_grp = None
-        for key in objs:
-            obj = objs.get(key)
-            if obj.get("isa") == "PBXGroup" and obj.get("name") == grp_name:
-                find_grp = key
-                break
+        find_grp = self.get_group_id(grp_name)
 
         if find_grp is not None:
             self.remove_group(find_grp)
 
     def remove_group_by_path(self, grp_path):
-        objs = self.data.get('objects')
         find_grp = None
-        for key in objs:
-            obj = objs.get(key)
+        for obj in self.objects.get_by_path_leaf(self.path_leaf(grp_path)):
             if obj.get("isa") == "PBXGroup" and obj.get("path") == grp_path:
-                find_grp = key
+                find_grp = obj.id
                 break
 
         if find_grp is not None:
@@ -1247,12 +1444,7 @@ class XcodeProject(PBXDict):
         self.modified = True
 
         fileRefID = build_file_info.get("fileRef")
-        need_remove_fileRef = True
-        for key in objs:
-            obj_info = objs.get(key)
-            if obj_info.get("isa") == "PBXBuildFile" and obj_info.get("fileRef") == fileRefID:
-                need_remove_fileRef = False
-                break
+        need_remove_fileRef = len(objs.get_build_files(fileRefID)) == 0
 
         if need_remove_fileRef:
             objs.remove(fileRefID)
@@ -1279,11 +1471,7 @@ class XcodeProject(PBXDict):
         self.modified = True
 
         # remove build file
-        need_remove_build_files = []
-        for key in objs:
-            obj = objs.get(key)
-            if obj.get("isa") == "PBXBuildFile" and obj.get("fileRef") == file_id:
-                need_remove_build_files.append(key)
+        need_remove_build_files = [bf.id for bf in objs.get_build_files(file_id)]
 
         for item in need_remove_build_files:
             objs.remove(item)
@@ -1292,12 +1480,10 @@ class XcodeProject(PBXDict):
                 continue
 
             # remove the build file from build phase
-            for key in objs:
-                obj = objs.get(key)
-                if obj.get("isa") == buildPhase:
-                    phase_files = obj.get("files")
-                    if item in phase_files:
-                        phase_files.remove(item)
+            for obj in objs.get_by_isa(buildPhase):
+                phase_files = obj.get("files")
+                if item in phase_files:
+                    phase_files.remove(item)
 
     def remove_target(self, target_name, ignore_case=False):
         objs = self.data.get('objects')
@@ -1310,8 +1496,8 @@ class XcodeProject(PBXDict):
         if ignore_case:
             find_target_name = target_name.lower()
 
-        for key in objs:
-            obj = objs.get(key)
+        for obj in objs.get_by_isa("PBXAggregateTarget") + objs.get_by_isa("PBXNativeTarget"):
+            key = obj.id
             if obj.get("isa") == "PBXAggregateTarget":
                 name = obj.get("name")
                 if ignore_case:
@@ -1344,12 +1530,8 @@ class XcodeProject(PBXDict):
         # remove product reference
         if len(product_ref) > 0:
             objs.remove(product_ref)
-            for key in objs:
-                obj = objs.get(key)
-                if obj.get("isa") == "PBXGroup":
-                    children = obj.get("children")
-                    if product_ref in children:
-                        children.remove(product_ref)
+            for obj in objs.get_parents(product_ref):
+                obj.remove_child(product_ref)
 
         # remove build config
         if len(remove_cfg_list) > 0:
@@ -1368,22 +1550,19 @@ class XcodeProject(PBXDict):
                 self.remove_build_file(build_file)
 
         # remove from dependencies
-        for key in objs:
-            obj = objs.get(key)
-            if obj.get("isa") == "PBXNativeTarget":
-                depends = obj.get("dependencies")
-                if key_of_target in depends:
-                    depends.remove(key_of_target)
+        for obj in objs.get_by_isa("PBXNativeTarget"):
+            depends = obj.get("dependencies")
+            if key_of_target in depends:
+                depends.remove(key_of_target)
 
     def remove_proj_reference(self, proj_name):
         objs = self.data.get('objects')
         fileRefID = ""
-        for key in objs:
-            obj = objs.get(key)
+        for obj in objs.get_by_path_leaf(self.path_leaf(proj_name)) + objs.get_files_by_name(proj_name):
             if obj.get("isa") == "PBXFileReference":
                 if obj.get("path") == proj_name or obj.get("name") == proj_name:
-                    fileRefID = key
-                    objs.remove(key)
+                    fileRefID = obj.id
+                    objs.remove(fileRefID)
                     break
 
         if len(fileRefID) <= 0:
@@ -1393,46 +1572,39 @@ class XcodeProject(PBXDict):
         # remove related configs
         need_remove_container = []
         need_remove_product_group = []
-        for key in objs:
-            obj = objs.get(key)
-            isa_value = obj.get("isa")
-            if isa_value == "PBXContainerItemProxy" and obj.get("containerPortal") == fileRefID:
-                need_remove_container.append(key)
-
-            if isa_value == "PBXGroup":
-                children = obj.get("children")
-                if fileRefID in children:
-                    children.remove(fileRefID)
-
-            if isa_value == "PBXProject":
-                proj_refers = obj.get("projectReferences")
-                for refer in proj_refers:
-                    if refer.get("ProjectRef") == fileRefID:
-                        proj_refers.remove(refer)
-                        if len(proj_refers) == 0:
-                            obj.remove("projectReferences")
-                        need_remove_product_group.append(refer.get("ProductGroup"))
+        for obj in objs.get_by_isa("PBXContainerItemProxy"):
+            if obj.get("containerPortal") == fileRefID:
+                need_remove_container.append(obj.id)
+
+        for obj in objs.get_parents(fileRefID):
+            obj.remove_child(fileRefID)
+
+        for obj in objs.get_by_isa("PBXProject"):
+            proj_refers = obj.get("projectReferences")
+            for refer in proj_refers:
+                if refer.get("ProjectRef") == fileRefID:
+                    proj_refers.remove(refer)
+                    if len(proj_refers) == 0:
+                        obj.remove("projectReferences")
+                    need_remove_product_group.append(refer.get("ProductGroup"))
 
         # remove containers
         need_remove_dependencies = []
         for item in need_remove_container:
             objs.remove(item)
 
-            for key in objs:
-                obj = objs.get(key)
-                if obj.get("isa") == "PBXTargetDependency" and obj.get("targetProxy") == item:
-                    need_remove_dependencies.append(key)
+            for obj in objs.get_by_isa("PBXTargetDependency"):
+                if obj.get("targetProxy") == item:
+                    need_remove_dependencies.append(obj.id)
 
         # remove dependencies
         for item in need_remove_dependencies:
             objs.remove(item)
 
-            for key in objs:
-                obj = objs.get(key)
-                if obj.get("isa") == "PBXNativeTarget":
-                    depends = obj.get("dependencies")
-                    if item in depends:
-                        depends.remove(item)
+            for obj in objs.get_by_isa("PBXNativeTarget"):
+                depends = obj.get("dependencies")
+                if item in depends:
+                    depends.remove(item)
 
         # remove group
         for group in need_remove_product_group:
@@ -1444,12 +1616,11 @@ class XcodeProject(PBXDict):
         objs = self.data.get('objects')
         fileRefID = ""
         buildPhase = "PBXResourcesBuildPhase"
-        for key in objs:
-            obj = objs.get(key)
+        for obj in objs.get_by_path_leaf(self.path_leaf(file_path)):
             if obj.get('isa') == "PBXFileReference" and obj.get("path") == file_path:
-                fileRefID = key
+                fileRefID = obj.id
                 buildPhase = FILE_TYPE_INFO.get(obj['lastKnownFileType'], "PBXResourcesBuildPhase")
-                objs.remove(key)
+                objs.remove(fileRefID)
                 break
 
         if len(fileRefID) <= 0:
@@ -1458,36 +1629,21 @@ class XcodeProject(PBXDict):
 
         self.modified = True
 
-        buildFileIDs = []
-        for key in objs:
-            obj = objs.get(key)
-            if obj.get('isa') == "PBXBuildFile" and obj.get("fileRef") == fileRefID:
-                if key not in buildFileIDs:
-                    buildFileIDs.append(key)
+        buildFileIDs = set([bf.id for bf in objs.get_build_files(fileRefID)])
 
         if len(buildFileIDs) > 0:
             for id in buildFileIDs:
                 objs.remove(id)
 
-        for key in objs:
-            obj = objs.get(key)
-            if obj.get('isa') == buildPhase:
+            for obj in objs.get_by_isa(buildPhase):
                 files = obj.get("files")
-                need_remove_files = []
-                for fileID in files:
-                    if fileID in buildFileIDs and fileID not in need_remove_files:
-                        need_remove_files.append(fileID)
-
-                if len(need_remove_files) > 0:
-                    for fID in need_remove_files:
-                        files.remove(fID)
-
-            if obj.get('isa') == "PBXGroup":
-                children = obj.get("children")
-                for child in children:
-                    if child == fileRefID:
-                        children.remove(child)
-                        break
+                need_remove_files = [fileID for fileID in buildFileIDs if fileID in files]
+
+                for fID in need_remove_files:
+                    files.remove(fID)
+
+        for obj in objs.get_parents(fileRefID):
+            obj.remove_child(fileRefID)
 
     def remove_file(self, id, recursive=True):
         if not PBXType.IsGuid(id):
@@ -1497,11 +1653,8 @@ class XcodeProject(PBXDict):
             self.objects.remove(id)
 
             if recursive:
-                groups = [g for g in self.objects.values() if g.get('isa') == 'PBXGroup']
-
-                for group in groups:
-                    if id in group['children']:
-                        group.remove_child(id)
+                for group in self.objects.get_parents(id):
+                    group.remove_child(id)
 
             self.modified = True
 
@@ -1668,11 +1821,11 @@ class XcodeProject(PBXDict):
                 filerefs = []
 
                 for f in v:
-                    filerefs.extend([fr.id for fr in self.objects.values() if fr.get('isa') == 'PBXFileReference'
-                                                                              and fr.get('name') == f])
+                    filerefs.extend([fr.id for fr in self.get_files_by_name(f)])
 
-                buildfiles = [bf for bf in self.objects.values() if bf.get('isa') == 'PBXBuildFile'
-                                                                    and bf.get('fileRef') in filerefs]
+                buildfiles = []
+                for fr in set(filerefs):
+                    buildfiles.extend(self.get_build_files(fr))
 
                 for bf in buildfiles:
                     if bf.add_compiler_flag(k):
@@ -1687,7 +1840,10 @@ class XcodeProject(PBXDict):
 
         shutil.copy2(file_name, backup_name)
 
-    def save(self, file_name=None, old_format=False):
+    def save(self, file_name=None, old_format=False, skip_unmodified=False):
+        if skip_unmodified and not self.modified:
+            return
+
         if old_format :
             self.saveFormatXML(file_name)
         else:
@@ -1709,267 +1865,503 @@ class XcodeProject(PBXDict):
             writer.writeValue(self.data)
             writer.writeln("</plist>")
 
-    def get_comment(self, key, whole_data):
-        obj_data = whole_data.get(key)
-        obj_isa = obj_data.get('isa')
-
-        ret = ""
-        if obj_isa == "PBXBuildFile":
-            fileRef = obj_data.get("fileRef")
-            fileRef_info = whole_data.get(fileRef)
-            if fileRef_info.has_key("name"):
-                fileName = fileRef_info.get("name")
-            elif fileRef_info.has_key("path"):
-                fileName = fileRef_info.get("path")
-
-            if fileRef_info.has_key("fileType"):
-                fileType = FILE_TYPE_INFO.get(fileRef_info["fileType"], "PBXResourcesBuildPhase")
-            else:
-                fileType = FILE_TYPE_INFO.get(fileRef_info.get("lastKnownFileType"), "PBXResourcesBuildPhase")
-
-            if fileType == "PBXFrameworksBuildPhase":
-                ret = "%s in %s" % (fileName, "Frameworks")
-            elif fileType == "PBXSourcesBuildPhase":
-                ret = "%s in %s" % (fileName, "Sources")
-            elif fileType == "PBXResourcesBuildPhase":
-                ret = "%s in %s" % (fileName, "Resources")
-            else:
-                ret = "%s" % fileName
-        elif obj_isa == "PBXTargetDependency":
-            ret = "PBXTargetDependency"
-        elif obj_isa == "PBXContainerItemProxy":
-            ret = "PBXContainerItemProxy"
-        elif 'name' in obj_data:
-            ret = obj_data.get('name')
-        elif 'path' in obj_data:
-            ret = obj_data.get('path')
-        else:
-            if obj_isa == 'PBXProject':
-                ret = "Project object"
-            elif obj_isa[0:3] == 'PBX':
-                ret = obj_isa[3:-10]
-            else:
-                ret = 'Build configuration list for PBXNativeTarget "TARGET_NAME"'
-
-        return ret
-
-
-    def save_new_format(self, file_name=None):
-        """Save in Xcode 3.2 compatible (new) format"""
-        if not file_name:
-            file_name = self.pbxproj_path
-
-        # process to get the section's info and names
-        objs = self.data.get('objects')
-        sections = dict()
-        uuids = dict()
+    def get_comments(self):
+        """Returns the comments written after the ids of the objects"""
+        objs = self.data.get('objects').data
+        comments = {}
+        file_comments = {}
+
+        # the build files are commented with the name of their build phase, like Xcode does
+        file_phases = {}
+        for obj in objs.itervalues():
+            obj_data = obj.data
+            obj_isa = obj_data.get('isa')
+            if obj_isa is None or not obj_isa.endswith('BuildPhase') or 'files' not in obj_data:
+                continue
 
-        for key in objs:
-            obj_isa = objs.get(key).get('isa')
-            if obj_isa in sections:
-                l = sections.get(obj_isa)
+            phase_name = obj_data.get('name') or obj_isa[3:-10]
+            for build_file in obj_data.get('files'):
+                file_phases[build_file] = phase_name
+
+        for key, obj in objs.iteritems():
+            obj_data = obj.data
+            obj_isa = obj_data.get('isa')
+
+            ret = ""
+            if obj_isa == "PBXBuildFile":
+                fileRef = obj_data.get("fileRef")
+                phase_name = file_phases.get(key)
+                if (fileRef, phase_name) not in file_comments:
+                    fileRef_info = objs.get(fileRef)
+                    if fileRef_info is not None:
+                        fileRef_info = fileRef_info.data
+                    file_comments[(fileRef, phase_name)] = self._get_build_file_comment(fileRef_info, phase_name)
+                ret = file_comments[(fileRef, phase_name)]
+            elif obj_isa == "PBXTargetDependency":
+                ret = "PBXTargetDependency"
+            elif obj_isa == "PBXContainerItemProxy":
+                ret = "PBXContainerItemProxy"
+            elif 'name' in obj_data:
+                ret = obj_data.get('name')
+            elif 'path' in obj_data:
+                ret = obj_data.get('path')
             else:
-                l = list()
-
-            l.append(tuple([key, objs.get(key)]))
-            sections[obj_isa] = l
+                if obj_isa == 'PBXProject':
+                    ret = "Project object"
+                elif obj_isa[0:3] == 'PBX':
+                    ret = obj_isa[3:-10]
+                else:
+                    ret = 'Build configuration list for PBXNativeTarget "TARGET_NAME"'
 
-            uuids[key] = self.get_comment(key, objs)
+            comments[key] = ret
 
         ro = self.data.get('rootObject')
-        uuids[ro] = 'Project object'
+        comments[ro] = 'Project object'
 
-        for key in objs:
-            obj_isa = objs.get(key).get('isa')
+        for obj in objs.itervalues():
+            obj_data = obj.data
+            obj_isa = obj_data.get('isa')
             if obj_isa == "PBXNativeTarget":
-                obj_data = objs.get(key)
-                uuids[obj_data.get("buildConfigurationList")] = "Build configuration list for PBXNativeTarget \"%s\"" % obj_data.get("name")
+                comments[obj_data.get("buildConfigurationList")] = "Build configuration list for PBXNativeTarget \"%s\"" % obj_data.get("name")
             if obj_isa == "PBXProject":
-                obj_data = objs.get(key)
                 proj_name = os.path.basename(os.path.dirname(self.pbxproj_path))
                 proj_name = os.path.splitext(proj_name)[0]
-                uuids[obj_data.get("buildConfigurationList")] = "Build configuration list for PBXProject \"%s\"" % proj_name
+                comments[obj_data.get("buildConfigurationList")] = "Build configuration list for PBXProject \"%s\"" % proj_name
 
-        self.uuids = uuids
-        self.sections = sections
+        return comments
 
-        out = open(file_name, 'w')
-        out.write('// !$*UTF8*$!\n')
-        self._printNewXCodeFormat(out, self.data, '', enters=True)
-        out.close()
+    def _get_build_file_comment(self, fileRef_info, phase_name=None):
+        if fileRef_info is None:
+            return ""
 
-    @classmethod
-    def addslashes(cls, s):
-        d = {'"': '\\"', "'": "\\'", "\0": "\\\0", "\\": "\\\\", "\n":"\\n"}
-        return ''.join(d.get(c, c) for c in s)
+        if fileRef_info.has_key("name"):
+            fileName = fileRef_info.get("name")
+        elif fileRef_info.has_key("path"):
+            fileName = fileRef_info.get("path")
+        else:
+            return ""
 
-    def _printNewXCodeFormat(self, out, root, deep, enters=True):
-        if isinstance(root, IterableUserDict):
-            out.write('{')
+        if phase_name:
+            return "%s in %s" % (fileName, phase_name)
 
-            if enters:
-                out.write('\n')
+        # the build file isn't in a build phase, it's commented by the file type
+        if fileRef_info.has_key("fileType"):
+            fileType = FILE_TYPE_INFO.get(fileRef_info["fileType"], "PBXResourcesBuildPhase")
+        else:
+            fileType = FILE_TYPE_INFO.get(fileRef_info.get("lastKnownFileType"), "PBXResourcesBuildPhase")
+
+        if fileType == "PBXFrameworksBuildPhase":
+            ret = "%s in %s" % (fileName, "Frameworks")
+        elif fileType == "PBXSourcesBuildPhase":
+            ret = "%s in %s" % (fileName, "Sources")
+        elif fileType == "PBXResourcesBuildPhase":
+            ret = "%s in %s" % (fileName, "Resources")
+        else:
+            ret = "%s" % fileName
 
-            isa = root.pop('isa', '')
+        return ret
 
-            if isa != '':  # keep the isa in the first spot
-                if enters:
-                    out.write('\t' + deep)
+    def save_new_format(self, file_name=None):
+        """Save in Xcode 3.2 compatible (new) format"""
+        if not file_name:
+            file_name = self.pbxproj_path
 
-                out.write('isa = ')
-                self._printNewXCodeFormat(out, isa, '\t' + deep, enters=enters)
-                out.write(';')
+        writer = PBXOpenStepWriter(self.data, self.get_comments())
+        with open(file_name, 'w') as out:
+            writer.write(out)
 
-                if enters:
-                    out.write('\n')
-                else:
-                    out.write(' ')
+    @classmethod
+    def addslashes(cls, s):
+        # the backslashes first, the others add new ones
+        return s.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'") \
+                .replace("\0", "\\\0").replace("\n", "\\n")
 
-            for key in sorted(root.iterkeys()):  # keep the same order as Apple.
-                if enters:
-                    out.write('\t' + deep)
+    @classmethod
+    def Load(cls, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        if content.lstrip().startswith('<?xml'):
+            tree = plistlib.readPlistFromString(content)
+            return XcodeProject(tree, path)
+
+        # the project is parsed to the PBX objects directly
+        try:
+            tree = PBXParser(content).parse()
+        except (PBXParseError, UnicodeError) as e:
+            # the plist is malformed
+            output_msg("%s: %s" % (path, e))
+            return None
 
-                if re.match(regex, key).group(0) == key:
-                    out.write(key.encode("utf-8") + ' = ')
-                else:
-                    out.write('"' + key.encode("utf-8") + '" = ')
-
-                if key == 'objects':
-                    out.write('{')  # open the objects section
-
-                    if enters:
-                        out.write('\n')
-                        #root.remove('objects')  # remove it to avoid problems
-
-                    sections = [
-                        ('PBXBuildFile', False),
-                        ('PBXContainerItemProxy', True),
-                        ('PBXCopyFilesBuildPhase', True),
-                        ('PBXFileReference', False),
-                        ('PBXFrameworksBuildPhase', True),
-                        ('PBXGroup', True),
-                        ('PBXAggregateTarget', True),
-                        ('PBXNativeTarget', True),
-                        ('PBXProject', True),
-                        ('PBXReferenceProxy', True),
-                        ('PBXResourcesBuildPhase', True),
-                        ('PBXShellScriptBuildPhase', True),
-                        ('PBXSourcesBuildPhase', True),
-                        ('PBXTargetDependency', True),
-                        ('PBXVariantGroup', True),
-                        ('XCBuildConfiguration', True),
-                        ('XCConfigurationList', True)]
-
-                    for section in sections:  # iterate over the sections
-                        if self.sections.get(section[0]) is None:
-                            continue
+        return XcodeProject(tree, path)
+    
+    @classmethod    
+    def LoadFromXML(cls, path):
+        tree = plistlib.readPlist(path)
+        return XcodeProject(tree, path)
 
-                        out.write('\n/* Begin %s section */' % section[0].encode("utf-8"))
-                        self.sections.get(section[0]).sort(cmp=lambda x, y: cmp(x[0], y[0]))
 
-                        for pair in self.sections.get(section[0]):
-                            key = pair[0]
-                            value = pair[1]
-                            out.write('\n')
+class PBXOpenStepWriter(object):
+    """
+    Writes the project in the OpenStep format of Xcode 3.2.
+
+    The objects are written section by section like Xcode does: the sections
+    are sorted by the types of the objects, and the objects by their ids,
+    followed by their comments. The formatted strings are cached for a save, and the
+    output is collected in chunks which are written to the file once per
+    object, without changing the project.
+    """
+
+    # the objects of these sections are written in one line
+    SINGLE_LINE_SECTIONS = frozenset([ 'PBXBuildFile', 'PBXFileReference' ])
+
+    UNQUOTED_RE = re.compile(regex + '\\Z')
+
+    # size of the output collected before it's written
+    FLUSH_CHUNKS = 4096
+
+    def __init__(self, data, comments):
+        self.data = data
+        self.comments = comments
+        self._strings = {}
+        self._keys = {}
+        self._chunks = []
+
+        self.sections = {}
+        for key, obj in data.get('objects').iteritems():
+            obj_isa = obj.get('isa')
+            self.sections.setdefault(obj_isa, []).append((key, obj))
+
+    def write(self, out):
+        self._out = out
+        self._chunks = ['// !$*UTF8*$!\n']
+        self._write_value(self.data, '', True)
+        self._chunks.append('\n')
+        self._flush()
+
+    def _flush(self):
+        self._out.write(''.join(self._chunks))
+        del self._chunks[:]
+
+    def _format_key(self, key):
+        ret = self._keys.get(key)
+        if ret is None:
+            if self.UNQUOTED_RE.match(key):
+                ret = key.encode("utf-8") + ' = '
+            else:
+                ret = '"' + key.encode("utf-8") + '" = '
+            self._keys[key] = ret
 
-                            if enters:
-                                out.write('\t\t' + deep)
+        return ret
 
-                            out.write(key.encode("utf-8"))
+    def _format_string(self, value):
+        ret = value.encode("utf-8")
+        if len(value) > 0 and self.UNQUOTED_RE.match(value):
+            if ret.find("-") >= 0:
+                ret = '"' + ret + '"'
+        else:
+            ret = '"' + XcodeProject.addslashes(ret) + '"'
 
-                            if key in self.uuids and len(self.uuids[key]) > 0:
-                                out.write(" /* " + self.uuids[key].encode("utf-8") + " */")
+        comment = self.comments.get(value)
+        if comment:
+            ret += " /* " + comment.encode("utf-8") + " */"
+        self._strings[value] = ret
 
-                            out.write(" = ")
-                            self._printNewXCodeFormat(out, value, '\t\t' + deep, enters=section[1])
-                            out.write(';')
+        return ret
 
-                        out.write('\n/* End %s section */\n' % section[0].encode("utf-8"))
+    def _write_value(self, value, deep, enters):
+        if isinstance(value, basestring):
+            self._chunks.append(self._strings.get(value) or self._format_string(value))
+        elif isinstance(value, IterableUserDict):
+            self._write_dict(value.data, deep, enters)
+        elif isinstance(value, UserList):
+            self._write_list(value.data, deep, enters)
+        else:
+            self._chunks.append(self._format_string(value))
 
-                    out.write(deep + '\t}')  # close of the objects section
-                else:
-                    self._printNewXCodeFormat(out, root[key], '\t' + deep, enters=enters)
+    def _write_dict(self, data, deep, enters):
+        w = self._chunks.append
+        strings = self._strings
+        indent = '\t' + deep
+        end = ';\n' if enters else '; '
 
-                out.write(';')
+        w('{\n' if enters else '{')
 
-                if enters:
-                    out.write('\n')
-                else:
-                    out.write(' ')
+        isa = data.get('isa', '')
+        if isa != '':  # keep the isa in the first spot
+            if enters:
+                w(indent)
+            w('isa = ')
+            self._write_value(isa, indent, enters)
+            w(end)
 
-            root['isa'] = isa  # restore the isa for further calls
+        for key in sorted(data.iterkeys()):  # keep the same order as Apple.
+            if key == 'isa':
+                continue
 
             if enters:
-                out.write(deep)
+                w(indent)
+            w(self._format_key(key))
+
+            value = data[key]
+            if key == 'objects':
+                self._write_objects(deep, enters)
+            elif isinstance(value, basestring):
+                w(strings.get(value) or self._format_string(value))
+            else:
+                self._write_value(value, indent, enters)
+
+            w(end)
 
-            out.write('}')
+        if enters:
+            w(deep)
+        w('}')
 
-        elif isinstance(root, UserList):
-            out.write('(')
+    def _write_list(self, data, deep, enters):
+        w = self._chunks.append
+        strings = self._strings
+        indent = '\t' + deep
+        end = ',\n' if enters else ','
 
+        w('(\n' if enters else '(')
+
+        for value in data:
             if enters:
-                out.write('\n')
+                w(indent)
+            if isinstance(value, basestring):
+                w(strings.get(value) or self._format_string(value))
+            else:
+                self._write_value(value, indent, enters)
+            w(end)
 
-            for value in root:
-                if enters:
-                    out.write('\t' + deep)
+        if enters:
+            w(deep)
+        w(')')
+
+    def _write_objects(self, deep, enters):
+        w = self._chunks.append
+        indent = '\t\t' + deep
+
+        w('{\n' if enters else '{')
 
-                self._printNewXCodeFormat(out, value, '\t' + deep, enters=enters)
-                out.write(',')
+        for section in sorted(self.sections.iterkeys()):
+            if not section:
+                # the objects without a type
+                continue
+
+            objs = self.sections[section]
+            multi_lines = section not in self.SINGLE_LINE_SECTIONS
+            w('\n/* Begin %s section */' % section.encode("utf-8"))
+            objs.sort(key=lambda pair: pair[0])
 
+            for key, value in objs:
+                w('\n')
                 if enters:
-                    out.write('\n')
+                    w(indent)
 
-            if enters:
-                out.write(deep)
+                w(key.encode("utf-8"))
+                comment = self.comments.get(key)
+                if comment:
+                    w(" /* " + comment.encode("utf-8") + " */")
 
-            out.write(')')
+                w(" = ")
+                self._write_value(value, indent, multi_lines)
+                w(';')
 
-        else:
-            if len(root) > 0 and re.match(regex, root).group(0) == root:
-                if root.encode("utf-8").find("-") >= 0:
-                    out.write('"' + root.encode("utf-8") + '"')
-                else:
-                    out.write(root.encode("utf-8"))
-            else:
-                out.write('"' + XcodeProject.addslashes(root.encode("utf-8")) + '"')
+                if len(self._chunks) > self.FLUSH_CHUNKS:
+                    self._flush()
 
-            if root in self.uuids and len(self.uuids[root]) > 0:
-                out.write(" /* " + self.uuids[root].encode("utf-8") + " */")
+            w('\n/* End %s section */\n' % section)
 
-    @classmethod
-    def Load(cls, path):
-        if os_is_mac():
-            cls.plutil_path = 'plutil'
-        elif os_is_win32():
-            if getattr(sys, 'frozen', None):
-                cur_dir = os.path.realpath(os.path.dirname(sys.executable))
-            else:
-                cur_dir = os.path.realpath(os.path.dirname(__file__))
-            cls.plutil_path = os.path.join(cur_dir, "plutil-win32", "plutil.exe")
-            if not os.path.exists(cls.plutil_path):
-                download_cmd_path = os.path.join(cur_dir, os.pardir, os.pardir, os.pardir)
-                subprocess.call("python %s -f -r no" % (os.path.join(download_cmd_path, "download-bin.py")), shell=True, cwd=download_cmd_path)
-        else:
-            output_msg("Can't find 'plutil' to parse the project file.")
-            exit(1)
+        w(deep + '\t}')  # close of the objects section
 
-        # load project by converting to xml and then convert that using plistlib
-        p = subprocess.Popen([XcodeProject.plutil_path, '-convert', 'xml1', '-o', '-', path], stdout=subprocess.PIPE)
-        stdout, stderr = p.communicate()
 
-        # If the plist was malformed, returncode will be non-zero
-        if p.returncode != 0:
-            output_msg(stdout)
-            return None
+class PBXParseError(ValueError):
+    pass
 
-        tree = plistlib.readPlistFromString(stdout)
-        return XcodeProject(tree, path)
-    
-    @classmethod    
-    def LoadFromXML(cls, path):
-        tree = plistlib.readPlist(path)
-        return XcodeProject(tree, path)
+
+class PBXParser(object):
+    """
+    Parses the OpenStep (ASCII) plist format used by project.pbxproj.
+
+    The tokens are scanned one by one from the content, and the values are
+    created as PBXDict/PBXList/PBXType objects directly, so the project is
+    loaded without converting it to XML by `plutil`.
+    The strings are the same as plistlib's: str if they are ASCII, else unicode.
+    """
+
+    # characters of the strings without quotes
+    UNQUOTED_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$+/:.-')
+
+    # each match skips the spaces & comments before one token,
+    # the token is None at the end of the content
+    TOKEN_RE = re.compile(r"""
+        (?:\s+|/\*.*?\*/|//[^\n]*)*
+        (
+            "(?:[^"\\]|\\.)*"
+            |[a-zA-Z0-9_$+/:.-]+
+            |<[0-9a-fA-F\s]*>
+            |\S
+        )?""", re.S | re.X)
+
+    ESCAPE_RE = re.compile(r'\\(U[0-9a-fA-F]{1,4}|[0-7]{1,3}|.)', re.S)
+
+    OCTAL_DIGITS = frozenset('01234567')
+
+    ESCAPE_CHARS = {
+        'a' : '\a',
+        'b' : '\b',
+        'f' : '\f',
+        'n' : '\n',
+        'r' : '\r',
+        't' : '\t',
+        'v' : '\v'
+    }
+
+    def __init__(self, content):
+        # the content is scanned as UTF-8 bytes, only the strings which are
+        # not ASCII are decoded
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        elif content.startswith('\xef\xbb\xbf'):
+            content = content[3:]
+
+        self.content = content
+        self._is_ascii = re.search('[\x80-\xff]', content) is None
+        self._next = None
+        self._classes = {}
+
+    def parse(self):
+        tokens = self._iter_tokens()
+        self._next = tokens.next
+
+        # the parsed objects don't have reference cycles, the garbage collector
+        # doesn't need to scan them again & again while they are created
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            value = self._parse_value(self._next())
+        except StopIteration:
+            raise PBXParseError("unexpected end of the file")
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        for token in tokens:
+            raise PBXParseError("unexpected '%s' after the root object" % token)
+
+        return value
+
+    def _iter_tokens(self):
+        for m in PBXParser.TOKEN_RE.finditer(self.content):
+            token = m.group(1)
+            if token is None:
+                break
+            yield token
+
+    def _parse_value(self, token):
+        c = token[0]
+        if c == '{':
+            return self._parse_dict()
+        elif c == '(':
+            return self._parse_list()
+        elif c == '<' and len(token) > 1:
+            try:
+                return plistlib.Data(binascii.unhexlify(''.join(token[1:-1].split())))
+            except TypeError as e:
+                # odd number of digits
+                raise PBXParseError("invalid data %s: %s" % (token, e))
+        else:
+            return self._parse_string(token)
+
+    def _parse_string(self, token):
+        c = token[0]
+        if c in PBXParser.UNQUOTED_CHARS:
+            return token
+
+        if c != '"' or len(token) < 2:
+            raise PBXParseError("unexpected '%s'" % token)
+
+        value = token[1:-1]
+        if '\\' not in value and self._is_ascii:
+            return value
+
+        try:
+            value = value.decode('utf-8')
+            if '\\' in value:
+                value = PBXParser.ESCAPE_RE.sub(self._unescape, value)
+        except (UnicodeError, ValueError) as e:
+            raise PBXParseError("invalid string %s: %s" % (token, e))
+
+        try:
+            return value.encode('ascii')
+        except UnicodeError:
+            return value
+
+    def _unescape(self, m):
+        s = m.group(1)
+        c = s[0]
+        if c == 'U' and len(s) > 1:
+            return unichr(int(s[1:], 16))
+        elif c in PBXParser.OCTAL_DIGITS:
+            return unichr(int(s, 8))
+        else:
+            return PBXParser.ESCAPE_CHARS.get(c, c)
+
+    def _parse_dict(self):
+        next_token = self._next
+        d = {}
+        token = next_token()
+        while token != '}':
+            key = self._parse_string(token)
+
+            token = next_token()
+            if token != '=':
+                raise PBXParseError("expected '=' but got '%s'" % token)
+
+            d[key] = self._parse_value(next_token())
+
+            token = next_token()
+            if token != ';':
+                raise PBXParseError("expected ';' but got '%s'" % token)
+
+            token = next_token()
+
+        return self._make_dict(d)
+
+    def _make_dict(self, d):
+        # same as PBXType.Convert(), the values are converted already
+        isa = d.get('isa')
+        cls = self._classes.get(isa)
+        if cls is None:
+            cls = PBXDict
+            if isa:
+                found = globals().get(isa)
+                if found and issubclass(found, PBXType):
+                    cls = found
+                else:
+                    output_msg('warning: unknown PBX type: %s' % isa)
+            self._classes[isa] = cls
+
+        obj = cls()
+        obj.data = d
+        return obj
+
+    def _parse_list(self):
+        next_token = self._next
+        l = []
+        token = next_token()
+        while token != ')':
+            l.append(self._parse_value(token))
+            token = next_token()
+            if token == ',':
+                token = next_token()
+            elif token != ')':
+                raise PBXParseError("expected ',' or ')' but got '%s'" % token)
+
+        obj = PBXList()
+        obj.data = l
+        return obj
 
 
 # The code below was adapted from plistlib.py.
@@ -18,6 +18,9 @@ import os
 import json
 import inspect
 import platform
+import hashlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 import cocos
 from MultiLanguage import MultiLanguage
@@ -26,6 +29,18 @@ class CCPluginJSCompile(cocos.CCPlugin):
     """
     compiles (encodes) and minifies JS files
     """
+
+    # the manifest of the generated files, it's saved in the destination directory
+    # unless another path is specified (cocos compile keeps it out of the packaged files)
+    MANIFEST_FILE = ".jscompile-manifest.json"
+    MANIFEST_VERSION = 1
+
+    KEY_MANIFEST_VERSION = "version"
+    KEY_MANIFEST_OPTIONS = "options"
+    KEY_MANIFEST_FILES = "files"
+    KEY_SOURCE_MD5 = "source_md5"
+    KEY_OUTPUT_SIZE = "output_size"
+
     @staticmethod
     def plugin_name():
         return "jscompile"
@@ -49,6 +64,16 @@ class CCPluginJSCompile(cocos.CCPlugin):
         self._config = None
         self._workingdir = workingdir
         self._closure_params = ''
+        self._manifest_path = options.manifest_path
+        if self._manifest_path is None:
+            self._manifest_path = os.path.join(self._dst_dir, CCPluginJSCompile.MANIFEST_FILE)
+        self._jobs = options.jobs
+        if self._jobs is None or self._jobs < 1:
+            try:
+                self._jobs = multiprocessing.cpu_count()
+            except NotImplementedError:
+                self._jobs = 1
+
         if options.compiler_config != None:
             f = open(options.compiler_config)
             self._config = json.load(f)
@@ -67,6 +92,7 @@ class CCPluginJSCompile(cocos.CCPlugin):
             self._closure_params = options.closure_params
 
         self._js_files = {}
+        self._output_files = None
         self._compressed_js_path = os.path.join(self._dst_dir, options.compressed_filename)
         self._compressed_jsc_path = os.path.join(self._dst_dir, options.compressed_filename+"c")
 
@@ -98,13 +124,15 @@ class CCPluginJSCompile(cocos.CCPlugin):
             raise cocos.CCPluginError(MultiLanguage.get_string('LUACOMPILE_ERROR_SRCDIR_NAME_NOT_FOUND'),
                                       cocos.CCPluginError.ERROR_WRONG_ARGS)
 
-    def get_output_file_path(self, jsfile):
+    def get_output_file_path(self, jsfile, relative_path=None):
         """
         Gets output file path by source js file
         """
         # create folder for generated file
         jsc_filepath = ""
-        relative_path = self.get_relative_path(jsfile)+"c"
+        if relative_path is None:
+            relative_path = self.get_relative_path(jsfile)
+        relative_path = relative_path+"c"
         jsc_filepath = os.path.join(self._dst_dir, relative_path)
 
         dst_rootpath = os.path.split(jsc_filepath)[0]
@@ -126,8 +154,13 @@ class CCPluginJSCompile(cocos.CCPlugin):
         """
         cocos.Logging.debug(MultiLanguage.get_string('JSCOMPILE_DEBUG_COMPILE_FILE_FMT', jsfile))
 
-        cmd_str = "\"%s\" \"%s\" \"%s\"" % (self.jsbcc_exe_path, jsfile, output_file)
-        self._run_cmd(cmd_str)
+        commands = [ self.jsbcc_exe_path, jsfile, output_file ]
+        child = subprocess.Popen(commands, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = child.communicate()[0]
+        if child.returncode != 0:
+            raise cocos.CCPluginError(MultiLanguage.get_string('JSCOMPILE_ERROR_COMPILE_FILE_FMT',
+                                                               (jsfile, output.strip())),
+                                      cocos.CCPluginError.ERROR_RUNNING_CMD)
 
     def compress_js(self):
         """
@@ -142,14 +175,51 @@ class CCPluginJSCompile(cocos.CCPlugin):
         command = "java -jar \"%s\" %s --js %s --js_output_file \"%s\"" % (compiler_jar_path, self._closure_params, jsfiles, self._compressed_js_path)
         self._run_cmd(command)
 
-    def deep_iterate_dir(self, rootDir):
+    @staticmethod
+    def deep_iterate_dir(rootDir, js_files):
         for lists in os.listdir(rootDir):
             path = os.path.join(rootDir, lists)
             if os.path.isdir(path):
-                self.deep_iterate_dir(path)
+                CCPluginJSCompile.deep_iterate_dir(path, js_files)
             elif os.path.isfile(path):
                 if os.path.splitext(path)[1] == ".js":
-                    self._js_files[self._current_src_dir].append(path)
+                    js_files.append(path)
+
+    @staticmethod
+    def get_working_dir():
+        # script directory
+        if getattr(sys, 'frozen', None):
+            return os.path.realpath(os.path.dirname(sys.executable))
+        else:
+            return os.path.realpath(os.path.dirname(__file__))
+
+    @staticmethod
+    def find_js_files(src_dirs):
+        """
+        Returns the js files in the source folders: { source folder : [ js files ] }.
+        """
+        js_files = {}
+        for src_dir in src_dirs:
+            src_dir = os.path.normpath(src_dir)
+            js_files[src_dir] = []
+            CCPluginJSCompile.deep_iterate_dir(src_dir, js_files[src_dir])
+
+        return js_files
+
+    def get_output_files(self):
+        """
+        Returns the js files & their paths relative to the destination directory.
+        """
+        if self._output_files is not None:
+            return self._output_files
+
+        output_files = []
+        for src_dir in self._src_dir_arr:
+            self._current_src_dir = src_dir
+            for jsfile in self._js_files[src_dir]:
+                output_files.append((jsfile, self.get_relative_path(jsfile)))
+
+        return output_files
 
 
     def index_in_list(self, jsfile, l):
@@ -159,69 +229,206 @@ class CCPluginJSCompile(cocos.CCPlugin):
         - `jsfile`:
         - `l`:
         """
-        index = -1
-
-        for el in l:
-            if jsfile.rfind(el) != -1:
-                # print "index:"+str(index+1)+", el:"+el
-                return index+1
-            index = index + 1
+        for index, el in enumerate(l):
+            if el in jsfile:
+                return index
         return -1
 
-    def js_filename_pre_order_compare(self, a, b):
-        return self._js_filename_compare(a, b, self._pre_order, 1)
-
-    def js_filename_post_order_compare(self, a, b):
-        return self._js_filename_compare(a, b, self._post_order, -1)
-
-    def _js_filename_compare(self, a, b, files, delta):
-        index_a = self.index_in_list(a, files)
-        index_b = self.index_in_list(b, files)
-        is_a_in_list = index_a != -1
-        is_b_in_list = index_b != -1
-
-        if is_a_in_list and not is_b_in_list:
-            return -1 * delta
-        elif not is_a_in_list and is_b_in_list:
-            return 1 * delta
-        elif is_a_in_list and is_b_in_list:
-            if index_a > index_b:
-                return 1
-            elif index_a < index_b:
-                return -1
-            else:
-                return 0
-        else:
-            return 0
+    def get_order_key(self, jsfile):
+        """
+        Returns the sort key of a js file, same as sorting by the pre order
+        and then by the post order:
+        files in the post order list are placed at the end,
+        files in the pre order list are placed at the beginning,
+        other files keep their original order.
+        """
+        pre_index = self.index_in_list(jsfile, self._pre_order)
+        post_index = self.index_in_list(jsfile, self._post_order)
+        post_key = (1, post_index) if post_index != -1 else (0, 0)
+        pre_key = (0, pre_index) if pre_index != -1 else (1, 0)
+        return post_key, pre_key
 
     def reorder_js_files(self):
         if self._config == None:
             return
 
-        # print "before:"+str(self._js_files)
-
         for src_dir in self._js_files:
             # Remove file in exclude list
-            need_remove_arr = []
-            for jsfile in self._js_files[src_dir]:
-                for exclude_file in self._skip:
-                    if jsfile.rfind(exclude_file) != -1:
-                        # print "remove:" + jsfile
-                        need_remove_arr.append(jsfile)
+            js_files = [ f for f in self._js_files[src_dir] if self.index_in_list(f, self._skip) == -1 ]
+
+            # the key of each file is computed only once, the sort is stable
+            js_files.sort(key=self.get_order_key)
+            self._js_files[src_dir] = js_files
+
+    @staticmethod
+    def get_file_md5(file_path):
+        md5 = hashlib.md5()
+        f = open(file_path, "rb")
+        try:
+            while True:
+                data = f.read(65536)
+                if not data:
+                    break
+                md5.update(data)
+        finally:
+            f.close()
+
+        return md5.hexdigest()
+
+    def get_build_options(self):
+        """
+        The options which affect the generated files.
+        The files in the manifest are reused only if they are generated with the same options.
+        """
+        return {
+            "jsbcc_md5" : self.get_file_md5(self.jsbcc_exe_path)
+        }
+
+    def get_manifest_path(self):
+        return self._manifest_path
+
+    def load_manifest(self):
+        manifest_path = self.get_manifest_path()
+        if not os.path.isfile(manifest_path):
+            return None
+
+        try:
+            f = open(manifest_path)
+            manifest = json.load(f)
+            f.close()
+        except (IOError, ValueError):
+            return None
+
+        if manifest.get(CCPluginJSCompile.KEY_MANIFEST_VERSION) != CCPluginJSCompile.MANIFEST_VERSION:
+            return None
+
+        return manifest
+
+    def save_manifest(self, options, files):
+        manifest = {
+            CCPluginJSCompile.KEY_MANIFEST_VERSION : CCPluginJSCompile.MANIFEST_VERSION,
+            CCPluginJSCompile.KEY_MANIFEST_OPTIONS : options,
+            CCPluginJSCompile.KEY_MANIFEST_FILES : files
+        }
+
+        manifest_dir = os.path.dirname(self.get_manifest_path())
+        if manifest_dir and not os.path.isdir(manifest_dir):
+            os.makedirs(manifest_dir)
+
+        f = open(self.get_manifest_path(), "w")
+        json.dump(manifest, f, sort_keys=True, indent=1)
+        f.close()
+
+    def get_manifest_key(self, jsc_file):
+        key = os.path.relpath(jsc_file, self._dst_dir).replace(os.sep, "/")
+        if not isinstance(key, unicode):
+            key = key.decode(sys.getfilesystemencoding() or "utf-8")
+
+        return key
+
+    def handle_js_file(self, task):
+        """
+        Compiles one js file. It's called by the worker threads.
+        Returns (error message, manifest info of the file, is skipped).
+        """
+        jsfile, jsc_file, cached_info = task
+        try:
+            source_md5 = self.get_file_md5(jsfile)
+            if cached_info is not None and cached_info.get(CCPluginJSCompile.KEY_SOURCE_MD5) == source_md5:
+                # the source is not changed, reuse the output if it's not modified
+                if os.path.isfile(jsc_file) and \
+                        os.path.getsize(jsc_file) == cached_info.get(CCPluginJSCompile.KEY_OUTPUT_SIZE):
+                    return None, cached_info, True
+
+            self.compile_js(jsfile, jsc_file)
 
-            for need_remove in need_remove_arr:
-                self._js_files[src_dir].remove(need_remove)
+            info = {
+                CCPluginJSCompile.KEY_SOURCE_MD5 : source_md5,
+                CCPluginJSCompile.KEY_OUTPUT_SIZE : os.path.getsize(jsc_file)
+            }
+        except (cocos.CCPluginError, IOError, OSError) as e:
+            return str(e), None, False
 
-            self._js_files[src_dir].sort(cmp=self.js_filename_pre_order_compare)
-            self._js_files[src_dir].sort(cmp=self.js_filename_post_order_compare)
+        return None, info, False
 
-        # print '-------------------'
-        # print "after:" + str(self._js_files)
+    def compile_all_js_files(self):
+        """
+        Compiles the js files to bytecode by the worker threads.
+        The files which are not changed since last time are skipped.
+        Returns the failed files: { js file : error message }.
+        """
+        # get the files generated last time
+        options = self.get_build_options()
+        manifest = self.load_manifest()
+        if manifest is None:
+            old_files = {}
+            cached_files = {}
+        else:
+            old_files = manifest.get(CCPluginJSCompile.KEY_MANIFEST_FILES, {})
+            if manifest.get(CCPluginJSCompile.KEY_MANIFEST_OPTIONS) == options:
+                cached_files = old_files
+            else:
+                # jsbcc is changed, all the files should be compiled again
+                cached_files = {}
+
+        # the output paths are generated before the files are handled by the workers
+        tasks = []
+        keys = {}
+        for jsfile, relative_path in self.get_output_files():
+            jsc_file = self.get_output_file_path(jsfile, relative_path)
+            key = self.get_manifest_key(jsc_file)
+            keys[jsc_file] = key
+            tasks.append((jsfile, jsc_file, cached_files.get(key)))
+
+        # remove the files generated from the deleted sources
+        dst_dir = os.path.abspath(self._dst_dir)
+        cur_keys = set(keys.values())
+        for key in old_files:
+            if key not in cur_keys:
+                old_file = os.path.normpath(os.path.join(dst_dir, key))
+                if old_file.startswith(dst_dir + os.sep) and os.path.isfile(old_file):
+                    os.remove(old_file)
+
+        new_files = {}
+        failed_files = {}
+        skipped_count = 0
+        if len(tasks) > 0:
+            # the failed files are reported one by one, the others are still compiled
+            pool = ThreadPool(min(self._jobs, len(tasks)))
+            try:
+                results = pool.imap(self.handle_js_file, tasks)
+                for task, (error, info, skipped) in zip(tasks, results):
+                    if error is not None:
+                        failed_files[task[0]] = error
+                        cocos.Logging.error(error)
+                    else:
+                        new_files[keys[task[1]]] = info
+                        if skipped:
+                            skipped_count += 1
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+
+        # the failed files are not saved, so they will be compiled again next time
+        self.save_manifest(options, new_files)
+
+        if skipped_count > 0:
+            cocos.Logging.info(MultiLanguage.get_string('JSCOMPILE_INFO_SKIPPED_FMT', skipped_count))
+
+        return failed_files
+
+    @staticmethod
+    def check_failed_files(failed_files):
+        if len(failed_files) > 0:
+            raise cocos.CCPluginError(MultiLanguage.get_string('JSCOMPILE_ERROR_FILES_FAILED_FMT', len(failed_files)),
+                                      cocos.CCPluginError.ERROR_RUNNING_CMD)
 
     def handle_all_js_files(self):
         """
-        Arguments:
-        - `self`:
+        Returns the failed files: { js file : error message }.
         """
         if self._use_closure_compiler == True:
             cocos.Logging.info(MultiLanguage.get_string('JSCOMPILE_INFO_COMPRESS_TIP'))
@@ -229,19 +436,12 @@ class CCPluginJSCompile(cocos.CCPlugin):
             self.compile_js(self._compressed_js_path, self._compressed_jsc_path)
             # remove tmp compressed file
             os.remove(self._compressed_js_path)
+            return {}
         else:
             cocos.Logging.info(MultiLanguage.get_string('JSCOMPILE_INFO_COMPILE_TO_BYTECODE'))
-            for src_dir in self._src_dir_arr:
-                for jsfile in self._js_files[src_dir]:
-                    self._current_src_dir = src_dir
-                    self.compile_js(jsfile, self.get_output_file_path(jsfile))
-
-    # will be called from the cocos.py script
-    def run(self, argv, dependencies):
-        """
-        """
-        self.parse_args(argv)
+            return self.compile_all_js_files()
 
+    def compile_all(self, js_files):
         # create output directory
         try:
             os.makedirs(self._dst_dir)
@@ -256,14 +456,40 @@ class CCPluginJSCompile(cocos.CCPlugin):
             subprocess.call("python %s -f -r no" % (os.path.join(download_cmd_path, "download-bin.py")), shell=True, cwd=download_cmd_path)
 
         # deep iterate the src directory
-        for src_dir in self._src_dir_arr:
-            self._current_src_dir = src_dir
-            self._js_files[self._current_src_dir] = []
-            self.deep_iterate_dir(src_dir)
+        if js_files is None:
+            js_files = self.find_js_files(self._src_dir_arr)
+        self._js_files = js_files
 
         self.reorder_js_files()
-        self.handle_all_js_files()
+        failed_files = self.handle_all_js_files()
         cocos.Logging.info(MultiLanguage.get_string('LUACOMPILE_INFO_FINISHED'))
+        return failed_files
+
+    def compile_files(self, src_dirs, dst_dir, js_files=None, jobs=None, output_files=None, manifest_path=None):
+        """
+        Does what `cocos jscompile` does in the process of the caller.
+        `js_files` is the result of find_js_files(src_dirs), the folders are scanned if it's None.
+        `output_files` is [ (js file, path relative to dst_dir) ], the files are compiled
+        instead of the ones in src_dirs, so they can be anywhere.
+        The manifest is saved in `manifest_path` if it's not None, in dst_dir otherwise.
+        Returns the failed files: { js file : error message }.
+        """
+        from argparse import Namespace
+
+        options = Namespace(src_dir_arr=list(src_dirs), dst_dir=dst_dir, verbose=False,
+                            use_closure_compiler=False, compressed_filename="game.min.js",
+                            compiler_config=None, closure_params=None, jobs=jobs,
+                            manifest_path=manifest_path)
+        self.init(options, self.get_working_dir())
+        self._output_files = output_files
+        return self.compile_all(js_files)
+
+    # will be called from the cocos.py script
+    def run(self, argv, dependencies):
+        """
+        """
+        self.parse_args(argv)
+        self.check_failed_files(self.compile_all(None))
 
     def parse_args(self, argv):
         """
@@ -298,6 +524,13 @@ class CCPluginJSCompile(cocos.CCPlugin):
         parser.add_argument("-m", "--closure_params",
                           action="store", dest="closure_params",
                           help=MultiLanguage.get_string('JSCOMPILE_ARG_EXTRA_PARAM'))
+        # '-j' is used by the compiler config
+        parser.add_argument("--jobs",
+                          dest="jobs", type=int,
+                          help=MultiLanguage.get_string('JSCOMPILE_ARG_JOBS'))
+        parser.add_argument("--manifest",
+                          dest="manifest_path",
+                          help=MultiLanguage.get_string('JSCOMPILE_ARG_MANIFEST'))
 
         options = parser.parse_args(argv)
 
@@ -315,11 +548,5 @@ class CCPluginJSCompile(cocos.CCPlugin):
                                               cocos.CCPluginError.ERROR_PATH_NOT_FOUND)
 
 
-        # script directory
-        if getattr(sys, 'frozen', None):
-            workingdir = os.path.realpath(os.path.dirname(sys.executable))
-        else:
-            workingdir = os.path.realpath(os.path.dirname(__file__))
-
-        self.init(options, workingdir)
+        self.init(options, self.get_working_dir())
 
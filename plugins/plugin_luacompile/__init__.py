@@ -18,7 +18,13 @@ import subprocess
 import os
 import json
 import inspect
-import shutil
+import hashlib
+import tempfile
+import threading
+import binascii
+import multiprocessing
+from itertools import cycle, islice, izip, izip_longest
+from multiprocessing.pool import ThreadPool
 
 import cocos
 from MultiLanguage import MultiLanguage
@@ -92,12 +98,339 @@ def decrypt(str, key):
     return _long2str(v, True)  
 
 
+############################################################
+# faster encryption backends, they must generate the same bytes as encrypt()
+############################################################
+
+try:
+    import xxtea as _xxtea
+except ImportError:
+    _xxtea = None
+
+def _encrypt_py(str, key):
+    # Same rounds as encrypt(). In one round v[p + 1] is still the value of the
+    # previous round, so the words are read from the old list and the key
+    # indexes (p & 3 ^ e) are cycled instead of computed for each word.
+    if str == '': return str
+    v = _str2long(str, True)
+    k = _str2long(key.ljust(16, "\0"), False)
+    n = len(v) - 1
+    z = v[n]
+    sum = 0
+    for q in xrange(6 + 52 // (n + 1)):
+        sum = (sum + _DELTA) & 0xffffffff
+        e = sum >> 2 & 3
+        ke = (k[e], k[1 ^ e], k[2 ^ e], k[3 ^ e])
+        w = []
+        append = w.append
+        for kp, x, y in izip(cycle(ke), v, islice(v, 1, None)):
+            z = (x + ((z >> 5 ^ y << 2) + (y >> 3 ^ z << 4) ^ (sum ^ y) + (kp ^ z))) & 0xffffffff
+            append(z)
+        y = w[0]
+        z = (v[n] + ((z >> 5 ^ y << 2) + (y >> 3 ^ z << 4) ^ (sum ^ y) + (ke[n & 3] ^ z))) & 0xffffffff
+        append(z)
+        v = w
+    return _long2str(v, False)
+
+def _encrypt_ext(str, key):
+    # the `xxtea` extension pads with PKCS#7, so the data is padded with zeros
+    # & the length word is appended here as _str2long() does
+    if str == '': return str
+    n = len(str)
+    m = (4 - (n & 3) & 3) + n
+    data = str.ljust(m, "\0") + struct.pack('<L', n)
+    return _xxtea.encrypt(data, key.ljust(16, "\0")[:16], padding=False)
+
+def _select_encrypt():
+    # use the C extension only if it generates the same bytes as encrypt()
+    samples = [ ('a', '2dxLua'), ('abcde', 'key'), ('\0\xff' * 37, '0123456789abcdef') ]
+    if _xxtea is not None:
+        try:
+            if all(_encrypt_ext(s, k) == encrypt(s, k) for s, k in samples):
+                return _encrypt_ext
+        except Exception:
+            pass
+
+    return _encrypt_py
+
+fast_encrypt = _select_encrypt()
+
+# The batched encryption packs the same word of many blobs into one int, a
+# blob in each 40 bits lane. The XXTEA operations of a word don't carry out
+# of its lane (the sums are below 2 ** 38), except the right shifts which are
+# masked, so one operation on the ints does a step of all the blobs.
+_LANE_BYTES = 5
+_BATCH_MIN_LANES = 8
+_BATCH_MAX_WORDS = 4 << 20
+
+def _lanes(count, value):
+    # value in each of the lanes 0 .. count - 1
+    return int(('%010x' % value) * count, 16) if count > 0 else 0
+
+def _encrypt_lanes(strs, k):
+    # strs: the blobs, longest first, they have the same rounds count. They are encrypted as
+    # encrypt() does, the word t of the blob i is in the lane i of columns[t].
+    count = len(strs)
+    lengths = [ (len(s) + 3 >> 2) + 1 for s in strs ]
+    width = lengths[0]
+    stride = count * _LANE_BYTES
+
+    # the words in lanes: the bytes of a column are the lanes, lowest first
+    matrix = bytearray(width * stride)
+    for i, s in enumerate(strs):
+        n = lengths[i] << 2
+        words = s.ljust(n - 4, "\0") + struct.pack('<L', len(s))
+        for j in xrange(4):
+            matrix[i * _LANE_BYTES + j:n // 4 * stride:stride] = words[j::4]
+    columns = [ int(binascii.hexlify(str(matrix[t * stride:(t + 1) * stride][::-1])), 16)
+                for t in xrange(width) ]
+    columns.append(0)
+    del matrix
+
+    # the lanes which have the word t, it's a prefix of the lanes as the blobs are sorted
+    active_counts = []
+    a = count
+    for t in xrange(width):
+        while lengths[a - 1] <= t:
+            a -= 1
+        active_counts.append(a)
+    active_counts.append(0)
+
+    masks = {}
+    for a in set(active_counts):
+        masks[a] = _lanes(a, 0xffffffff)
+    # the lanes of which the word t is the last one
+    last_masks = [ masks[active_counts[t]] ^ masks[active_counts[t + 1]] for t in xrange(width) ]
+
+    z_last = 0
+    for t in xrange(width):
+        if last_masks[t]:
+            z_last |= columns[t] & last_masks[t]
+
+    sum = 0
+    for q in xrange(6 + 52 // width):
+        sum = (sum + _DELTA) & 0xffffffff
+        e = sum >> 2 & 3
+        # (the mask, sum, the key words) in the active lanes
+        consts = {}
+        for a in masks:
+            consts[a] = (masks[a], _lanes(a, sum), [ _lanes(a, k[i ^ e]) for i in xrange(4) ])
+        z = z_last
+        z_last = 0
+        w = []
+        append = w.append
+        for t in xrange(width):
+            mask, s, ke = consts[active_counts[t]]
+            y = columns[t + 1]
+            last_mask = last_masks[t]
+            if last_mask:
+                # the last word of these lanes is followed by their new first word
+                y |= w[0] & last_mask
+            z = (columns[t] + (((z >> 5 & mask ^ y << 2) + (y >> 3 & mask ^ z << 4)) ^
+                               ((s ^ y) + (ke[t & 3] ^ z)))) & mask
+            append(z)
+            if last_mask:
+                z_last |= z & last_mask
+        w.append(0)
+        columns = w
+
+    matrix = bytearray(''.join(binascii.unhexlify('%0*x' % (stride * 2, columns[t]))[::-1]
+                               for t in xrange(width)))
+    columns = None
+    results = []
+    for i in xrange(count):
+        n = lengths[i] << 2
+        data = bytearray(n)
+        for j in xrange(4):
+            data[j::4] = matrix[i * _LANE_BYTES + j:n // 4 * stride:stride]
+        results.append(str(data))
+    return results
+
+def _encrypt_batch_py(strs, key):
+    # the strings of close sizes are encrypted together by _encrypt_lanes()
+    k = _str2long(key.ljust(16, "\0"), False)
+    results = list(strs)
+    # the longest first, a batch takes the next blobs of close sizes & of the same rounds count
+    order = sorted((i for i in xrange(len(strs)) if strs[i] != ''), key=lambda i: -len(strs[i]))
+    start = 0
+    while start < len(order):
+        width = (len(strs[order[start]]) + 3 >> 2) + 1
+        end = start + 1
+        while end < len(order) and (end - start + 1) * width <= _BATCH_MAX_WORDS:
+            n = (len(strs[order[end]]) + 3 >> 2) + 1
+            if n * 2 < width or 52 // n != 52 // width:
+                break
+            end += 1
+
+        if end - start < _BATCH_MIN_LANES:
+            # a step of few lanes is slower than the words one by one
+            results[order[start]] = _encrypt_py(strs[order[start]], key)
+            start += 1
+            continue
+
+        batch = order[start:end]
+        for i, data in izip(batch, _encrypt_lanes([ strs[i] for i in batch ], k)):
+            results[i] = data
+        start = end
+
+    return results
+
+def encrypt_batch(strs, key):
+    """
+    Encrypts the strings by the key, returns the same list as [ encrypt(s, key) for s in strs ].
+    """
+    if fast_encrypt is _encrypt_py:
+        return _encrypt_batch_py(strs, key)
+    return [ fast_encrypt(s, key) for s in strs ]
+
+
+class LuaJITWorker(object):
+    """
+    A luajit process running bin/compile_worker.lua, it compiles the lua files sent to it
+    one by one, so a process is not started for each file.
+    """
+
+    DRIVER_FILE = "compile_worker.lua"
+
+    def __init__(self, luajit_path, driver_path):
+        # luajit loads the jit modules from its own folder
+        self._process = subprocess.Popen([ luajit_path, driver_path ], cwd=os.path.dirname(luajit_path),
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT)
+
+    @staticmethod
+    def can_send(path):
+        # the paths are sent in lines
+        return "\n" not in path and "\r" not in path
+
+    def compile(self, lua_file):
+        """
+        Returns (the bytecode, None) or (None, the error message of luajit).
+        Raises IOError if the process is broken.
+        """
+        if isinstance(lua_file, unicode):
+            lua_file = lua_file.encode(sys.getfilesystemencoding() or "utf-8")
+        try:
+            self._process.stdin.write("%s\n" % lua_file)
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+            if line.startswith("ok "):
+                size = int(line[len("ok "):])
+                data = self._process.stdout.read(size)
+                if len(data) == size:
+                    return data, None
+        except ValueError:
+            # the pipes are closed or the size is broken
+            line = ""
+
+        line = line.rstrip("\r\n")
+        if line.startswith("error\t"):
+            return None, line[len("error\t"):]
+
+        raise IOError("luajit worker stopped: %s" % (line or self._process.poll()))
+
+    def close(self):
+        try:
+            self._process.stdin.close()
+        except IOError:
+            pass
+        if self._process.poll() is None:
+            self._process.wait()
+
+
+class LuaPack(object):
+    """
+    Reads & writes the file which packs the outputs of luacompile. It's little-endian:
+
+        "CCLUAPK1", the number of files (uint32)
+        the index, for each file: the length of the path (uint16), the path in utf-8
+            (relative to the destination directory, separated by "/"),
+            the offset of the data from the start of the file (uint32), the size (uint32)
+        the data of the files
+    """
+
+    MAGIC = "CCLUAPK1"
+
+    @staticmethod
+    def read_index(path):
+        """
+        Returns { path : (offset, size) }, None if it's not a pack file.
+        """
+        try:
+            f = open(path, "rb")
+        except IOError:
+            return None
+
+        try:
+            header = f.read(len(LuaPack.MAGIC) + 4)
+            if len(header) != len(LuaPack.MAGIC) + 4 or not header.startswith(LuaPack.MAGIC):
+                return None
+
+            index = {}
+            count = struct.unpack("<I", header[len(LuaPack.MAGIC):])[0]
+            for i in xrange(count):
+                length = struct.unpack("<H", f.read(2))[0]
+                name = f.read(length).decode("utf-8")
+                index[name] = struct.unpack("<II", f.read(8))
+            return index
+        except (struct.error, UnicodeDecodeError):
+            return None
+        finally:
+            f.close()
+
+    @staticmethod
+    def write(path, files):
+        """
+        Writes the files [ (path, data) ] in the order of them.
+        """
+        names = [ name.encode("utf-8") for name, data in files ]
+        offset = len(LuaPack.MAGIC) + 4 + sum([ 2 + len(name) + 8 for name in names ])
+        parts = [ LuaPack.MAGIC, struct.pack("<I", len(files)) ]
+        for name, (_, data) in zip(names, files):
+            parts.append(struct.pack("<H", len(name)) + name + struct.pack("<II", offset, len(data)))
+            offset += len(data)
+        parts.extend([ data for name, data in files ])
+        write_file(path, "".join(parts))
+
+
+def write_file(path, data):
+    # the file is replaced at once, a half written file is never left
+    tmp_path = "%s.tmp" % path
+    f = open(tmp_path, "wb")
+    try:
+        f.write(data)
+    finally:
+        f.close()
+
+    # rename() can't replace a file on Windows
+    if cocos.os_is_win32() and os.path.isfile(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
 
 #import cocos
 class CCPluginLuaCompile(cocos.CCPlugin):
     """
     compiles (encodes) and minifies Lua files
     """
+
+    # the manifest of the generated files, it's saved in the destination directory
+    # unless another path is specified (cocos compile keeps it out of the packaged files)
+    MANIFEST_FILE = ".luacompile-manifest.json"
+    MANIFEST_VERSION = 1
+
+    KEY_MANIFEST_VERSION = "version"
+    KEY_MANIFEST_OPTIONS = "options"
+    KEY_MANIFEST_FILES = "files"
+    KEY_SOURCE_MD5 = "source_md5"
+    KEY_OUTPUT_SIZE = "output_size"
+
+    DEFAULT_ENCRYPT_KEY = "2dxLua"
+    DEFAULT_ENCRYPT_SIGN = "XXTEA"
+    # the outputs are encrypted together when their size reaches it
+    ENCRYPT_BATCH_SIZE = 16 * 1024 * 1024
+
     @staticmethod
     def plugin_name():
         return "luacompile"
@@ -121,10 +454,22 @@ class CCPluginLuaCompile(cocos.CCPlugin):
         self._verbose = options.verbose
         self._workingdir = workingdir
         self._lua_files = {}
+        self._output_files = None
         self._isEncrypt = options.encrypt
         self._encryptkey = options.encryptkey
         self._encryptsign = options.encryptsign
         self._bytecode_64bit = options.bytecode_64bit
+        self._pack_file = options.pack_file
+        self._manifest_path = options.manifest_path
+        if self._manifest_path is None:
+            self._manifest_path = os.path.join(self._dst_dir, CCPluginLuaCompile.MANIFEST_FILE)
+        self._old_pack_index = {}
+        self._jobs = options.jobs
+        if self._jobs is None or self._jobs < 1:
+            try:
+                self._jobs = multiprocessing.cpu_count()
+            except NotImplementedError:
+                self._jobs = 1
 
         self._luajit_exe_path = self.get_luajit_path()
         self._disable_compile = options.disable_compile
@@ -135,6 +480,10 @@ class CCPluginLuaCompile(cocos.CCPlugin):
 
         self._luajit_dir = os.path.dirname(self._luajit_exe_path)
 
+        # the idle luajit workers, a worker thread takes one at a time
+        self._workers = []
+        self._workers_lock = threading.Lock()
+
     def normalize_path_in_list(self, list):
         for i in list:
             tmp = os.path.normpath(i)
@@ -155,15 +504,20 @@ class CCPluginLuaCompile(cocos.CCPlugin):
             raise cocos.CCPluginError(MultiLanguage.get_string('LUACOMPILE_ERROR_SRCDIR_NAME_NOT_FOUND'),
                                       cocos.CCPluginError.ERROR_WRONG_ARGS)
 
-    def get_output_file_path(self, luafile):
+    def get_output_file_path(self, luafile, relative_path=None):
         """
         Gets output file path by source lua file
         """
         # create folder for generated file
         luac_filepath = ""
+        if relative_path is None:
+            relative_path = self.get_relative_path(luafile)
         # Unknow to remove 'c' 
-        relative_path = self.get_relative_path(luafile)+"c"
+        relative_path = relative_path+"c"
         luac_filepath = os.path.join(self._dst_dir, relative_path)
+        if self._pack_file is not None:
+            # the output is packed, no folder is needed
+            return luac_filepath
 
         dst_rootpath = os.path.split(luac_filepath)[0]
         try:
@@ -193,26 +547,147 @@ class CCPluginLuaCompile(cocos.CCPlugin):
         print("luajit bin path: " + ret)
         return ret
 
-    def compile_lua(self, lua_file, output_file):
+    def compile_lua(self, lua_file):
         """
-        Compiles lua file
+        Compiles lua file, returns the bytecode
         """
         cocos.Logging.debug(MultiLanguage.get_string('LUACOMPILE_DEBUG_COMPILE_FILE_FMT', lua_file))
 
-        with cocos.pushd(self._luajit_dir):
-            cmd_str = "\"%s\" -b \"%s\" \"%s\"" % (self._luajit_exe_path, lua_file, output_file)
-            self._run_cmd(cmd_str)
+        worker = None
+        if LuaJITWorker.can_send(lua_file):
+            worker = self.get_worker()
+
+        if worker is not None:
+            try:
+                data, error = worker.compile(lua_file)
+                self.release_worker(worker)
+            except IOError:
+                # the file is compiled by a new process, the next file by a new worker
+                worker.close()
+                worker = None
+
+        if worker is None:
+            data, error = self.compile_lua_by_process(lua_file)
+
+        if error is not None:
+            raise cocos.CCPluginError(MultiLanguage.get_string('LUACOMPILE_ERROR_COMPILE_FILE_FMT',
+                                                               (lua_file, error)),
+                                      cocos.CCPluginError.ERROR_RUNNING_CMD)
+
+        return data
+
+    def compile_lua_by_process(self, lua_file):
+        """
+        Compiles lua file by `luajit -b` into a temporary file.
+        Returns (the bytecode, None) or (None, the error message).
+        """
+        # luajit writes the bytecode into a raw file for the extension ".tmp"
+        fd, tmp_file = tempfile.mkstemp(".tmp")
+        os.close(fd)
+        commands = [ self._luajit_exe_path, "-b", lua_file, tmp_file ]
+        # luajit loads the jit modules from its own folder
+        child = subprocess.Popen(commands, cwd=self._luajit_dir,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = child.communicate()[0]
+        try:
+            if child.returncode != 0:
+                return None, output.strip()
+
+            f = open(tmp_file, "rb")
+            try:
+                return f.read(), None
+            finally:
+                f.close()
+        finally:
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+
+    def get_worker(self):
+        """
+        Returns an idle luajit worker or starts one, None if it can't be started.
+        """
+        self._workers_lock.acquire()
+        try:
+            if len(self._workers) > 0:
+                return self._workers.pop()
+        finally:
+            self._workers_lock.release()
+
+        driver_path = os.path.join(self._workingdir, "bin", LuaJITWorker.DRIVER_FILE)
+        if not os.path.isfile(driver_path):
+            return None
+
+        try:
+            return LuaJITWorker(self._luajit_exe_path, driver_path)
+        except OSError:
+            return None
+
+    def release_worker(self, worker):
+        self._workers_lock.acquire()
+        try:
+            self._workers.append(worker)
+        finally:
+            self._workers_lock.release()
+
+    def close_workers(self):
+        self._workers_lock.acquire()
+        try:
+            workers = self._workers
+            self._workers = []
+        finally:
+            self._workers_lock.release()
+
+        for worker in workers:
+            worker.close()
 
     # TODO
     # def compress_js(self):
-    def deep_iterate_dir(self, rootDir):
+    @staticmethod
+    def deep_iterate_dir(rootDir, lua_files):
         for lists in os.listdir(rootDir):
             path = os.path.join(rootDir, lists)
             if os.path.isdir(path):
-                self.deep_iterate_dir(path)
+                CCPluginLuaCompile.deep_iterate_dir(path, lua_files)
             elif os.path.isfile(path):
                 if os.path.splitext(path)[1] == ".lua":
-                    self._lua_files[self._current_src_dir].append(path)
+                    lua_files.append(path)
+
+    @staticmethod
+    def get_working_dir():
+        # script directory
+        if getattr(sys, 'frozen', None):
+            return os.path.realpath(os.path.dirname(sys.executable))
+        else:
+            return os.path.realpath(os.path.dirname(__file__))
+
+    @staticmethod
+    def find_lua_files(src_dirs):
+        """
+        Returns the lua files in the source folders: { source folder : [ lua files ] }.
+        It can be passed to compile_files() several times, so the folders are scanned once.
+        """
+        lua_files = {}
+        for src_dir in src_dirs:
+            src_dir = os.path.abspath(os.path.normpath(src_dir))
+            lua_files[src_dir] = []
+            CCPluginLuaCompile.deep_iterate_dir(src_dir, lua_files[src_dir])
+
+        return lua_files
+
+    def get_output_files(self):
+        """
+        Returns the lua files & their paths relative to the destination directory.
+        """
+        if self._output_files is not None:
+            return self._output_files
+
+        output_files = []
+        for src_dir in self._src_dir_arr:
+            self._current_src_dir = src_dir
+            for lua_file in self._lua_files[src_dir]:
+                output_files.append((lua_file, self.get_relative_path(lua_file)))
+
+        return output_files
 
     # UNDO
     # def index_in_list(self, lua_file, l):
@@ -221,39 +696,282 @@ class CCPluginLuaCompile(cocos.CCPlugin):
     # def _lua_filename_compare(self, a, b, files, delta):
     # def reorder_lua_files(self):
 
-    def handle_all_lua_files(self):
+    @staticmethod
+    def get_file_md5(file_path):
+        md5 = hashlib.md5()
+        f = open(file_path, "rb")
+        try:
+            while True:
+                data = f.read(65536)
+                if not data:
+                    break
+                md5.update(data)
+        finally:
+            f.close()
+
+        return md5.hexdigest()
+
+    def get_build_options(self):
         """
-        Arguments:
-        - `self`:
+        The options which affect the generated files.
+        The files in the manifest are reused only if they are generated with the same options.
         """
+        options = {
+            "disable_compile" : self._disable_compile,
+            "bytecode_64bit" : self._bytecode_64bit,
+            "encrypt" : self._isEncrypt
+        }
 
-        cocos.Logging.info(MultiLanguage.get_string('LUACOMPILE_INFO_PROCESS_FILE'))
-        index = 0
-        for src_dir in self._src_dir_arr:
-            for lua_file in self._lua_files[src_dir]:
-                self._current_src_dir = src_dir
-                dst_lua_file = self.get_output_file_path(lua_file)
-                if self._disable_compile:
-                    shutil.copy(lua_file, dst_lua_file)
-                else:
-                    self.compile_lua(lua_file, dst_lua_file)                   
+        if self._isEncrypt:
+            # don't save the key & sign in plain text
+            options["encrypt_md5"] = hashlib.md5("%s\0%s" % (self._encryptkey, self._encryptsign)).hexdigest()
 
-                if self._isEncrypt == True:
-                    bytesFile = open(dst_lua_file, "rb+")
-                    encryBytes = encrypt(bytesFile.read(), self._encryptkey)
-                    encryBytes = self._encryptsign + encryBytes
-                    bytesFile.seek(0)
-                    bytesFile.write(encryBytes)
-                    bytesFile.close()
-                    index = index + 1
+        if not self._disable_compile:
+            options["luajit_md5"] = self.get_file_md5(self._luajit_exe_path)
 
+        if self._pack_file is not None:
+            options["pack"] = self._pack_file
 
+        return options
 
-    def run(self, argv, dependencies):
+    def get_manifest_path(self):
+        return self._manifest_path
+
+    def load_manifest(self):
+        manifest_path = self.get_manifest_path()
+        if not os.path.isfile(manifest_path):
+            return None
+
+        try:
+            f = open(manifest_path)
+            manifest = json.load(f)
+            f.close()
+        except (IOError, ValueError):
+            return None
+
+        if manifest.get(CCPluginLuaCompile.KEY_MANIFEST_VERSION) != CCPluginLuaCompile.MANIFEST_VERSION:
+            return None
+
+        return manifest
+
+    def save_manifest(self, options, files):
+        manifest = {
+            CCPluginLuaCompile.KEY_MANIFEST_VERSION : CCPluginLuaCompile.MANIFEST_VERSION,
+            CCPluginLuaCompile.KEY_MANIFEST_OPTIONS : options,
+            CCPluginLuaCompile.KEY_MANIFEST_FILES : files
+        }
+
+        manifest_dir = os.path.dirname(self.get_manifest_path())
+        if manifest_dir and not os.path.isdir(manifest_dir):
+            os.makedirs(manifest_dir)
+
+        f = open(self.get_manifest_path(), "w")
+        json.dump(manifest, f, sort_keys=True, indent=1)
+        f.close()
+
+    def get_manifest_key(self, dst_lua_file):
+        key = os.path.relpath(dst_lua_file, self._dst_dir).replace(os.sep, "/")
+        if not isinstance(key, unicode):
+            key = key.decode(sys.getfilesystemencoding() or "utf-8")
+
+        return key
+
+    def handle_lua_file(self, task):
         """
+        Compiles one lua file. It's called by the worker threads.
+        The output is written once, or returned if the outputs are packed or encrypted.
+        Returns (error message, manifest info of the file, is skipped, the output if it's packed
+        or the data to encrypt).
         """
-        self.parse_args(argv)
+        lua_file, dst_lua_file, cached_info = task
+        try:
+            source_md5 = self.get_file_md5(lua_file)
+            if cached_info is not None and cached_info.get(CCPluginLuaCompile.KEY_SOURCE_MD5) == source_md5:
+                # the source is not changed, reuse the output if it's not modified
+                output_size = cached_info.get(CCPluginLuaCompile.KEY_OUTPUT_SIZE)
+                if self._pack_file is not None:
+                    packed = self._old_pack_index.get(self.get_manifest_key(dst_lua_file))
+                    if packed is not None and packed[1] == output_size:
+                        return None, cached_info, True, None
+                elif os.path.isfile(dst_lua_file) and os.path.getsize(dst_lua_file) == output_size:
+                    return None, cached_info, True, None
+
+            if self._disable_compile:
+                f = open(lua_file, "rb")
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+            else:
+                data = self.compile_lua(lua_file)
+
+            info = { CCPluginLuaCompile.KEY_SOURCE_MD5 : source_md5 }
+            if self._isEncrypt == True:
+                # the outputs of many files are encrypted together by write_encrypted_outputs()
+                return None, info, False, data
+
+            info[CCPluginLuaCompile.KEY_OUTPUT_SIZE] = len(data)
+            if self._pack_file is None:
+                write_file(dst_lua_file, data)
+                data = None
+        except (cocos.CCPluginError, IOError, OSError) as e:
+            return str(e), None, False, None
 
+        return None, info, False, data
+
+    def write_encrypted_outputs(self, pending, keys, new_files, outputs, failed_files):
+        """
+        Encrypts the data [ (lua file, output file, manifest info, data) ] returned by
+        handle_lua_file(), then writes the outputs or keeps them in `outputs` if they are packed.
+        """
+        encrypted = encrypt_batch([ data for lua_file, dst_lua_file, info, data in pending ], self._encryptkey)
+        for (lua_file, dst_lua_file, info, data), encrypted_data in izip(pending, encrypted):
+            data = self._encryptsign + encrypted_data
+            info[CCPluginLuaCompile.KEY_OUTPUT_SIZE] = len(data)
+            key = keys[dst_lua_file]
+            if self._pack_file is None:
+                try:
+                    write_file(dst_lua_file, data)
+                except (IOError, OSError) as e:
+                    failed_files[lua_file] = str(e)
+                    cocos.Logging.error(str(e))
+                    continue
+            else:
+                outputs[key] = data
+            new_files[key] = info
+
+        del pending[:]
+
+    def write_pack_file(self, files, outputs):
+        """
+        Packs the outputs of the files { key : manifest info }, the new outputs are
+        in `outputs` { key : data }, the others are read from the old pack file.
+        """
+        pack_path = os.path.join(self._dst_dir, self._pack_file)
+        old_pack = None
+        packed_files = []
+        try:
+            for key in sorted(files):
+                data = outputs.get(key)
+                if data is None:
+                    if old_pack is None:
+                        old_pack = open(pack_path, "rb")
+                    offset, size = self._old_pack_index[key]
+                    old_pack.seek(offset)
+                    data = old_pack.read(size)
+                packed_files.append((key, data))
+        finally:
+            if old_pack is not None:
+                old_pack.close()
+
+        LuaPack.write(pack_path, packed_files)
+
+    def handle_all_lua_files(self):
+        """
+        Handles the lua files by the worker threads, the errors are logged.
+        Returns the failed files: { lua file : error message }.
+        """
+
+        cocos.Logging.info(MultiLanguage.get_string('LUACOMPILE_INFO_PROCESS_FILE'))
+
+        # get the files generated last time
+        options = self.get_build_options()
+        manifest = self.load_manifest()
+        if manifest is None:
+            old_files = {}
+            cached_files = {}
+            old_pack_file = None
+        else:
+            old_files = manifest.get(CCPluginLuaCompile.KEY_MANIFEST_FILES, {})
+            old_pack_file = manifest.get(CCPluginLuaCompile.KEY_MANIFEST_OPTIONS, {}).get("pack")
+            if manifest.get(CCPluginLuaCompile.KEY_MANIFEST_OPTIONS) == options:
+                cached_files = old_files
+            else:
+                # the options are changed, all the files should be generated again
+                cached_files = {}
+
+        self._old_pack_index = {}
+        if self._pack_file is not None:
+            self._old_pack_index = LuaPack.read_index(os.path.join(self._dst_dir, self._pack_file)) or {}
+
+        # the output paths are generated before the files are handled by the workers
+        tasks = []
+        keys = {}
+        for lua_file, relative_path in self.get_output_files():
+            dst_lua_file = self.get_output_file_path(lua_file, relative_path)
+            key = self.get_manifest_key(dst_lua_file)
+            keys[dst_lua_file] = key
+            tasks.append((lua_file, dst_lua_file, cached_files.get(key)))
+
+        # remove the files generated from the deleted sources, or all of them if they are packed now
+        cur_keys = set(keys.values())
+        for key in old_files:
+            if key not in cur_keys or (self._pack_file is not None and old_pack_file is None):
+                old_file = os.path.normpath(os.path.join(self._dst_dir, key))
+                if old_file.startswith(self._dst_dir + os.sep) and os.path.isfile(old_file):
+                    os.remove(old_file)
+
+        if old_pack_file is not None and old_pack_file != self._pack_file:
+            old_file = os.path.join(self._dst_dir, old_pack_file)
+            if os.path.isfile(old_file):
+                os.remove(old_file)
+
+        new_files = {}
+        outputs = {}
+        failed_files = {}
+        skipped_count = 0
+        if len(tasks) > 0:
+            # the failed files are reported one by one, the others are still handled
+            pool = ThreadPool(min(self._jobs, len(tasks)))
+            try:
+                # the outputs are encrypted while the workers compile the next files
+                pending = []
+                pending_size = 0
+                results = pool.imap(self.handle_lua_file, tasks)
+                for task, (error, info, skipped, data) in izip(tasks, results):
+                    if error is not None:
+                        failed_files[task[0]] = error
+                        cocos.Logging.error(error)
+                    elif self._isEncrypt == True and not skipped:
+                        pending.append((task[0], task[1], info, data))
+                        pending_size += len(data)
+                        if pending_size >= CCPluginLuaCompile.ENCRYPT_BATCH_SIZE:
+                            self.write_encrypted_outputs(pending, keys, new_files, outputs, failed_files)
+                            pending_size = 0
+                    else:
+                        new_files[keys[task[1]]] = info
+                        if data is not None:
+                            outputs[keys[task[1]]] = data
+                        if skipped:
+                            skipped_count += 1
+                if len(pending) > 0:
+                    self.write_encrypted_outputs(pending, keys, new_files, outputs, failed_files)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+                self.close_workers()
+
+        if self._pack_file is not None:
+            self.write_pack_file(new_files, outputs)
+
+        # the failed files are not saved, so they will be handled again next time
+        self.save_manifest(options, new_files)
+
+        if skipped_count > 0:
+            cocos.Logging.info(MultiLanguage.get_string('LUACOMPILE_INFO_SKIPPED_FMT', skipped_count))
+
+        return failed_files
+
+    @staticmethod
+    def check_failed_files(failed_files):
+        if len(failed_files) > 0:
+            raise cocos.CCPluginError(MultiLanguage.get_string('LUACOMPILE_ERROR_FILES_FAILED_FMT', len(failed_files)),
+                                      cocos.CCPluginError.ERROR_RUNNING_CMD)
+
+    def compile_all(self, lua_files):
         # tips
         cocos.Logging.warning(MultiLanguage.get_string('LUACOMPILE_WARNING_TIP_MSG'))
         # create output directory
@@ -266,14 +984,43 @@ class CCPluginLuaCompile(cocos.CCPlugin):
                                           cocos.CCPluginError.ERROR_PATH_NOT_FOUND)
 
         # deep iterate the src directory
-        for src_dir in self._src_dir_arr:
-            self._current_src_dir = src_dir
-            self._lua_files[self._current_src_dir] = []
-            self.deep_iterate_dir(src_dir)
+        if lua_files is None:
+            lua_files = self.find_lua_files(self._src_dir_arr)
+        self._lua_files = lua_files
 
-        self.handle_all_lua_files()
+        failed_files = self.handle_all_lua_files()
 
         cocos.Logging.info(MultiLanguage.get_string('LUACOMPILE_INFO_FINISHED'))
+        return failed_files
+
+    def compile_files(self, src_dirs, dst_dir, lua_files=None, encrypt=False,
+                      encrypt_key=DEFAULT_ENCRYPT_KEY, encrypt_sign=DEFAULT_ENCRYPT_SIGN,
+                      disable_compile=False, bytecode_64bit=False, jobs=None, output_files=None,
+                      pack_file=None, manifest_path=None):
+        """
+        Does what `cocos luacompile` does in the process of the caller.
+        `lua_files` is the result of find_lua_files(src_dirs), the folders are scanned if it's None.
+        `output_files` is [ (lua file, path relative to dst_dir) ], the files are compiled
+        instead of the ones in src_dirs, so they can be anywhere.
+        If `pack_file` is not None, the outputs are packed into the file in dst_dir.
+        The manifest is saved in `manifest_path` if it's not None, in dst_dir otherwise.
+        Returns the failed files: { lua file : error message }.
+        """
+        from argparse import Namespace
+
+        options = Namespace(src_dir_arr=list(src_dirs), dst_dir=dst_dir, verbose=False,
+                            encrypt=encrypt, encryptkey=encrypt_key, encryptsign=encrypt_sign,
+                            disable_compile=disable_compile, bytecode_64bit=bytecode_64bit, jobs=jobs,
+                            pack_file=pack_file, manifest_path=manifest_path)
+        self.init(options, self.get_working_dir())
+        self._output_files = output_files
+        return self.compile_all(lua_files)
+
+    def run(self, argv, dependencies):
+        """
+        """
+        self.parse_args(argv)
+        self.check_failed_files(self.compile_all(None))
 
     def parse_args(self, argv):
         """
@@ -296,10 +1043,10 @@ class CCPluginLuaCompile(cocos.CCPlugin):
                           action="store_true", dest="encrypt",default=False,
                           help=MultiLanguage.get_string('LUACOMPILE_ARG_ENCRYPT'))
         parser.add_argument("-k", "--encryptkey",
-                          dest="encryptkey",default="2dxLua",
+                          dest="encryptkey",default=CCPluginLuaCompile.DEFAULT_ENCRYPT_KEY,
                           help=MultiLanguage.get_string('LUACOMPILE_ARG_ENCRYPT_KEY'))
         parser.add_argument("-b", "--encryptsign",
-                          dest="encryptsign",default="XXTEA",
+                          dest="encryptsign",default=CCPluginLuaCompile.DEFAULT_ENCRYPT_SIGN,
                           help=MultiLanguage.get_string('LUACOMPILE_ARG_ENCRYPT_SIGN'))
         parser.add_argument("--disable-compile",
                           action="store_true", dest="disable_compile", default=False,
@@ -307,6 +1054,15 @@ class CCPluginLuaCompile(cocos.CCPlugin):
         parser.add_argument("--bytecode-64bit",
                           action="store_true", dest="bytecode_64bit", default=False,
                           help=MultiLanguage.get_string('LUACOMPILE_ARG_BYTECODE_64BIT'))
+        parser.add_argument("-j", "--jobs",
+                          dest="jobs", type=int,
+                          help=MultiLanguage.get_string('LUACOMPILE_ARG_JOBS'))
+        parser.add_argument("--pack",
+                          dest="pack_file",
+                          help=MultiLanguage.get_string('LUACOMPILE_ARG_PACK'))
+        parser.add_argument("--manifest",
+                          dest="manifest_path",
+                          help=MultiLanguage.get_string('LUACOMPILE_ARG_MANIFEST'))
 
         options = parser.parse_args(argv)
 
@@ -322,13 +1078,7 @@ class CCPluginLuaCompile(cocos.CCPlugin):
                     raise cocos.CCPluginError(MultiLanguage.get_string('LUACOMPILE_ERROR_DIR_NOT_EXISTED_FMT')
                                               % (src_dir), cocos.CCPluginError.ERROR_PATH_NOT_FOUND)
 
-        # script directory
-        if getattr(sys, 'frozen', None):
-            workingdir = os.path.realpath(os.path.dirname(sys.executable))
-        else:
-            workingdir = os.path.realpath(os.path.dirname(__file__))
-
-        self.init(options, workingdir)
+        self.init(options, self.get_working_dir())
 
 
 
@@ -0,0 +1,35 @@
+-- Compiles lua files for the luacompile plugin, the bytecode is the same as
+-- `luajit -b input output` writes (jit/bcsave.lua writes the stripped bytecode
+-- into a raw file for it).
+--
+-- The paths of the lua files are read from stdin, one per line. For each file
+-- "ok <size>\n" & the bytecode or "error\t<message>\n" is written to stdout.
+-- It exits when stdin is closed.
+
+if jit.os == "Windows" then
+  -- "\n" is written as "\r\n" to stdout in text mode, so the bytecode is broken
+  local ffi = require("ffi")
+  ffi.cdef("int _setmode(int fd, int mode);")
+  ffi.C._setmode(1, 0x8000) -- _O_BINARY
+end
+
+while true do
+  local input = io.read("*l")
+  if not input then break end
+
+  -- err is the message returned by loadfile() or the error raised by string.dump()
+  local f, err = loadfile((input:gsub("\r$", "")))
+  local ok, s = false, nil
+  if f then
+    ok, s = pcall(string.dump, f, true)
+    if not ok then err = s end
+  end
+
+  if ok then
+    io.write("ok ", #s, "\n", s)
+  else
+    -- the messages are reported like luajit does, in one line
+    io.write("error\tluajit: ", (tostring(err):gsub("[\r\n]+", " ")), "\n")
+  end
+  io.flush()
+end
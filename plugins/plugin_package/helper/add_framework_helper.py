@@ -58,19 +58,35 @@ class AddFrameworkHelper(object):
         self._uninstall_json_path = self._package_path + os.sep + "uninstall.json"
         self.get_uninstall_info()
 
+        # the project files are loaded once & written after all the commands
+        self._session = FileEditSession()
+        self._project_files = {}
+
     def run(self):
-        for command in self._commands:
-            try:
-                name = "do_" + command["command"]
-                cmd = getattr(self, name)
-            except AttributeError:
-                raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_CMD_NOT_FOUND_FMT', name),
-                                          cocos.CCPluginError.ERROR_CMD_NOT_FOUND)
-
-            try:
-                cmd(command)
-            except Exception as e:
-                raise cocos.CCPluginError(str(e), cocos.CCPluginError.ERROR_OTHERS)
+        old_info_count = len(self._uninstall_info)
+        try:
+            for command in self._commands:
+                try:
+                    name = "do_" + command["command"]
+                    cmd = getattr(self, name)
+                except AttributeError:
+                    raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_CMD_NOT_FOUND_FMT', name),
+                                              cocos.CCPluginError.ERROR_CMD_NOT_FOUND)
+
+                try:
+                    cmd(command)
+                except Exception as e:
+                    raise cocos.CCPluginError(str(e), cocos.CCPluginError.ERROR_OTHERS)
+
+            self._session.write(self._uninstall_json_path, json.dumps(self._uninstall_info))
+            self._session.commit()
+        except:
+            # the files are not changed, only the backups of the overridden files are left
+            self._session.rollback()
+            self._uninstall_info = self._uninstall_info[:old_info_count] + \
+                                   [info for info in self._uninstall_info[old_info_count:] if "bak_file" in info]
+            self.save_uninstall_info()
+            raise
 
     def do_add_entry_function(self, command):
         self.add_entry_function(command)
@@ -217,13 +233,14 @@ class AddFrameworkHelper(object):
                 if backup_flag:
                     bak = dst + "_bak_by_" + package_name
                     if not os.path.exists(bak):
+                        self._session.discard(dst)
                         os.rename(dst, bak)
                         self.append_uninstall_info({'bak_file':bak, 'ori_file':dst})
-                        self.save_uninstall_info()
                     else:
                         print MultiLanguage.get_string('PACKAGE_UNABLE_COPY_FMT', dst)
                         continue
                 else:
+                    self._session.discard(dst)
                     if os.path.isdir(dst):
                         shutil.rmtree(dst)
                     else:
@@ -387,19 +404,14 @@ class AddFrameworkHelper(object):
         if build_cfg_file is None:
             raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_BUILD_CFG_NOT_FOUND'),
                                       cocos.CCPluginError.ERROR_PATH_NOT_FOUND)
-        f = open(build_cfg_file, "rb")
-        configs = json.load(f)
-        f.close()
+        configs = json.loads(self._session.read(build_cfg_file))
         if not isinstance(configs["ndk_module_path"], list):
             raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_NDK_MODULE_NOT_FOUND'),
                                       cocos.CCPluginError.ERROR_WRONG_CONFIG)
         moudle_path = '../../../packages/' + self._package_name + '-' + self._package_version
         configs["ndk_module_path"].append(moudle_path)
         self.append_uninstall_info({'json_file':build_cfg_file, 'items':[{'key':'ndk_module_path','items':[moudle_path]}]})
-        self.save_uninstall_info()
-        f = open(build_cfg_file, "w+b")
-        str = json.dump(configs, f)
-        f.close()
+        self._session.write(build_cfg_file, json.dumps(configs))
 
         workdir, proj_pbx_path, all_text = self.load_proj_android(True)
 
@@ -911,17 +923,32 @@ class AddFrameworkHelper(object):
 
         return source
 
+    def find_project_file(self, workdir, ext):
+        # the folder is listed once for the session
+        key = (workdir, ext)
+        if key not in self._project_files:
+            found = None
+            for filename in os.listdir(workdir):
+                if filename[-len(ext):] == ext:
+                    found = filename
+                    break
+            self._project_files[key] = found
+
+        return self._project_files[key]
+
+    def read_file(self, file_path, notSplitLines = False):
+        if notSplitLines == True:
+            return self._session.read(file_path)
+        else:
+            return self._session.readlines(file_path)
+
     def load_proj_ios_mac(self, notSplitLines = False):
         if not "proj.ios_mac" in self._project:
             print MultiLanguage.get_string('PACKAGE_MAC_NOT_FOUND')
             return
 
         workdir = self._project["proj.ios_mac"]
-        files = os.listdir(workdir)
-        for filename in files:
-            if filename[-10:] == ".xcodeproj":
-                proj_dir = filename
-                break
+        proj_dir = self.find_project_file(workdir, ".xcodeproj")
 
         if proj_dir is None:
             print MultiLanguage.get_string('PACKAGE_XCODE_PROJ_NOT_FOUND')
@@ -932,12 +959,7 @@ class AddFrameworkHelper(object):
                                       cocos.CCPluginError.ERROR_PATH_NOT_FOUND)
 
         proj_file_path = workdir + os.sep + proj_dir + os.sep + "project.pbxproj"
-        f = open(proj_file_path, "rb")
-        if notSplitLines == True:
-            lines = f.read()
-        else:
-            lines = f.readlines()
-        f.close()
+        lines = self.read_file(proj_file_path, notSplitLines)
 
         return workdir, proj_file_path, lines
 
@@ -947,22 +969,14 @@ class AddFrameworkHelper(object):
             return
 
         workdir = self._project["proj.win32"]
-        files = os.listdir(workdir)
-        for filename in files:
-            if filename[-4:] == ".sln":
-                proj_file_path = workdir + os.sep +  filename
-                break
+        filename = self.find_project_file(workdir, ".sln")
 
-        if proj_file_path is None:
+        if filename is None:
             print MultiLanguage.get_string('PACKAGE_ERROR_NO_SLN_IN_WIN32')
             return
 
-        f = open(proj_file_path, "rb")
-        if notSplitLines == True:
-            lines = f.read()
-        else:
-            lines = f.readlines()
-        f.close()
+        proj_file_path = workdir + os.sep +  filename
+        lines = self.read_file(proj_file_path, notSplitLines)
 
         return workdir, proj_file_path, lines
 
@@ -972,22 +986,14 @@ class AddFrameworkHelper(object):
             return
 
         workdir = self._project["proj.win32"]
-        files = os.listdir(workdir)
-        for filename in files:
-            if filename[-8:] == ".vcxproj":
-                proj_file_path = workdir + os.sep +  filename
-                break
+        filename = self.find_project_file(workdir, ".vcxproj")
 
-        if proj_file_path is None:
+        if filename is None:
             print MultiLanguage.get_string('PACKAGE_VS_PROJ_NOT_FOUND')
             return
 
-        f = open(proj_file_path, "rb")
-        if notSplitLines == True:
-            lines = f.read()
-        else:
-            lines = f.readlines()
-        f.close()
+        proj_file_path = workdir + os.sep +  filename
+        lines = self.read_file(proj_file_path, notSplitLines)
 
         return workdir, proj_file_path, lines
 
@@ -1002,12 +1008,7 @@ class AddFrameworkHelper(object):
             print MultiLanguage.get_string('PACKAGE_ANDROID_MK_NOT_FOUND')
             return
 
-        f = open(proj_file_path, "rb")
-        if notSplitLines == True:
-            lines = f.read()
-        else:
-            lines = f.readlines()
-        f.close()
+        lines = self.read_file(proj_file_path, notSplitLines)
 
         return workdir, proj_file_path, lines
 
@@ -1017,9 +1018,7 @@ class AddFrameworkHelper(object):
             print MultiLanguage.get_string('PACKAGE_APPDELEGATE_NOT_FOUND')
             return
 
-        f = open(file_path, "rb")
-        all_text = f.read()
-        f.close()
+        all_text = self._session.read(file_path)
 
         return file_path, all_text
 
@@ -1039,7 +1038,6 @@ class AddFrameworkHelper(object):
             f.close()
         else:
             self._uninstall_info = []
-            self.save_uninstall_info()
 
     def save_uninstall_info(self):
         f = open(self._uninstall_json_path, "w+b")
@@ -1050,10 +1048,5 @@ class AddFrameworkHelper(object):
         self._uninstall_info.append(info)
 
     def update_file_content(self, file, text, isLines = False):
-        self.save_uninstall_info()
-        f = open(file, "wb")
-        if isLines:
-            f.writelines(text)
-        else:
-            f.write(text)
-        f.close()
+        # written by run() after all the commands
+        self._session.write(file, text, isLines)
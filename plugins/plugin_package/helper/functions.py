@@ -2,6 +2,7 @@
 import os
 import os.path
 import errno
+import re
 
 
 def ensure_directory(path):
@@ -14,9 +15,162 @@ def ensure_directory(path):
             raise
 
 
+def convert_version_part(version_part):
+    tag = '(\d+)(\D*.*)'
+    match = re.search(tag, version_part)
+    if match is None:
+        return 0, version_part
+
+    return int(match.group(1)), match.group(2)
+
+def compare_extra_version_string(str1, str2):
+    if str1 == str2:
+        return 0
+
+    if len(str1) == 0:
+        return 1
+    elif len(str2) == 0:
+        return -1
+
+    if str1 > str2:
+        return 1
+    else:
+        return -1
+
+
+def compare_version(version1, version2):
+    v1 = re.split('\.', version1)
+    v2 = re.split('\.', version2)
+    n1 = len(v1)
+    n2 = len(v2)
+
+    if n1 > n2:
+        n = n1
+        for x in xrange(n2,n):
+            v2.append("0")
+    else:
+        n = n2
+        for x in xrange(n1,n):
+            v1.append("0")
+
+    for x in xrange(0,n):
+        ver_num1, ver_str1 = convert_version_part(v1[x])
+        ver_num2, ver_str2 = convert_version_part(v2[x])
+        if ver_num1 > ver_num2:
+            return 1
+        elif ver_num2 > ver_num1:
+            return -1
+        
+        c = compare_extra_version_string(ver_str1, ver_str2)
+        if c != 0:
+            return c
+
+    return 0
+
+
 class UnrecognizedFormat:
     def __init__(self, prompt):
         self._prompt = prompt
 
     def __str__(self):
         return self._prompt
+
+
+class FileEditSession(object):
+    """
+    Reads each file once and keeps the edits of the files in memory.
+    The changed files are written once by commit(), and the files already
+    written are restored if one of them can't be written.
+    """
+
+    def __init__(self):
+        # path -> content on the disk, None if the file doesn't exist
+        self._originals = {}
+        # path -> edited content
+        self._contents = {}
+        # path -> (content, lines of the content)
+        self._lines = {}
+
+    def _track(self, path):
+        if path in self._contents:
+            return
+
+        if os.path.isfile(path):
+            f = open(path, "rb")
+            content = f.read()
+            f.close()
+        else:
+            content = None
+
+        self._originals[path] = content
+        self._contents[path] = content
+
+    def read(self, path):
+        self._track(path)
+        return self._contents[path]
+
+    def readlines(self, path):
+        # the same lines as file.readlines()
+        content = self.read(path)
+        if content is None:
+            return None
+
+        cached = self._lines.get(path)
+        if cached is not None and cached[0] is content:
+            return list(cached[1])
+
+        lines = content.split('\n')
+        last = lines.pop()
+        lines = [line + '\n' for line in lines]
+        if last:
+            lines.append(last)
+
+        self._lines[path] = (content, lines)
+        return list(lines)
+
+    def write(self, path, content, isLines = False):
+        self._track(path)
+        if isLines:
+            content = ''.join(content)
+        self._contents[path] = content
+
+    def discard(self, path):
+        # forget the file or the files in the folder, they are changed on the disk by others
+        prefix = os.path.join(path, '')
+        for p in self._contents.keys():
+            if p == path or p.startswith(prefix):
+                self._originals.pop(p)
+                self._contents.pop(p)
+                self._lines.pop(p, None)
+
+    def rollback(self):
+        self._contents = dict(self._originals)
+
+    @staticmethod
+    def _write_file(path, content):
+        f = open(path, "wb")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+
+    def commit(self):
+        written = []
+        try:
+            for path, content in self._contents.iteritems():
+                if content is None or content == self._originals[path]:
+                    continue
+
+                self._write_file(path, content)
+                written.append(path)
+        except:
+            # restore the written files
+            for path in written:
+                original = self._originals[path]
+                if original is None:
+                    os.remove(path)
+                else:
+                    self._write_file(path, original)
+            raise
+
+        self._originals = dict(self._contents)
@@ -2,13 +2,36 @@
 import os
 import os.path
 import json
+import uuid
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 import cocos
 from MultiLanguage import MultiLanguage
 
+from functions import *
+
 class LocalPackagesDatabase(object):
+    """
+    The installed packages, loaded once & indexed by the package names.
+
+    The changes are written through to the file at once. The file is locked by a
+    lock file beside it while it's changed, and it's read again in the lock, so
+    the changes of several cocos processes are kept.
+    """
+
     def __init__(self, path):
         self._path = path
+        self._lock_path = path + ".lock"
+        self._thread_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
         if os.path.isfile(self._path):
             f = open(self._path, "rb")
             self._data = json.load(f)
@@ -16,28 +39,92 @@ class LocalPackagesDatabase(object):
         else:
             self._data = {}
 
+        self._build_index()
+
+    def _build_index(self):
+        # name -> the packages of the name, the newest version first
+        self._versions = {}
+        for package_data in self._data.values():
+            self._versions.setdefault(package_data["name"], []).append(package_data)
+        for package_list in self._versions.values():
+            package_list.sort(cmp=lambda p1, p2: compare_version(p2["version"], p1["version"]))
+
+    @contextmanager
+    def _locked(self):
+        # the file lock is owned by the process, so the threads are locked too
+        self._thread_lock.acquire()
+        lock_file = None
+        try:
+            ensure_directory(os.path.dirname(self._lock_path))
+            lock_file = open(self._lock_path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            yield
+        finally:
+            if lock_file is not None:
+                # the lock is released when the file is closed
+                lock_file.close()
+            self._thread_lock.release()
+
     def get_packages(self):
         return self._data.copy()
 
+    def get_package(self, name, version=None):
+        """
+        Returns the package with the name & version, the newest version if version is None.
+        """
+        package_list = self._versions.get(name)
+        if package_list is None:
+            return None
+
+        if version is None:
+            return package_list[0]
+
+        return self._data.get(name + "-" + version)
+
+    def get_package_versions(self, name):
+        """
+        Returns the packages with the name, the newest version first.
+        """
+        return list(self._versions.get(name, []))
+
     def add_package(self, package_data):
         key = package_data["name"] + "-" + package_data["version"]
-        self._data[key] = package_data
-        self.update_database()
+        with self._locked():
+            self._load()
+            self._data[key] = package_data
+            self.update_database()
         print MultiLanguage.get_string('PACKAGE_PKG_ADD_OK_FMT', key)
 
     def remove_package(self, package_data):
         key = package_data["name"] + "-" + package_data["version"]
-        if key in self._data:
-            del self._data[key]
-            self.update_database()
-            print MultiLanguage.get_string('PACKAGE_PKG_REMOVE_OK_FMT', key)
-        else:
-            message = MultiLanguage.get_string('PACKAGE_PKG_NOT_FOUND_PKG_FMT', key)
-            raise cocos.CCPluginError(message, cocos.CCPluginError.ERROR_WRONG_CONFIG)
+        with self._locked():
+            self._load()
+            if key in self._data:
+                del self._data[key]
+                self.update_database()
+                print MultiLanguage.get_string('PACKAGE_PKG_REMOVE_OK_FMT', key)
+            else:
+                message = MultiLanguage.get_string('PACKAGE_PKG_NOT_FOUND_PKG_FMT', key)
+                raise cocos.CCPluginError(message, cocos.CCPluginError.ERROR_WRONG_CONFIG)
 
     def update_database(self):
-        f = open(self._path, "w+b")
-        str = json.dump(self._data, f)
-        f.close()
-        print MultiLanguage.get_string('PACKAGE_PKG_UPDATE_OK_FMT', self._path)
+        # the file is replaced at once, it's never read half written
+        tmp_path = "%s.%s" % (self._path, uuid.uuid4().hex)
+        f = open(tmp_path, "wb")
+        try:
+            json.dump(self._data, f)
+        finally:
+            f.close()
 
+        # rename() can't replace a file on Windows
+        if cocos.os_is_win32() and os.path.isfile(self._path):
+            os.remove(self._path)
+        os.rename(tmp_path, self._path)
+
+        self._build_index()
+        print MultiLanguage.get_string('PACKAGE_PKG_UPDATE_OK_FMT', self._path)
@@ -2,74 +2,15 @@
 import os
 import os.path
 import json
-import urllib2
-import re
 
 import cocos
 from MultiLanguage import MultiLanguage
 
 from functions import *
 from local_package_database import LocalPackagesDatabase
+from package_index import PackageIndex
 from zip_downloader import ZipDownloader
 
-def convert_version_part(version_part):
-    tag = '(\d+)(\D*.*)'
-    match = re.search(tag, version_part)
-    if match is None:
-        return 0
-
-    return int(match.group(1)), match.group(2)
-
-def compare_extra_version_string(str1, str2):
-    if str1 == str2:
-        return 0
-
-    if len(str1) == 0:
-        return 1
-    elif len(str2) == 0:
-        return -1
-
-    if str1 > str2:
-        return 1
-    else:
-        return -1
-
-
-def compare_version(version1, version2):
-    v1 = re.split('\.', version1)
-    v2 = re.split('\.', version2)
-    n1 = len(v1)
-    n2 = len(v2)
-
-    if n1 > n2:
-        n = n1
-        for x in xrange(n2,n):
-            v2.append("0")
-    else:
-        n = n2
-        for x in xrange(n1,n):
-            v1.append("0")
-
-    for x in xrange(0,n):
-        ver_num1, ver_str1 = convert_version_part(v1[x])
-        ver_num2, ver_str2 = convert_version_part(v2[x])
-        if ver_num1 > ver_num2:
-            return 1
-        elif ver_num2 > ver_num1:
-            return -1
-        
-        c = compare_extra_version_string(ver_str1, ver_str2)
-        if c != 0:
-            return c
-
-    return 0        
-
-def get_newer_package(package1, package2):
-    if compare_version(package1["version"], package2["version"]) > 0:
-        return package1
-    else:
-        return package2
-
 def get_packages_adapt_engine(packages, engine):
     packages_out = []
     for package in packages:
@@ -93,9 +34,15 @@ class PackageHelper:
     REPO_PACKAGES_DIR = "packages"
     WORKDIR = ".cocos" + os.sep + "packages"
     LOCALDB_FILENAME = "local_packages.json"
+    INDEX_FILENAME = "package_index.json"
     QUERY_PACKAGE_URL = REPO_URL + "?name=%s"
     QUERY_KEYWORD_URL = REPO_URL + "?keyword=%s"
 
+    # the index is shared by the queries of a command
+    _package_index = None
+    _local_database = None
+    _local_database_path = None
+
     @classmethod
     def get_workdir(cls):
         home = os.path.expanduser("~").rstrip("/\\")
@@ -105,6 +52,16 @@ class PackageHelper:
     def get_local_database_path(cls):
         return cls.get_workdir() + os.sep + cls.LOCALDB_FILENAME
 
+    @classmethod
+    def get_package_index(cls):
+        if cls._package_index is None:
+            cls._package_index = PackageIndex(cls.get_workdir() + os.sep + cls.INDEX_FILENAME)
+        return cls._package_index
+
+    @classmethod
+    def set_offline(cls, offline):
+        cls.get_package_index().offline = offline
+
     @classmethod
     def get_package_path(cls, package_data):
         return cls.get_workdir() + os.sep + package_data["name"] + "-" + package_data["version"]
@@ -113,9 +70,12 @@ class PackageHelper:
     def search_keyword(cls, keyword):
         url = cls.QUERY_KEYWORD_URL % keyword
         # print "[PACKAGE] query url: %s" % url
-        response = urllib2.urlopen(url)
-        html = response.read()
-        packages_data = json.loads(html)
+        index = cls.get_package_index()
+        packages_data = index.get_json(url)
+        if packages_data is None:
+            # not searched before, search the packages in the index
+            keyword = keyword.lower()
+            packages_data = index.find_packages(lambda package_data: keyword in package_data["name"].lower())
         if packages_data is None or len(packages_data) == 0:
             return None
 
@@ -130,9 +90,11 @@ class PackageHelper:
     def query_package_data(cls, name, version = 'all'):
         url = cls.QUERY_PACKAGE_URL % name + '&version=' + version
         # print "[PACKAGE] query url: %s" % url
-        response = urllib2.urlopen(url)
-        html = response.read()
-        package_data = json.loads(html)
+        index = cls.get_package_index()
+        package_data = index.get_json(url)
+        if package_data is None:
+            # not queried before, find the package in the index
+            package_data = cls.find_package_in_index(name, version)
         # d1 = json.dumps(package_data,indent=4)
         # print d1
         if package_data is None or len(package_data) == 0 or ("err" in package_data and "code" in package_data and package_data["code"] == "1002"):
@@ -145,6 +107,21 @@ class PackageHelper:
 
         return package_data
 
+    @classmethod
+    def find_package_in_index(cls, name, version):
+        packages = cls.get_package_index().find_packages(
+            lambda package_data: package_data["name"] == name and (version == 'all' or package_data["version"] == version))
+        if len(packages) == 0:
+            return None
+
+        if version != 'all':
+            return packages.values()[0]
+
+        # the newest version first
+        package_list = packages.values()
+        package_list.sort(cmp=lambda p1, p2: compare_version(p2["version"], p1["version"]))
+        return package_list
+
     @classmethod
     def download_package_zip(cls, package_data, force):
         download_url = cls.REPO_URL + cls.REPO_PACKAGES_DIR + "/" + package_data["filename"]
@@ -153,46 +130,31 @@ class PackageHelper:
         downloader = ZipDownloader(download_url, workdir, package_data, force)
         downloader.run()
 
+    @classmethod
+    def get_local_database(cls):
+        # the database is loaded once by the process
+        path = cls.get_local_database_path()
+        if cls._local_database is None or cls._local_database_path != path:
+            cls._local_database = LocalPackagesDatabase(path)
+            cls._local_database_path = path
+        return cls._local_database
+
     @classmethod
     def add_package(cls, package_data):
-        localdb = LocalPackagesDatabase(cls.get_local_database_path())
-        localdb.add_package(package_data)
+        cls.get_local_database().add_package(package_data)
 
     @classmethod
     def get_installed_packages(cls):
-        localdb = LocalPackagesDatabase(cls.get_local_database_path())
-        return localdb.get_packages()
+        return cls.get_local_database().get_packages()
 
     @classmethod
     def get_installed_package_data(cls, package_name, version = None):
-        localdb = LocalPackagesDatabase(cls.get_local_database_path())
-        packages = localdb.get_packages()
-        keys = packages.keys()
-        keys.sort()
-        keys.reverse()
-        for key in keys:
-            package_data = packages[key]
-            if package_data["name"] == package_name:
-                if version == None:
-                    return package_data
-                elif package_data["version"] == version:
-                    return package_data
+        return cls.get_local_database().get_package(package_name, version)
 
     @classmethod
     def get_installed_package_newest_version(cls, package_name, engine = None):
-        localdb = LocalPackagesDatabase(cls.get_local_database_path())
-        packages = localdb.get_packages()
-        keys = packages.keys()
-        keys.sort()
-        keys.reverse()
-        package_list = []
-        for key in keys:
-            package_data = packages[key]
-            if package_data["name"] == package_name:
-                package_list.append(package_data)
-
-        n = len(package_list)
-        if n < 1:
+        package_list = cls.get_local_database().get_package_versions(package_name)
+        if len(package_list) < 1:
             return
 
         if not engine is None:
@@ -200,11 +162,8 @@ class PackageHelper:
             if package_list is None:
                 return
 
-        package_newest = package_list[0]
-        for x in xrange(1,n-1):
-            package_newest = get_newer_package(package_list[x], package_newest)
-
-        return package_newest
+        # the versions are sorted, the newest one first
+        return package_list[0]
 
     @classmethod
     def get_installed_package_zip_path(cls, package_data):
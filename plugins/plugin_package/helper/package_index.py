@@ -0,0 +1,189 @@
+
+import os
+import os.path
+import json
+import time
+import socket
+import httplib
+import urlparse
+import uuid
+
+import cocos
+from MultiLanguage import MultiLanguage
+
+from functions import *
+
+class PackageIndex(object):
+    """
+    On-disk index of the responses of the package server, keyed by the query url.
+
+    A response younger than the TTL is used directly. An older one is revalidated
+    with If-None-Match/If-Modified-Since, and it's still used with a warning if the
+    server can't be reached. The connections to the server are kept alive for the
+    next queries. In offline mode, only the index is used.
+    """
+
+    TTL = 3600
+    TIMEOUT = 10
+    MAX_REDIRECTS = 5
+
+    def __init__(self, path, ttl=TTL, timeout=TIMEOUT, offline=False):
+        self._path = path
+        self._ttl = ttl
+        self._timeout = timeout
+        self.offline = offline
+        # (scheme, host) -> kept alive connection
+        self._connections = {}
+
+        self._entries = {}
+        if os.path.isfile(self._path):
+            try:
+                f = open(self._path, "rb")
+                self._entries = json.load(f)
+                f.close()
+            except ValueError:
+                self._entries = {}
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections = {}
+
+    def get_json(self, url):
+        """
+        Returns the parsed response of url, None if it's not in the index in offline mode.
+        """
+        entry = self._entries.get(url)
+        if self.offline:
+            if entry is None:
+                return None
+            return entry["data"]
+
+        if entry is not None and time.time() - entry["time"] < self._ttl:
+            return entry["data"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            status, response_headers, body = self._request(url, headers)
+        except (httplib.HTTPException, socket.error) as e:
+            if entry is None:
+                raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_ERROR_SERVER_FMT', (url, str(e))),
+                                          cocos.CCPluginError.ERROR_OTHERS)
+            cocos.Logging.warning(MultiLanguage.get_string('PACKAGE_WARNING_USE_INDEX_FMT', (url, str(e))))
+            return entry["data"]
+
+        if status == httplib.NOT_MODIFIED and entry is not None:
+            entry["time"] = time.time()
+        elif status == httplib.OK:
+            entry = {
+                "data": json.loads(body),
+                "etag": response_headers.get("etag"),
+                "last_modified": response_headers.get("last-modified"),
+                "time": time.time()
+            }
+            self._entries[url] = entry
+        elif entry is not None:
+            cocos.Logging.warning(MultiLanguage.get_string('PACKAGE_WARNING_USE_INDEX_FMT', (url, "HTTP %d" % status)))
+            return entry["data"]
+        else:
+            raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_ERROR_SERVER_FMT', (url, "HTTP %d" % status)),
+                                      cocos.CCPluginError.ERROR_OTHERS)
+
+        self.save()
+        return entry["data"]
+
+    def find_packages(self, match):
+        """
+        Returns the packages in the index for which match(package_data) is True, keyed by name-version.
+        """
+        packages = {}
+        for entry in self._entries.values():
+            for package_data in PackageIndex._get_packages_in(entry["data"]):
+                if match(package_data):
+                    packages[package_data["name"] + "-" + package_data["version"]] = package_data
+
+        return packages
+
+    @staticmethod
+    def _get_packages_in(data):
+        if isinstance(data, dict):
+            if "name" in data and "version" in data:
+                return [ data ]
+            items = data.values()
+        elif isinstance(data, list):
+            items = data
+        else:
+            return []
+
+        return [ item for item in items if isinstance(item, dict) and "name" in item and "version" in item ]
+
+    def _get_connection(self, scheme, host):
+        key = (scheme, host)
+        conn = self._connections.get(key)
+        if conn is not None:
+            return conn, True
+
+        if scheme == "https":
+            conn = httplib.HTTPSConnection(host, timeout=self._timeout)
+        else:
+            conn = httplib.HTTPConnection(host, timeout=self._timeout)
+        self._connections[key] = conn
+        return conn, False
+
+    def _drop_connection(self, scheme, host):
+        conn = self._connections.pop((scheme, host), None)
+        if conn is not None:
+            conn.close()
+
+    def _request(self, url, headers):
+        for i in range(PackageIndex.MAX_REDIRECTS + 1):
+            parts = urlparse.urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+
+            while True:
+                conn, reused = self._get_connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                    break
+                except (httplib.HTTPException, socket.error):
+                    self._drop_connection(parts.scheme, parts.netloc)
+                    # the server may have closed a kept alive connection, try once with a new one
+                    if not reused:
+                        raise
+
+            if response.will_close:
+                self._drop_connection(parts.scheme, parts.netloc)
+
+            location = response.getheader("location")
+            if response.status in (301, 302, 303, 307) and location:
+                url = urlparse.urljoin(url, location)
+                continue
+
+            response_headers = dict(response.getheaders())
+            return response.status, response_headers, body
+
+        raise httplib.HTTPException(MultiLanguage.get_string('PACKAGE_ERROR_TOO_MANY_REDIRECTS'))
+
+    def save(self):
+        ensure_directory(os.path.dirname(self._path))
+        tmp_path = "%s.%s" % (self._path, uuid.uuid4().hex)
+        f = open(tmp_path, "wb")
+        try:
+            json.dump(self._entries, f)
+        finally:
+            f.close()
+
+        # rename() can't replace a file on Windows
+        if cocos.os_is_win32() and os.path.isfile(self._path):
+            os.remove(self._path)
+        os.rename(tmp_path, self._path)
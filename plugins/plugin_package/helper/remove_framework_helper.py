@@ -8,6 +8,7 @@ import shutil
 
 import cocos
 
+from functions import *
 
 class RemoveFrameworkHelper(object):
 
@@ -17,23 +18,33 @@ class RemoveFrameworkHelper(object):
         self._uninstall_json_path = self._package_path + os.sep + "uninstall.json"
         self.get_uninstall_info()
 
+        # the project files are loaded once & written after all the items
+        self._session = FileEditSession()
+
     def run(self):
-        for remove_info in self._uninstall_info:
-            if "file" in remove_info:
-                if "tags" in remove_info:
-                    self.do_remove_string_with_tag(remove_info)
-                else:
-                    self.do_remove_string_no_tag(remove_info)
-            elif "json_file" in remove_info:
-                filename = remove_info["json_file"]
-                remove_items = remove_info["items"]
-                self.do_remove_string_from_jsonfile(filename, remove_items)
-            elif "bak_file" in remove_info:
-                ori = remove_info["ori_file"]
-                bak = remove_info["bak_file"]
-                if os.path.exists(bak):
-                    self.do_remove_file(ori)
-                    os.rename(bak, ori)
+        try:
+            for remove_info in self._uninstall_info:
+                if "file" in remove_info:
+                    if "tags" in remove_info:
+                        self.do_remove_string_with_tag(remove_info)
+                    else:
+                        self.do_remove_string_no_tag(remove_info)
+                elif "json_file" in remove_info:
+                    filename = remove_info["json_file"]
+                    remove_items = remove_info["items"]
+                    self.do_remove_string_from_jsonfile(filename, remove_items)
+                elif "bak_file" in remove_info:
+                    ori = remove_info["ori_file"]
+                    bak = remove_info["bak_file"]
+                    if os.path.exists(bak):
+                        self._session.discard(ori)
+                        self.do_remove_file(ori)
+                        os.rename(bak, ori)
+
+            self._session.commit()
+        except:
+            self._session.rollback()
+            raise
 
         if os.path.isfile(self._uninstall_json_path):
             os.remove(self._uninstall_json_path)
@@ -46,9 +57,7 @@ class RemoveFrameworkHelper(object):
         workdir = remove_info["workdir"]
         remove_string = remove_info["string"]
 
-        f = open(filename, "rb")
-        lines = f.readlines()
-        f.close()
+        lines = self._session.readlines(filename)
 
         contents = []
         tag_found = False
@@ -81,9 +90,7 @@ class RemoveFrameworkHelper(object):
                 tag_found = True
 
         if tag_found:
-            f = open(filename, "wb")
-            f.writelines(contents)
-            f.close()
+            self._session.write(filename, contents, True)
 
     def do_remove_header_path(self, remove_info):
         platform = remove_info["platform"]
@@ -99,9 +106,7 @@ class RemoveFrameworkHelper(object):
         workdir = remove_info["workdir"]
         remove_string = remove_info["string"]
 
-        f = open(filename, "rb")
-        lines = f.readlines()
-        f.close()
+        lines = self._session.readlines(filename)
 
         contents = []
         tag_found = False
@@ -135,9 +140,7 @@ class RemoveFrameworkHelper(object):
                 tag_found = True
 
         if tag_found:
-            f = open(filename, "wb")
-            f.writelines(contents)
-            f.close()
+            self._session.write(filename, contents, True)
 
     def do_remove_lib_on_android(self, remove_info):
         filename = remove_info["file"]
@@ -150,9 +153,7 @@ class RemoveFrameworkHelper(object):
         workdir = remove_info["workdir"]
         is_import = remove_info["is_import"]
 
-        f = open(filename, "rb")
-        lines = f.readlines()
-        f.close()
+        lines = self._session.readlines(filename)
 
         contents = []
         lib_begin = False
@@ -200,9 +201,7 @@ class RemoveFrameworkHelper(object):
                     contents.append(line)
 
         if tag_found:
-            f = open(filename, "wb")
-            f.writelines(contents)
-            f.close()
+            self._session.write(filename, contents, True)
 
     def do_remove_lib_on_ios_mac(self, remove_info):
         filename = remove_info["file"]
@@ -213,9 +212,7 @@ class RemoveFrameworkHelper(object):
         remove_string = remove_info["string"]
         workdir = remove_info["workdir"]
 
-        f = open(filename, "rb")
-        lines = f.readlines()
-        f.close()
+        lines = self._session.readlines(filename)
 
         contents = []
         lib_begin = False
@@ -245,9 +242,7 @@ class RemoveFrameworkHelper(object):
                     contents.append(line)
 
         if tag_found:
-            f = open(filename, "wb")
-            f.writelines(contents)
-            f.close()
+            self._session.write(filename, contents, True)
 
     def do_remove_lib(self, remove_info):
         platform = remove_info["platform"]
@@ -285,26 +280,20 @@ class RemoveFrameworkHelper(object):
         if not os.path.isfile(filename):
             return
 
-        f = open(filename, "rb")
-        all_text = f.read()
-        f.close()
+        all_text = self._session.read(filename)
 
         find_index = all_text.find(remove_string.encode("ascii"))
         if find_index >= 0:
             headers = all_text[0:find_index]
             tails = all_text[find_index+len(remove_string):]
             all_text = headers + tails
-            f = open(filename, "wb")
-            f.write(all_text)
-            f.close()
+            self._session.write(filename, all_text)
 
     def do_remove_string_from_jsonfile(self, filename, remove_items):
         if not os.path.isfile(filename):
             return
 
-        f = open(filename, "rb")
-        configs = json.load(f)
-        f.close()
+        configs = json.loads(self._session.read(filename))
 
         for remove_item in remove_items:
             key = remove_item["key"]
@@ -319,9 +308,7 @@ class RemoveFrameworkHelper(object):
                 # remove configs[key]
                 del(configs[key])
 
-        f = open(filename, "w+b")
-        str = json.dump(configs, f)
-        f.close()
+        self._session.write(filename, json.dumps(configs))
 
     def remove_items_from_json(self, configs, remove_items):
         if isinstance(configs, list):
@@ -7,6 +7,7 @@ import hashlib
 
 import cocos
 from MultiLanguage import MultiLanguage
+from downloader import Downloader, DownloadError
 
 from time import time
 from functions import *
@@ -22,54 +23,47 @@ class ZipDownloader(object):
 
     def download_file(self):
         print(MultiLanguage.get_string('PACKAGE_READY_DOWNLOAD_FMT', (self._filename, self._url)))
-        import urllib2
 
+        # the package is copied from the download cache unless it's forced to download again
+        downloader = Downloader(self._url, self._filename, self._package_data["md5"],
+                                size=self._zip_file_size, use_cache=not self._force,
+                                progress=self.show_progress)
+        partial_size = downloader.get_partial_size()
+        if partial_size > 0:
+            print(MultiLanguage.get_string('PACKAGE_DOWNLOAD_RESUME_FMT', partial_size / 1000))
+        else:
+            print(MultiLanguage.get_string('PACKAGE_START_DOWNLOAD'))
+
+        self._last_size = partial_size
+        self._last_time = time()
         try:
-            u = urllib2.urlopen(self._url)
-        except urllib2.HTTPError as e:
-            if e.code == 404:
-                print(MultiLanguage.get_string('PACKAGE_ERROR_URL_FMT', self._url))
-            print(MultiLanguage.get_string('PACKAGE_ERROR_DOWNLOAD_FAILED_FMT',
-                  (str(e.code), e.read())))
-            sys.exit(1)
-
-        f = open(self._filename, 'wb')
-        file_size = self._zip_file_size
-        print(MultiLanguage.get_string('PACKAGE_START_DOWNLOAD'))
-
-        file_size_dl = 0
-        block_sz = 8192
-        block_size_per_second = 0
-        old_time = time()
-
-        while True:
-            buf = u.read(block_sz)
-            if not buf:
-                break
-
-            file_size_dl += len(buf)
-            block_size_per_second += len(buf)
-            f.write(buf)
-            new_time = time()
-            if (new_time - old_time) > 1:
-                speed = block_size_per_second / (new_time - old_time) / 1000.0
-                status = ""
-                if file_size != 0:
-                    percent = file_size_dl * 100. / file_size
-                    status = MultiLanguage.get_string('PACKAGE_DOWNLOAD_PERCENT_FMT_1',
-                                                      (file_size_dl / 1000, file_size / 1000, percent, speed))
-                else:
-                    status = MultiLanguage.get_string('PACKAGE_DOWNLOAD_PERCENT_FMT_2',
-                                                      (file_size_dl / 1000, speed))
-
-                status += chr(8) * (len(status) + 1)
-                print(status),
-                sys.stdout.flush()
-                block_size_per_second = 0
-                old_time = new_time
-
-        print(MultiLanguage.get_string('PACKAGE_DOWNLOAD_END'))
-        f.close()
+            downloader.run()
+        except DownloadError as e:
+            raise cocos.CCPluginError(MultiLanguage.get_string('PACKAGE_ERROR_DOWNLOAD_FMT', str(e)),
+                                      cocos.CCPluginError.ERROR_OTHERS)
+
+        if downloader.from_cache:
+            print(MultiLanguage.get_string('PACKAGE_DOWNLOAD_FROM_CACHE_FMT', self._filename))
+        else:
+            print(MultiLanguage.get_string('PACKAGE_DOWNLOAD_END'))
+
+    def show_progress(self, file_size_dl, file_size):
+        new_time = time()
+        # the timer may not tick between the first blocks (e.g. on Windows)
+        speed = (file_size_dl - self._last_size) / max(new_time - self._last_time, 1e-6) / 1000.0
+        if file_size:
+            percent = file_size_dl * 100. / file_size
+            status = MultiLanguage.get_string('PACKAGE_DOWNLOAD_PERCENT_FMT_1',
+                                              (file_size_dl / 1000, file_size / 1000, percent, speed))
+        else:
+            status = MultiLanguage.get_string('PACKAGE_DOWNLOAD_PERCENT_FMT_2',
+                                              (file_size_dl / 1000, speed))
+
+        status += chr(8) * (len(status) + 1)
+        print(status),
+        sys.stdout.flush()
+        self._last_size = file_size_dl
+        self._last_time = new_time
 
     def check_file_md5(self):
         if not os.path.isfile(self._filename):
@@ -77,14 +71,14 @@ class ZipDownloader(object):
 
         block_size = 65536  # 64KB
         md5 = hashlib.md5()
-        f = open(self._filename)
+        f = open(self._filename, 'rb')
         while True:
             data = f.read(block_size)
             if not data:
                 break
             md5.update(data)
         hashcode = md5.hexdigest()
-        return hashcode == self._package_data["md5"]
+        return hashcode == self._package_data["md5"].lower()
 
     def download_zip_file(self):
         if os.path.isfile(self._filename):
@@ -22,12 +22,15 @@ class PackageInfo(object):
                                 description=self.__class__.brief_description())
         parser.add_argument("name", metavar="NAME", help=MultiLanguage.get_string('PACKAGE_INFO_ARG_NAME'))
         parser.add_argument('-v', '--version', default='all', help=MultiLanguage.get_string('PACKAGE_INFO_ARG_VERSION'))
+        parser.add_argument('--offline', action="store_true", dest="offline",
+                            help=MultiLanguage.get_string('PACKAGE_ARG_OFFLINE'))
         return parser.parse_args(argv)
 
     def run(self, argv):
         args = self.parse_args(argv)
         name = args.name
         version = args.version
+        PackageHelper.set_offline(args.offline)
         package_data = PackageHelper.query_package_data(name, version)
         if package_data is None:
             print MultiLanguage.get_string('PACKAGE_INFO_ERROR_NO_PKG_FMT', (name, version))
@@ -19,11 +19,14 @@ class FrameworkAdd(object):
             description=self.__class__.brief_description())
         parser.add_argument("keyword", metavar="PACKAGE_NAME",
                             help=MultiLanguage.get_string('PACKAGE_SEARCH_ARG_KEY'))
+        parser.add_argument('--offline', action="store_true", dest="offline",
+                            help=MultiLanguage.get_string('PACKAGE_ARG_OFFLINE'))
         return parser.parse_args(argv)
 
     def run(self, argv):
         args = self.parse_args(argv)
         keyword = args.keyword
+        PackageHelper.set_offline(args.offline)
         packages = PackageHelper.search_keyword(keyword)
         if packages is None:
             print MultiLanguage.get_string('PACKAGE_SEARCH_ERROR_NO_KEY_FMT', keyword)
@@ -16,7 +16,6 @@ import sys
 import os
 import cocos
 from MultiLanguage import MultiLanguage
-import BaseHTTPServer
 import webbrowser
 import threading
 import subprocess
@@ -52,6 +51,8 @@ class CCPluginRun(cocos.CCPlugin):
                           help=MultiLanguage.get_string('RUN_ARG_PORT'))
         group.add_argument("--host", dest="host", metavar="SERVER_HOST", nargs='?', default='127.0.0.1',
                           help=MultiLanguage.get_string('RUN_ARG_HOST'))
+        group.add_argument("--gzip", action="store_true", dest="gzip", default=False,
+                          help=MultiLanguage.get_string('RUN_ARG_GZIP'))
         group.add_argument("--no-console", action="store_true", dest="no_console", default=False,
                           help=MultiLanguage.get_string('RUN_ARG_NO_CONSOLE'))
         group.add_argument("--working-dir", dest="working_dir", default='',
@@ -63,6 +64,7 @@ class CCPluginRun(cocos.CCPlugin):
         self._host = args.host
         self._browser = args.browser
         self._param = args.param
+        self._gzip = args.gzip
         self._no_console = args.no_console
         self._working_dir = args.working_dir
 
@@ -252,11 +254,7 @@ class CCPluginRun(cocos.CCPlugin):
         if not self._platforms.is_web_active():
             return
 
-        from SimpleHTTPServer import SimpleHTTPRequestHandler
-        HandlerClass = SimpleHTTPRequestHandler
-        ServerClass  = BaseHTTPServer.HTTPServer
-        Protocol     = "HTTP/1.0"
-        HandlerClass.protocol_version = Protocol
+        from web_server import DevHTTPServer
 
         host = self._host
         if self._port is None:
@@ -277,7 +275,7 @@ class CCPluginRun(cocos.CCPlugin):
             server_address = (host, port)
             try:
                 cocos.Logging.info(MultiLanguage.get_string('RUN_INFO_HOST_PORT_FMT', (host, port)))
-                httpd = ServerClass(server_address, HandlerClass)
+                httpd = DevHTTPServer(server_address, compress=self._gzip)
             except Exception as e:
                 httpd = None
                 cocos.Logging.warning(MultiLanguage.get_string('RUN_WARNING_SERVER_FAILED_FMT', (host, port, e)))
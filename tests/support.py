@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# support: The helpers of the tests
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Puts bin/ & plugins/ on sys.path and runs the local HTTP servers the tests
+send their requests to.
+
+Run the tests by: python -m unittest discover -s tests
+'''
+
+import os
+import sys
+import socket
+import shutil
+import tempfile
+import threading
+import SocketServer
+import BaseHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+BIN_DIR = os.path.join(ROOT, 'bin')
+PLUGINS_DIR = os.path.join(ROOT, 'plugins')
+
+for path in (PLUGINS_DIR, BIN_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class LocalHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+    A threaded HTTP server on a free port of 127.0.0.1, served by a background thread.
+    The attributes passed to the constructor are set on the server, so the
+    handlers can read them by self.server.
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handler_class, **attrs):
+        for name, value in attrs.items():
+            setattr(self, name, value)
+        self.requests = []
+        self.requests_lock = threading.Lock()
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), handler_class)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def host(self):
+        return '127.0.0.1:%d' % self.port
+
+    def url(self, path=''):
+        return 'http://%s/%s' % (self.host, path.lstrip('/'))
+
+    def record(self, item):
+        with self.requests_lock:
+            self.requests.append(item)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={ 'poll_interval': 0.05 })
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class QuietHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    A request handler which doesn't log the requests to stderr.
+    '''
+
+    def log_message(self, format, *args):
+        pass
+
+
+def get_free_port():
+    '''
+    Returns a port nothing is listening on, the requests to it are refused.
+    '''
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
+
+class TempDirMixin(object):
+    '''
+    Creates self.tmp_dir for each test & removes it after the test.
+    '''
+
+    def setUp(self):
+        super(TempDirMixin, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp(prefix='cocos_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        super(TempDirMixin, self).tearDown()
+
+    def tmp_path(self, *names):
+        return os.path.join(self.tmp_dir, *names)
+
+    def write_file(self, path, data):
+        dir_path = os.path.dirname(path)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        f = open(path, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# test_cocos_stat: Tests of the statistics sender & the events journal
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+The events are sent to a local HTTP server standing in for the GA & BI
+endpoints, the journals are written in a temporary folder.
+'''
+
+import os
+import json
+import zlib
+import unittest
+
+import support
+import cocos_stat
+
+
+class StatHandler(support.QuietHandler):
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        self.server.record((self.path, body))
+
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class EventSenderTest(support.TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(EventSenderTest, self).setUp()
+        self.server = support.LocalHTTPServer(StatHandler, status=200).start()
+
+        self._saved = dict((name, getattr(cocos_stat, name))
+                           for name in ('GA_HOST', 'BI_HOST', 'ga_journal', 'bi_journal', 'send_events'))
+        cocos_stat.GA_HOST = self.server.host
+        cocos_stat.BI_HOST = self.server.host
+        cocos_stat.ga_journal = cocos_stat.EventJournal(self.tmp_path('ga.journal'))
+        cocos_stat.bi_journal = cocos_stat.EventJournal(self.tmp_path('bi.journal'))
+
+        self.sender = cocos_stat.EventSender('test')
+
+    def tearDown(self):
+        self.sender.stop(5)
+        for name, value in self._saved.items():
+            setattr(cocos_stat, name, value)
+        self.server.stop()
+        super(EventSenderTest, self).tearDown()
+
+    def gen_events(self, count, category='test'):
+        return [ [ category, 'action', 'label_%d' % i ] for i in range(count) ]
+
+    def test_ga_events_sent_in_batches(self):
+        self.sender.add_events(True, self.gen_events(25), 1)
+        self.sender.stop(5)
+
+        bodies = [ body for path, body in self.server.requests if path == cocos_stat.GA_BATCH_PATH ]
+        self.assertEqual(sorted([ len(body.split('\n')) for body in bodies ]),
+                         [ 5, cocos_stat.GA_MAX_BATCH_EVENTS ])
+        self.assertEqual(cocos_stat.ga_journal.read(), [])
+
+    def test_bi_events_sent_in_one_request(self):
+        self.sender.add_events(False, self.gen_events(3), 1)
+        self.sender.stop(5)
+
+        self.assertEqual(len(self.server.requests), 1)
+        path, body = self.server.requests[0]
+        self.assertEqual(path, cocos_stat.BI_PATH)
+        params = json.loads(zlib.decompress(body))
+        self.assertEqual([ e['p']['label'] for e in params['events'] ],
+                         [ 'label_0', 'label_1', 'label_2' ])
+
+    def test_failed_events_are_cached(self):
+        self.server.status = 500
+        events = self.gen_events(3)
+        self.sender.add_events(True, events, 1)
+        self.sender.stop(5)
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(cocos_stat.ga_journal.read(), events)
+
+    def test_refused_events_are_cached(self):
+        cocos_stat.GA_HOST = '127.0.0.1:%d' % support.get_free_port()
+        events = self.gen_events(2)
+        self.sender.add_events(True, events, 1)
+        self.sender.stop(5)
+
+        self.assertEqual(cocos_stat.ga_journal.read(), events)
+
+    def test_events_after_stop_are_cached(self):
+        self.sender.stop(5)
+        events = self.gen_events(2)
+        self.sender.add_events(True, events, 1)
+
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(cocos_stat.ga_journal.read(), events)
+
+    def test_new_thread_after_exit(self):
+        send_events = cocos_stat.send_events
+        calls = []
+
+        def failing_send_events(conns, items, engine_version=''):
+            calls.append(items)
+            if len(calls) == 1:
+                raise RuntimeError('broken')
+            return send_events(conns, items, engine_version)
+
+        cocos_stat.send_events = failing_send_events
+
+        lost = self.gen_events(2, 'lost')
+        self.sender.add_events(True, lost, 1)
+        first_thread = self.sender._thread
+        first_thread.join(5)
+        self.assertFalse(first_thread.is_alive())
+
+        # the events of the thread which has exited aren't dropped
+        sent = self.gen_events(2, 'sent')
+        self.sender.add_events(True, sent, 1)
+        self.assertIsNot(self.sender._thread, first_thread)
+        self.sender.stop(5)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(cocos_stat.ga_journal.read(), lost)
+
+    def test_bak_file_events_cached(self):
+        bak_path = self.tmp_path('cache_event_bak')
+        self.write_file(bak_path, json.dumps([ [ 'bak', 'a', 'b' ] ]))
+        cocos_stat.ga_journal.append([ [ 'new', 'a', 'b' ] ])
+
+        bak_file = cocos_stat.local_cfg_bak_file
+        cocos_stat.local_cfg_bak_file = bak_path
+        try:
+            cocos_stat.Statistic('test').terminate_stat()
+        finally:
+            cocos_stat.local_cfg_bak_file = bak_file
+
+        # the events of the old versions are sent by the next run
+        self.assertFalse(os.path.exists(bak_path))
+        self.assertEqual(cocos_stat.ga_journal.read(), [ [ 'new', 'a', 'b' ], [ 'bak', 'a', 'b' ] ])
+
+
+class EventJournalTest(support.TempDirMixin, unittest.TestCase):
+
+    def test_journal_folder_created(self):
+        # a fresh home doesn't have the ~/.cocos folder
+        path = self.tmp_path('home', '.cocos', 'events.journal')
+        journal = cocos_stat.EventJournal(path)
+        self.assertEqual(journal.read(), [])
+        journal.append([ [ 'a', 'b', 'c' ] ])
+
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(journal.read(), [ [ 'a', 'b', 'c' ] ])
+
+    def test_append_and_drain(self):
+        journal = cocos_stat.EventJournal(self.tmp_path('events.journal'))
+        journal.append([ [ 'a', 'b', 'c' ] ])
+        journal.append([ [ 'd', 'e', 'f' ], [ 'g', 'h', 'i' ] ])
+
+        self.assertEqual(journal.drain(), [ [ 'a', 'b', 'c' ], [ 'd', 'e', 'f' ], [ 'g', 'h', 'i' ] ])
+        self.assertEqual(journal.read(), [])
+
+    def test_last_events_kept(self):
+        journal = cocos_stat.EventJournal(self.tmp_path('events.journal'), max_events=3)
+        journal.append([ [ 'e', 'a', str(i) ] for i in range(5) ])
+
+        self.assertEqual([ e[2] for e in journal.read() ], [ '2', '3', '4' ])
+
+    def test_old_cache_file_read(self):
+        old_path = self.tmp_path('cache_events')
+        self.write_file(old_path, json.dumps([ [ 'old', 'a', 'b' ] ]))
+        journal = cocos_stat.EventJournal(self.tmp_path('events.journal'), old_path)
+        journal.append([ [ 'new', 'a', 'b' ] ])
+
+        self.assertEqual(journal.drain(), [ [ 'old', 'a', 'b' ], [ 'new', 'a', 'b' ] ])
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_old_cache_file_compacted_once(self):
+        old_path = self.tmp_path('cache_events')
+        self.write_file(old_path, json.dumps([ [ 'old', 'a', '1' ] ]))
+        journal = cocos_stat.EventJournal(self.tmp_path('events.journal'), old_path)
+
+        # each append compacts the journal
+        compact_size = cocos_stat.EventJournal.COMPACT_SIZE
+        cocos_stat.EventJournal.COMPACT_SIZE = 10
+        try:
+            journal.append([ [ 'new', 'a', '2' ] ])
+            self.assertFalse(os.path.exists(old_path))
+            journal.append([ [ 'new', 'b', '3' ] ])
+        finally:
+            cocos_stat.EventJournal.COMPACT_SIZE = compact_size
+
+        self.assertEqual(journal.read(), [ [ 'old', 'a', '1' ], [ 'new', 'a', '2' ], [ 'new', 'b', '3' ] ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# test_downloader: Tests of the resumable HTTP downloads
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+The files are downloaded from a local threaded HTTP server, which answers the
+Range requests or not, and can close the connections in the middle of the
+responses to break the downloads.
+'''
+
+import os
+import re
+import hashlib
+import unittest
+
+import support
+from downloader import Downloader, DownloadError
+
+
+class FileHandler(support.QuietHandler):
+
+    RANGE_RE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+    def do_GET(self):
+        server = self.server
+        content = server.files.get(self.path)
+        if content is None:
+            server.record((self.path, None, 404))
+            self.send_error(404)
+            return
+
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        size = len(content)
+        start, end, status = 0, size, 200
+        range_value = self.headers.get('Range')
+        if server.ranges and range_value is not None and self.headers.get('If-Range', etag) == etag:
+            match = FileHandler.RANGE_RE.match(range_value)
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else size
+            status = 206
+            if start >= size:
+                server.record((self.path, range_value, 416))
+                self.send_error(416)
+                return
+
+        server.record((self.path, range_value, status))
+        body = content[start:end]
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        if server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, size))
+        self.end_headers()
+
+        with server.requests_lock:
+            broken = server.failures > 0
+            if broken:
+                server.failures -= 1
+        if broken:
+            # the connection is closed in the middle of the body
+            body = body[:len(body) / 2]
+        self.wfile.write(body)
+
+
+def gen_content(size, seed=0):
+    # not compressible & different for each seed
+    blocks = []
+    digest = hashlib.sha1(str(seed)).digest()
+    while len(blocks) * len(digest) < size:
+        digest = hashlib.sha1(digest).digest()
+        blocks.append(digest)
+    return ''.join(blocks)[:size]
+
+
+class DownloaderTestBase(support.TempDirMixin):
+
+    ranges = True
+
+    def setUp(self):
+        super(DownloaderTestBase, self).setUp()
+        self.content = gen_content(1024 * 1024)
+        self.md5 = hashlib.md5(self.content).hexdigest()
+        self.server = support.LocalHTTPServer(FileHandler, files={ '/file.zip': self.content },
+                                              ranges=self.ranges, failures=0).start()
+        self.path = self.tmp_path('out', 'file.zip')
+
+        # the small files are downloaded by several connections too
+        self._min_chunk_size = Downloader.MIN_CHUNK_SIZE
+        Downloader.MIN_CHUNK_SIZE = 64 * 1024
+
+    def tearDown(self):
+        Downloader.MIN_CHUNK_SIZE = self._min_chunk_size
+        self.server.stop()
+        super(DownloaderTestBase, self).tearDown()
+
+    def new_downloader(self, path='/file.zip', **kwargs):
+        kwargs.setdefault('checksum', self.md5)
+        kwargs.setdefault('cache_dir', None)
+        kwargs.setdefault('timeout', 5)
+        return Downloader(self.server.url(path), self.path, **kwargs)
+
+    def read_file(self, path):
+        f = open(path, 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def assert_downloaded(self, content=None):
+        self.assertEqual(self.read_file(self.path), content or self.content)
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        self.assertFalse(os.path.exists(self.path + '.part.json'))
+
+    def get_statuses(self):
+        return [ status for path, range_value, status in self.server.requests ]
+
+
+class RangeDownloadTest(DownloaderTestBase, unittest.TestCase):
+
+    def test_multi_connection(self):
+        downloader = self.new_downloader(connections=4)
+        self.assertEqual(downloader.run(), self.path)
+        self.assert_downloaded()
+        self.assertEqual(downloader.digest, self.md5)
+
+        # the first request is for the whole file, the others for the chunks
+        ranges = sorted([ range_value for path, range_value, status in self.server.requests ])
+        self.assertEqual(ranges, [ 'bytes=0-', 'bytes=262144-524287', 'bytes=524288-786431',
+                                   'bytes=786432-1048575' ])
+
+    def test_single_connection(self):
+        self.new_downloader(connections=1).run()
+        self.assert_downloaded()
+        self.assertEqual(self.get_statuses(), [ 206 ])
+
+    def test_retry_after_failure(self):
+        # the broken chunk is requested again from the downloaded position
+        self.server.failures = 1
+        self.new_downloader(connections=1).run()
+        self.assert_downloaded()
+        self.assertEqual([ range_value for path, range_value, status in self.server.requests ],
+                         [ 'bytes=0-', 'bytes=524288-1048575' ])
+
+    def test_resume_after_failure(self):
+        self.server.failures = Downloader.RETRY_TIMES + 1
+        downloader = self.new_downloader(connections=1)
+        self.assertRaises(DownloadError, downloader.run)
+        self.assertFalse(os.path.exists(self.path))
+        partial_size = downloader.get_partial_size()
+        self.assertTrue(partial_size > 0)
+
+        # the next download goes on from the downloaded position
+        downloader = self.new_downloader(connections=1)
+        downloader.run()
+        self.assert_downloaded()
+        self.assertEqual(downloader.resumed_size, partial_size)
+        self.assertEqual(self.server.requests[-1][1], 'bytes=%d-1048575' % partial_size)
+
+    def test_restart_when_changed(self):
+        # the url of a file without checksum is the same when it's changed
+        self.server.failures = Downloader.RETRY_TIMES + 1
+        self.assertRaises(DownloadError, self.new_downloader(connections=1, checksum=None).run)
+        requests_count = len(self.server.requests)
+
+        # the file is changed on the server, If-Range gets the whole file
+        new_content = gen_content(300 * 1024, 1)
+        self.server.files['/file.zip'] = new_content
+        downloader = self.new_downloader(connections=1, checksum=None)
+        downloader.run()
+        self.assert_downloaded(new_content)
+        self.assertEqual(downloader.resumed_size, 0)
+        self.assertEqual(self.get_statuses()[requests_count:], [ 200, 206 ])
+
+    def test_failure_after_restart(self):
+        self.server.failures = Downloader.RETRY_TIMES + 1
+        self.assertRaises(DownloadError, self.new_downloader(connections=1, checksum=None).run)
+
+        # the download from the start fails too
+        self.server.files['/file.zip'] = gen_content(300 * 1024, 1)
+        self.server.failures = 100
+        downloader = self.new_downloader(connections=1, checksum=None)
+        self.assertRaises(DownloadError, downloader.run)
+        self.assertEqual(downloader.resumed_size, 0)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_cache_hit(self):
+        cache_dir = self.tmp_path('cache')
+        self.new_downloader(cache_dir=cache_dir).run()
+        requests_count = len(self.server.requests)
+        os.remove(self.path)
+
+        downloader = self.new_downloader(cache_dir=cache_dir)
+        downloader.run()
+        self.assert_downloaded()
+        self.assertTrue(downloader.from_cache)
+        self.assertEqual(len(self.server.requests), requests_count)
+
+        # the cache isn't used for another checksum
+        downloader = self.new_downloader(cache_dir=cache_dir, checksum='0' * 32)
+        self.assertRaises(DownloadError, downloader.run)
+        self.assertFalse(downloader.from_cache)
+
+    def test_md5_mismatch(self):
+        downloader = self.new_downloader(checksum='0' * 32)
+        self.assertRaises(DownloadError, downloader.run)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        self.assertFalse(os.path.exists(self.path + '.part.json'))
+
+    def test_not_found(self):
+        self.assertRaises(DownloadError, self.new_downloader('/missing.zip').run)
+        self.assertEqual(self.get_statuses(), [ 404 ])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_connection_refused(self):
+        downloader = Downloader('http://127.0.0.1:%d/file.zip' % support.get_free_port(), self.path,
+                                cache_dir=None, timeout=5)
+        self.assertRaises(DownloadError, downloader.run)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class NoRangeDownloadTest(DownloaderTestBase, unittest.TestCase):
+
+    ranges = False
+
+    def test_one_connection(self):
+        # the file can't be downloaded by chunks without Range
+        self.new_downloader(connections=4).run()
+        self.assert_downloaded()
+        self.assertEqual(self.server.requests, [ ('/file.zip', 'bytes=0-', 200) ])
+
+    def test_failure_not_resumable(self):
+        self.server.failures = 1
+        downloader = self.new_downloader(connections=1)
+        self.assertRaises(DownloadError, downloader.run)
+        self.assertEqual(downloader.get_partial_size(), 0)
+        self.assertFalse(os.path.exists(self.path + '.part.json'))
+
+        # downloaded again from the start
+        downloader = self.new_downloader(connections=1)
+        downloader.run()
+        self.assert_downloaded()
+        self.assertEqual(downloader.resumed_size, 0)
+        self.assertEqual(self.get_statuses(), [ 200, 200 ])
+
+    def test_md5_mismatch(self):
+        self.assertRaises(DownloadError, self.new_downloader(checksum='0' * 32).run)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# test_package_index: Tests of the local index of the package server responses
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+The queries are sent to a local HTTP server standing in for the package server,
+which answers with an ETag & 304 when the response isn't changed.
+'''
+
+import os
+import sys
+import json
+import hashlib
+import urlparse
+import unittest
+from StringIO import StringIO
+
+import support
+
+sys.path.insert(0, os.path.join(support.PLUGINS_DIR, 'plugin_package'))
+import cocos
+from helper import PackageHelper
+from helper.package_index import PackageIndex
+from package_info import PackageInfo
+from package_search import FrameworkAdd as PackageSearch
+
+
+def gen_package(name, version):
+    return {
+        'name': name,
+        'version': version,
+        'author': 'author',
+        'engine': '3.0+',
+        'filename': '%s-%s.zip' % (name, version),
+        'filesize': '2048',
+        'filetime': '0',
+        'description': 'the package %s' % name
+    }
+
+
+class PackageServerHandler(support.QuietHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        support.QuietHandler.setup(self)
+        self.server.record(('connect', None))
+
+    def do_GET(self):
+        query = dict(urlparse.parse_qsl(urlparse.urlsplit(self.path).query))
+        packages = self.server.packages
+        if 'keyword' in query:
+            data = dict((key, package) for key, package in packages.items() if query['keyword'] in key)
+        else:
+            data = [ package for package in packages.values()
+                     if package['name'] == query.get('name') and query.get('version', 'all') in ('all', package['version']) ]
+            data = data or { 'err': 'not found', 'code': '1002' }
+
+        body = json.dumps(data)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.server.record(('304', self.path))
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.server.record(('200', self.path))
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PackageIndexTestBase(support.TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(PackageIndexTestBase, self).setUp()
+        packages = {}
+        for name, version in (('sdkbox', '1.0'), ('sdkbox', '1.2'), ('pay', '2.0')):
+            packages['%s-%s' % (name, version)] = gen_package(name, version)
+        self.server = support.LocalHTTPServer(PackageServerHandler, packages=packages).start()
+        self.index_path = self.tmp_path('packages', 'package_index.json')
+        self._indexes = []
+
+        # the warnings are printed to stdout
+        self._stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self._stdout
+        for index in self._indexes:
+            index.close()
+        self.server.stop()
+        super(PackageIndexTestBase, self).tearDown()
+
+    def new_index(self, **kwargs):
+        index = PackageIndex(self.index_path, **kwargs)
+        self._indexes.append(index)
+        return index
+
+    def get_requests(self, status=None):
+        return [ path for kind, path in self.server.requests if kind != 'connect' and status in (None, kind) ]
+
+    def get_connections(self):
+        return [ kind for kind, path in self.server.requests if kind == 'connect' ]
+
+
+class PackageIndexTest(PackageIndexTestBase):
+
+    def test_ttl_hit(self):
+        index = self.new_index()
+        url = self.server.url('?keyword=sdk')
+        data = index.get_json(url)
+        self.assertEqual(sorted(data.keys()), [ 'sdkbox-1.0', 'sdkbox-1.2' ])
+
+        self.assertEqual(index.get_json(url), data)
+        self.assertEqual(len(self.get_requests()), 1)
+
+        # the index is saved for the next commands
+        self.assertEqual(self.new_index().get_json(url), data)
+        self.assertEqual(len(self.get_requests()), 1)
+
+    def test_not_modified(self):
+        url = self.server.url('?keyword=sdk')
+        data = self.new_index().get_json(url)
+
+        index = self.new_index(ttl=0)
+        self.assertEqual(index.get_json(url), data)
+        self.assertEqual(len(self.get_requests('200')), 1)
+        self.assertEqual(len(self.get_requests('304')), 1)
+
+    def test_replaced(self):
+        url = self.server.url('?keyword=sdk')
+        self.new_index().get_json(url)
+
+        self.server.packages['sdkbox-1.3'] = gen_package('sdkbox', '1.3')
+        data = self.new_index(ttl=0).get_json(url)
+        self.assertEqual(sorted(data.keys()), [ 'sdkbox-1.0', 'sdkbox-1.2', 'sdkbox-1.3' ])
+        self.assertEqual(len(self.get_requests('200')), 2)
+
+        # the new response replaces the old one in the index
+        self.assertEqual(self.new_index().get_json(url), data)
+        self.assertEqual(len(self.get_requests()), 2)
+
+    def test_connection_kept_alive(self):
+        index = self.new_index()
+        for name in ('sdkbox', 'pay'):
+            index.get_json(self.server.url('?name=%s&version=all' % name))
+            index.get_json(self.server.url('?name=%s&version=1.0' % name))
+
+        self.assertEqual(len(self.get_requests()), 4)
+        self.assertEqual(len(self.get_connections()), 1)
+
+    def test_stale_when_server_down(self):
+        url = self.server.url('?keyword=sdk')
+        data = self.new_index().get_json(url)
+        self.server.stop()
+
+        self.assertEqual(self.new_index(ttl=0).get_json(url), data)
+        self.assertTrue(url in sys.stdout.getvalue())
+
+        # a query which isn't in the index fails
+        self.assertRaises(cocos.CCPluginError, self.new_index(ttl=0).get_json, self.server.url('?keyword=zzz'))
+
+        # the server is started again for tearDown()
+        self.server = support.LocalHTTPServer(PackageServerHandler, packages={}).start()
+
+    def test_offline(self):
+        url = self.server.url('?keyword=sdk')
+        data = self.new_index().get_json(url)
+
+        index = self.new_index(ttl=0, offline=True)
+        self.assertEqual(index.get_json(url), data)
+        self.assertEqual(index.get_json(self.server.url('?keyword=pay')), None)
+        self.assertEqual(len(self.get_requests()), 1)
+
+    def test_find_packages(self):
+        index = self.new_index()
+        index.get_json(self.server.url('?keyword=sdk'))
+        index.get_json(self.server.url('?name=pay&version=all'))
+
+        packages = index.find_packages(lambda package_data: True)
+        self.assertEqual(sorted(packages.keys()), [ 'pay-2.0', 'sdkbox-1.0', 'sdkbox-1.2' ])
+
+
+class OfflineCommandsTest(PackageIndexTestBase):
+
+    def setUp(self):
+        super(OfflineCommandsTest, self).setUp()
+        self._saved = dict((name, getattr(PackageHelper, name))
+                           for name in ('REPO_URL', 'QUERY_PACKAGE_URL', 'QUERY_KEYWORD_URL', '_package_index'))
+        PackageHelper.REPO_URL = self.server.url()
+        PackageHelper.QUERY_PACKAGE_URL = PackageHelper.REPO_URL + '?name=%s'
+        PackageHelper.QUERY_KEYWORD_URL = PackageHelper.REPO_URL + '?keyword=%s'
+
+        # the index of the earlier queries
+        PackageHelper._package_index = self.new_index()
+        PackageSearch().run([ 'sdk' ])
+        PackageInfo().run([ 'pay' ])
+        self.requests_count = len(self.get_requests())
+
+        # a new command
+        PackageHelper._package_index = self.new_index(ttl=0)
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        for name, value in self._saved.items():
+            setattr(PackageHelper, name, value)
+        super(OfflineCommandsTest, self).tearDown()
+
+    def test_search(self):
+        PackageSearch().run([ 'sdk', '--offline' ])
+        output = sys.stdout.getvalue()
+        self.assertTrue('sdkbox 1.0' in output)
+        self.assertTrue('sdkbox 1.2' in output)
+        self.assertEqual(len(self.get_requests()), self.requests_count)
+
+    def test_search_new_keyword(self):
+        # the keyword isn't searched before, the packages in the index are searched
+        PackageSearch().run([ 'pa', '--offline' ])
+        self.assertTrue('pay 2.0' in sys.stdout.getvalue())
+        self.assertEqual(len(self.get_requests()), self.requests_count)
+
+    def test_info(self):
+        PackageInfo().run([ 'sdkbox', '-v', '1.2', '--offline' ])
+        output = sys.stdout.getvalue()
+        self.assertTrue('version: 1.2' in output)
+        self.assertEqual(len(self.get_requests()), self.requests_count)
+
+    def test_info_not_found(self):
+        PackageInfo().run([ 'nothing', '--offline' ])
+        self.assertTrue("'nothing'" in sys.stdout.getvalue())
+        self.assertEqual(len(self.get_requests()), self.requests_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
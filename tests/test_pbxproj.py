@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# test_pbxproj: Tests of the pbxproj parser & writer
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+Parses the strings of the OpenStep format & the malformed projects, and loads
+& saves the project template of `cocos package` & the app project in
+tests/fixtures. The projects are in the format of Xcode, so they are written
+back byte for byte.
+'''
+
+import os
+import sys
+import shutil
+import plistlib
+import unittest
+
+import support
+
+sys.path.insert(0, os.path.join(support.PLUGINS_DIR, 'plugin_generate', 'proj_modifier'))
+import modify_pbxproj
+from modify_pbxproj import PBXParser, PBXParseError, XcodeProject
+
+TEMPLATE_PATH = os.path.join(support.PLUGINS_DIR, 'plugin_package', 'helper', 'template', 'proj.ios_mac',
+                             '__PACKAGE_NAME__.xcodeproj', 'project.pbxproj')
+FIXTURE_DIR = os.path.join(support.ROOT, 'tests', 'fixtures')
+
+
+def to_plain(value):
+    # the PBX objects to dicts & lists to compare them
+    if isinstance(value, (modify_pbxproj.PBXDict, dict)):
+        return dict((k, to_plain(v)) for k, v in value.items())
+    elif isinstance(value, (modify_pbxproj.PBXList, list)):
+        return [ to_plain(v) for v in value ]
+    elif isinstance(value, plistlib.Data):
+        return ('data', value.data)
+    else:
+        return value
+
+
+def parse(content):
+    return to_plain(PBXParser(content).parse())
+
+
+class PBXParserTest(support.TempDirMixin, unittest.TestCase):
+
+    def test_strings(self):
+        self.assertEqual(parse('{ a = b; "c d" = "e f"; path = ../x/y.png; empty = ""; }'),
+                         { 'a': 'b', 'c d': 'e f', 'path': '../x/y.png', 'empty': '' })
+
+    def test_escapes(self):
+        self.assertEqual(parse(r'"a\nb\t\"c\"\\d"'), 'a\nb\t"c"\\d')
+        self.assertEqual(parse(r'"\101\102"'), 'AB')
+        self.assertEqual(parse(r'"\U56fe\U7247"'), u'\u56fe\u7247')
+        self.assertEqual(parse(r'"\q"'), 'q')
+
+    def test_non_octal_digit_escapes(self):
+        # 8 & 9 are not octal digits, they're escaped as themselves
+        self.assertEqual(parse(r'"\8\9"'), '89')
+        self.assertEqual(parse(r'"\18"'), '\x018')
+        self.assertEqual(parse(r'"a\9b"'), 'a9b')
+
+    def test_utf8_strings(self):
+        value = parse('{ name = "\xe5\x9b\xbe\xe6\xa0\x87.png"; path = a.png; }')
+        self.assertEqual(value['name'], u'\u56fe\u6807.png')
+        self.assertTrue(isinstance(value['path'], str))
+
+    def test_data(self):
+        self.assertEqual(parse('<0fbd 7768>'), ('data', '\x0f\xbd\x77\x68'))
+
+    def test_comments(self):
+        value = parse('// !$*UTF8*$!\n{ a /* comment */ = ( b, /* c */ d, ); // end\n}')
+        self.assertEqual(value, { 'a': [ 'b', 'd' ] })
+
+    def test_isa_classes(self):
+        value = PBXParser('{ a = { isa = PBXFileReference; path = x.cpp; }; b = { c = d; }; }').parse()
+        self.assertTrue(isinstance(value['a'], modify_pbxproj.PBXFileReference))
+        self.assertTrue(isinstance(value['b'], modify_pbxproj.PBXDict))
+
+    def test_malformed(self):
+        for content in ('',
+                        '{',
+                        '{ a = b }',
+                        '{ a b; }',
+                        '{ a = ; }',
+                        '( a b )',
+                        '{ a = b; } c',
+                        ')',
+                        '"abc',
+                        '<abc>',
+                        '"\xff\xfe"',
+                        '"\\U00e9\xff"'):
+            self.assertRaises(PBXParseError, PBXParser(content).parse)
+
+    def test_load_malformed(self):
+        path = self.tmp_path('Test.xcodeproj', 'project.pbxproj')
+        self.write_file(path, '// !$*UTF8*$!\n{ objects = { "\\9\xff" = x; };\n')
+        self.assertEqual(XcodeProject.Load(path), None)
+
+
+class RoundTripTest(support.TempDirMixin, unittest.TestCase):
+
+    def copy_template(self):
+        # the ids & the name are replaced like create_framework_helper does
+        f = open(TEMPLATE_PATH, 'rb')
+        content = f.read()
+        f.close()
+        content = content.replace('__MAC_LIB_ORI_ID__', 'DABC966C1A81DF7F00BF5CC4')
+        content = content.replace('__IOS_LIB_ORI_ID__', 'DABC98A71A81E08700BF5CC4')
+        content = content.replace('__PACKAGE_NAME__', 'Test')
+
+        path = self.tmp_path('Test.xcodeproj', 'project.pbxproj')
+        self.write_file(path, content)
+        return path
+
+    def copy_fixture(self, name):
+        dst = self.tmp_path(name)
+        shutil.copytree(os.path.join(FIXTURE_DIR, name), dst)
+        return os.path.join(dst, 'project.pbxproj')
+
+    def read_file(self, path):
+        f = open(path, 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def check_round_trip(self, path):
+        project = XcodeProject.Load(path)
+        self.assertNotEqual(project, None)
+        tree = to_plain(project.data)
+
+        # the project is written back byte for byte
+        saved_path = path + '.saved'
+        project.save_new_format(saved_path)
+        self.assertEqual(self.read_file(saved_path), self.read_file(path))
+        self.assertEqual(to_plain(XcodeProject.Load(saved_path).data), tree)
+
+        # saving doesn't change the project
+        self.assertEqual(to_plain(project.data), tree)
+        resaved_path = path + '.resaved'
+        project.save_new_format(resaved_path)
+        self.assertEqual(self.read_file(resaved_path), self.read_file(saved_path))
+
+        # plistlib reads the same objects from the XML format
+        xml_path = path + '.xml'
+        project.save_format_xml(xml_path)
+        self.assertEqual(to_plain(XcodeProject.LoadFromXML(xml_path).data), tree)
+
+    def test_template(self):
+        self.check_round_trip(self.copy_template())
+
+    def test_app_project(self):
+        self.check_round_trip(self.copy_fixture('HelloCpp.xcodeproj'))
+
+    def test_all_sections_written(self):
+        path = self.copy_fixture('HelloCpp.xcodeproj')
+        project = XcodeProject.Load(path)
+        objects = project.data['objects']
+        objects['15427C60198B950000DC375D'] = PBXParser(
+            '{ isa = PBXAggregateTarget; buildPhases = ( ); dependencies = ( ); name = Docs; }').parse()
+        objects['15427C61198B950000DC375D'] = PBXParser(
+            '{ isa = PBXBuildRule; compilerSpec = com.apple.compilers.proxy.script; fileType = pattern.proxy; '
+            'isEditable = 1; outputFiles = ( ); script = "exit 0\\n"; }').parse()
+        project.save_new_format(path)
+
+        content = self.read_file(path)
+        sections = [ line[len('/* Begin '):-len(' section */')]
+                     for line in content.split('\n') if line.startswith('/* Begin ') ]
+        self.assertEqual(sections, sorted(sections))
+        self.assertEqual(sections[:2], [ 'PBXAggregateTarget', 'PBXBuildFile' ])
+        self.assertTrue('PBXBuildRule' in sections)
+        self.assertEqual(to_plain(XcodeProject.Load(path).data), to_plain(project.data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# test_xcode_staging: Tests of the copies of the Xcode projects for the staged scripts
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+The app project in tests/fixtures is copied into a temporary project layout,
+its res folder is staged, and the copies of the project & of a CocoaPods
+workspace are checked. The original project is never changed.
+'''
+
+import os
+import sys
+import shutil
+import unittest
+import xml.etree.ElementTree as ET
+
+import support
+
+sys.path.insert(0, os.path.join(support.PLUGINS_DIR, 'plugin_compile'))
+import xcode_staging
+from modify_pbxproj import XcodeProject
+
+FIXTURE_DIR = os.path.join(support.ROOT, 'tests', 'fixtures')
+RES_REF_ID = '15427C3F198B8D6E00DC375D'
+
+WORKSPACE_DATA = '''<?xml version="1.0" encoding="UTF-8"?>
+<Workspace
+   version = "1.0">
+   <FileRef
+      location = "group:HelloCpp.xcodeproj">
+   </FileRef>
+   <FileRef
+      location = "group:Pods/Pods.xcodeproj">
+   </FileRef>
+   <FileRef
+      location = "absolute:/opt/Shared.xcodeproj">
+   </FileRef>
+</Workspace>
+'''
+
+
+class XcodeStagingTest(support.TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(XcodeStagingTest, self).setUp()
+        self.platform_dir = self.tmp_path('proj.ios_mac')
+        self.project_path = os.path.join(self.platform_dir, 'HelloCpp.xcodeproj')
+        shutil.copytree(os.path.join(FIXTURE_DIR, 'HelloCpp.xcodeproj'), self.project_path)
+        self.write_file(os.path.join(self.project_path, 'xcshareddata', 'xcschemes', 'HelloCpp.xcscheme'),
+                        '<Scheme/>')
+        self.write_file(self.tmp_path('Resources', 'res', 'a.png'), 'png')
+
+        self.staging_dir = os.path.join(self.platform_dir, 'build', 'cocos-intermediates', 'debug', 'ios')
+        self.staged_project = os.path.join(self.staging_dir, 'HelloCpp.xcodeproj')
+        self.staged_res = os.path.join(self.staging_dir, 'staged', 'res')
+        self.original = self.read_file(os.path.join(self.project_path, 'project.pbxproj'))
+
+    def read_file(self, path):
+        f = open(path, 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def stage(self, staged_dirs=None):
+        if staged_dirs is None:
+            staged_dirs = { self.tmp_path('Resources', 'res'): self.staged_res }
+        return xcode_staging.stage_project(self.project_path, self.staged_project, staged_dirs, 1)
+
+    def test_folder_reference_staged(self):
+        self.assertEqual(self.stage(), [])
+        project = XcodeProject.Load(os.path.join(self.staged_project, 'project.pbxproj'))
+        res_ref = project.objects[RES_REF_ID]
+        self.assertEqual(res_ref['path'], self.staged_res)
+        self.assertEqual(res_ref['sourceTree'], '<absolute>')
+        self.assertEqual(res_ref['name'], 'res')
+
+        # the other paths are relative to the folder of the original project
+        self.assertEqual(project.root_object['projectDirPath'], self.platform_dir)
+        original = XcodeProject.Load(os.path.join(self.project_path, 'project.pbxproj'))
+        changed = [ obj_id for obj_id, obj in project.objects.items() if obj.data != original.objects[obj_id].data ]
+        self.assertEqual(sorted(changed), sorted([ RES_REF_ID, project.get('rootObject') ]))
+
+        # the project & the source folder are not changed
+        self.assertEqual(self.read_file(os.path.join(self.project_path, 'project.pbxproj')), self.original)
+        self.assertEqual(os.listdir(self.tmp_path('Resources', 'res')), [ 'a.png' ])
+
+    def test_other_files_copied(self):
+        stale_path = os.path.join(self.staged_project, 'xcuserdata', 'old.xcscheme')
+        self.write_file(stale_path, '<Scheme/>')
+        self.stage()
+
+        self.assertEqual(self.read_file(os.path.join(self.staged_project, 'xcshareddata', 'xcschemes',
+                                                     'HelloCpp.xcscheme')), '<Scheme/>')
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertFalse(os.path.exists(os.path.join(self.staged_project, 'project.pbxproj.tmp')))
+
+    def test_unchanged_copy_not_written(self):
+        self.stage()
+        staged_pbxproj = os.path.join(self.staged_project, 'project.pbxproj')
+        os.utime(staged_pbxproj, (1000000000, 1000000000))
+
+        self.stage()
+        self.assertEqual(os.path.getmtime(staged_pbxproj), 1000000000)
+
+    def test_folder_not_referenced(self):
+        src_dir = self.tmp_path('src')
+        os.makedirs(src_dir)
+        not_referenced = self.stage({ src_dir: os.path.join(self.staging_dir, 'staged', 'src') })
+        self.assertEqual(not_referenced, [ src_dir ])
+
+        project = XcodeProject.Load(os.path.join(self.staged_project, 'project.pbxproj'))
+        self.assertEqual(project.objects[RES_REF_ID]['path'], '../Resources/res')
+
+    def test_malformed_project(self):
+        self.write_file(os.path.join(self.project_path, 'project.pbxproj'), '// !$*UTF8*$!\n{ objects = {')
+        self.assertRaises(xcode_staging.cocos.CCPluginError, self.stage)
+
+    def test_workspace_staged(self):
+        workspace_path = os.path.join(self.platform_dir, 'HelloCpp.xcworkspace')
+        self.write_file(os.path.join(workspace_path, 'contents.xcworkspacedata'), WORKSPACE_DATA)
+        self.stage()
+
+        staged_workspace = xcode_staging.stage_workspace(workspace_path, self.project_path, self.staged_project, 1)
+        self.assertEqual(staged_workspace, os.path.join(self.staging_dir, 'HelloCpp.xcworkspace'))
+        root = ET.parse(os.path.join(staged_workspace, 'contents.xcworkspacedata')).getroot()
+        self.assertEqual([ ref.get('location') for ref in root ],
+                         [ 'group:HelloCpp.xcodeproj',
+                           'absolute:%s' % os.path.join(self.platform_dir, 'Pods', 'Pods.xcodeproj'),
+                           'absolute:/opt/Shared.xcodeproj' ])
+        self.assertEqual(self.read_file(os.path.join(workspace_path, 'contents.xcworkspacedata')), WORKSPACE_DATA)
+
+
+if __name__ == '__main__':
+    unittest.main()
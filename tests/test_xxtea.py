@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------
+# test_xxtea: Tests of the XXTEA backends of luacompile -e
+#
+# License: MIT
+# ----------------------------------------------------------------------------
+'''
+The faster backends must generate the same bytes as encrypt(), the outputs
+are decrypted by the engine.
+'''
+
+import random
+import unittest
+
+import support
+import plugin_luacompile as luacompile
+
+
+def gen_strs(rand, sizes):
+    return [ ''.join(chr(rand.randint(0, 255)) for i in xrange(size)) for size in sizes ]
+
+
+class XXTEATest(unittest.TestCase):
+
+    def setUp(self):
+        self.rand = random.Random(7)
+
+    def check(self, strs, key):
+        self.assertEqual(luacompile._encrypt_batch_py(strs, key), [ luacompile.encrypt(s, key) for s in strs ])
+        self.assertEqual(luacompile.encrypt_batch(strs, key), [ luacompile.encrypt(s, key) for s in strs ])
+
+    def test_encrypt_py(self):
+        for s in gen_strs(self.rand, [ 0, 1, 4, 5, 207, 208, 1001 ]):
+            self.assertEqual(luacompile._encrypt_py(s, '2dxLua'), luacompile.encrypt(s, '2dxLua'))
+
+    def test_batch_of_close_sizes(self):
+        # the last words of the lanes are at different columns
+        sizes = [ self.rand.randint(2000, 2300) for i in xrange(40) ]
+        self.check(gen_strs(self.rand, sizes), '2dxLua')
+
+    def test_batch_of_mixed_sizes(self):
+        # the small strings have more rounds, the big one is encrypted alone
+        sizes = [ 0, 1, 3, 100, 205, 212 ] * 3 + [ self.rand.randint(400, 3000) for i in xrange(30) ] + [ 20000 ]
+        strs = gen_strs(self.rand, sizes)
+        self.rand.shuffle(strs)
+        self.check(strs, 'a longer key than 16 bytes')
+        self.assertEqual([ luacompile.decrypt(data, 'k') for data in luacompile._encrypt_batch_py(strs, 'k') ],
+                         strs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,8 +8,14 @@
 # ----------------------------------------------------------------------------
 
 import os
+import sys
 import shutil
 
+# the copy rules are shared with the console
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, "bin"))
+import copy_rules
+from copy_rules import convert_rules, CopyRules
+
 def copy_files_in_dir(src, dst):
 
     for item in os.listdir(src):
@@ -32,12 +38,12 @@ def copy_files_with_config(config, src_root, dst_root):
     include_rules = None
     if config.has_key("include"):
         include_rules = config["include"]
-        include_rules = convert_rules(include_rules)
+        include_rules = CopyRules(convert_rules(include_rules))
 
     exclude_rules = None
     if config.has_key("exclude"):
         exclude_rules = config["exclude"]
-        exclude_rules = convert_rules(exclude_rules)
+        exclude_rules = CopyRules(convert_rules(exclude_rules))
 
     copy_files_with_rules(src_dir, src_dir, dst_dir, include_rules, exclude_rules)
 
@@ -54,47 +60,34 @@ def copy_files_with_rules(src_rootDir, src, dst, include = None, exclude = None)
         copy_files_in_dir(src, dst)
     elif (include is not None):
         # have include
+        include = copy_rules.get_rules(include)
         for name in os.listdir(src):
             abs_path = os.path.join(src, name)
-            rel_path = os.path.relpath(abs_path, src_rootDir)
+            rel_path = os.path.relpath(abs_path, src_rootDir).replace("\\", "/")
             if os.path.isdir(abs_path):
-                sub_dst = os.path.join(dst, name)
-                copy_files_with_rules(src_rootDir, abs_path, sub_dst, include = include)
+                if include.may_match_in(rel_path + "/"):
+                    sub_dst = os.path.join(dst, name)
+                    copy_files_with_rules(src_rootDir, abs_path, sub_dst, include = include)
             elif os.path.isfile(abs_path):
-                if _in_rules(rel_path, include):
+                if include.match(rel_path):
                     if not os.path.exists(dst):
                         os.makedirs(dst)
                     shutil.copy(abs_path, dst)
     elif (exclude is not None):
         # have exclude
+        exclude = copy_rules.get_rules(exclude)
         for name in os.listdir(src):
             abs_path = os.path.join(src, name)
-            rel_path = os.path.relpath(abs_path, src_rootDir)
+            rel_path = os.path.relpath(abs_path, src_rootDir).replace("\\", "/")
             if os.path.isdir(abs_path):
-                sub_dst = os.path.join(dst, name)
-                copy_files_with_rules(src_rootDir, abs_path, sub_dst, exclude = exclude)
+                if not exclude.match_all_in(rel_path + "/"):
+                    sub_dst = os.path.join(dst, name)
+                    copy_files_with_rules(src_rootDir, abs_path, sub_dst, exclude = exclude)
             elif os.path.isfile(abs_path):
-                if not _in_rules(rel_path, exclude):
+                if not exclude.match(rel_path):
                     if not os.path.exists(dst):
                         os.makedirs(dst)
                     shutil.copy(abs_path, dst)
 
 def _in_rules(rel_path, rules):
-    import re
-    ret = False
-    path_str = rel_path.replace("\\", "/")
-    for rule in rules:
-        if re.match(rule, path_str):
-            ret = True
-
-    return ret
-
-def convert_rules(rules):
-    ret_rules = []
-    for rule in rules:
-        ret = rule.replace('.', '\\.')
-        ret = ret.replace('*', '.*')
-        ret = "%s" % ret
-        ret_rules.append(ret)
-
-    return ret_rules
+    return copy_rules.get_rules(rules).match(rel_path)